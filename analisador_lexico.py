@@ -1,13 +1,26 @@
+import io
+import mmap
+import os
+import re
+import sys
+from array import array
+from bisect import bisect_right
+
 class UCyanLexer(Lexer):
     """A lexer for the uCyan language."""
 
-    def __init__(self, error_func):
+    def __init__(self, error_func, backend="sly"):
         """Create a new Lexer.
         An error function. Will be called with an error
         message, line and column as arguments, in case of
         an error during lexing.
+        The backend is "sly" (the master regex built by SLY) or
+        "dfa" (the faster hand-written scanner, tokenize_dfa).
         """
+        if backend not in ("sly", "dfa"):
+            raise ValueError("Unknown lexer backend %r" % backend)
         self.error_func = error_func
+        self.backend = backend
 
     # Reserved keywords
     keywords = {
@@ -64,7 +77,9 @@ class UCyanLexer(Lexer):
 
     # Regular expression rules for tokens
     ID = r"[a-zA-Z_][a-zA-Z0-9_]*"
-    FLOAT_CONST = r"[0-9]+.[0-9]+"
+    # The dot is escaped: unescaped, "100" and "1+2" lexed as floats.
+    # The DFA backend (_DIGIT in analisador_lexico_dfa) must match it.
+    FLOAT_CONST = r"[0-9]+\.[0-9]+"
     INT_CONST = r"[0-9]+"
     CHAR_CONST = r"'.*(\\n)?'" #PROBLEMAS: print 'BLABLA' não pode, tem que ser um só
     ERROR_UNTERM_COMMENT = r"\/\*.*"
@@ -90,7 +105,10 @@ class UCyanLexer(Lexer):
     AND = r"&&"
 
     # Special cases
+    # Identifiers are interned: every occurrence of a name, in the tokens
+    # and in the AST, is the same str object
     def ID(self, t):
+      t.value = sys.intern(t.value)
       t.type = self.keywords.get(t.value, "ID")
       return t
 
@@ -101,22 +119,146 @@ class UCyanLexer(Lexer):
     def ignore_comment(self, t):
       self.lineno += t.value.count("\n")
 
+    def tokenize(self, text, lineno=1, index=0):
+        self._reset_lines(text, lineno, index)
+        return self._scan(text, lineno, index)
+
+    def _reset_lines(self, text, lineno=1, index=0):
+        # The line-start table is built on demand, once per input text
+        self.text = text
+        self._line_starts = None
+        self._line_base = (lineno, index)
+        self._chunk_base = 0
+        self._more_input = False
+
+    def _scan(self, text, lineno=1, index=0):
+        if self.backend == "dfa":
+            return tokenize_dfa(self, text, lineno, index)
+        return super().tokenize(text, lineno, index)
+
+    def tokenize_stream(self, source, lineno=1, chunk_size=1 << 20, encoding="utf-8"):
+        """Tokenize a file path or binary file object without reading it
+        into memory as a whole.
+
+        The input is decoded in chunks of about chunk_size bytes that end
+        at a newline, so only a block comment can cross a chunk boundary;
+        an unterminated one is carried over to the next chunk. Tokens get
+        the same lineno and index (offsets into the whole decoded text) as
+        with tokenize().
+        """
+        self._line_starts = starts = array("q", [0])
+        self._line_bias = lineno - 1
+        self._more_input = True
+        chunks = self._source_chunks(source, chunk_size)
+        data = next(chunks, None)
+        base = 0          # offset of text in the whole input
+        text = ""
+        pending = False   # text starts with a comment not closed yet
+        while data is not None:
+            piece = data.decode(encoding)
+            data = next(chunks, None)
+            offset = base + len(text)
+            starts.extend(offset + m.end() for m in re.finditer("\n", piece))
+            scan_from = max(len(text) - 1, 2)
+            text += piece
+            if pending and data is not None and text.find("*/", scan_from) < 0:
+                continue
+            self._chunk_base = base
+            self._more_input = data is not None
+            self._comment_start = None
+            for tok in self._scan(text, lineno):
+                tok.index += base
+                tok.end += base
+                yield tok
+            lineno = self.lineno
+            if self._comment_start is None:
+                base += len(text)
+                text = ""
+                pending = False
+            else:
+                base += self._comment_start
+                text = text[self._comment_start:]
+                pending = True
+
+    def tokenize_compact(self, text, lineno=1):
+        """Tokenize text into a CompactTokens (type ids, offsets and lengths
+        in flat arrays) instead of keeping one Token object per token."""
+        tokens = CompactTokens(text, lineno)
+        append = tokens.append
+        for tok in self.tokenize(text, lineno):
+            append(tok.type, tok.index, tok.end)
+        return tokens
+
+    @staticmethod
+    def _source_chunks(source, chunk_size):
+        """Yield the bytes of source in pieces ending at a newline."""
+        if isinstance(source, (str, bytes, os.PathLike)):
+            with open(source, "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    pos, size = 0, len(mm)
+                    while pos < size:
+                        end = mm.find(b"\n", pos + chunk_size - 1)
+                        end = size if end < 0 else end + 1
+                        yield mm[pos:end]
+                        pos = end
+            return
+        carry = bytearray()
+        while True:
+            data = source.read(chunk_size)
+            if not data:
+                break
+            cut = data.rfind(b"\n") + 1
+            carry += data[:cut] if cut else data
+            if cut:
+                yield bytes(carry)
+                carry = bytearray(data[cut:])
+        if carry:
+            yield bytes(carry)
+
+    def _line_table(self):
+        """Offsets where each line of the current text starts."""
+        if self._line_starts is None:
+            starts = [0]
+            starts.extend(m.end() for m in re.finditer('\n', self.text))
+            self._line_starts = starts
+            lineno, index = self._line_base
+            self._line_bias = lineno - bisect_right(starts, index)
+        return self._line_starts
+
+    def find_line(self, token):
+        """Find the line of the token by binary search over the line starts."""
+        starts = self._line_table()
+        return self._line_bias + bisect_right(starts, token.index)
+
     def find_column(self, token):
         """Find the column of the token in its line."""
-        last_cr = self.text.rfind('\n', 0, token.index)
-        return token.index - last_cr
+        starts = self._line_table()
+        return token.index - starts[bisect_right(starts, token.index) - 1] + 1
 
     # Internal auxiliary methods
     def _error(self, msg, token):
-        location = self._make_location(token)
+        # While streaming, token.index is still relative to the current chunk
+        location = self._locate(token.index + self._chunk_base)
         self.error_func(msg, location[0], location[1])
         self.index += 1
 
     def _make_location(self, token):
-        return token.lineno, self.find_column(token)
+        return self._locate(token.index)
+
+    def _locate(self, index):
+        starts = self._line_table()
+        line = bisect_right(starts, index)
+        return self._line_bias + line, index - starts[line - 1] + 1
 
     # Error handling rule
     def ERROR_UNTERM_COMMENT(self, t):
+	    if self._more_input:
+	        # The comment may be closed in a chunk not read yet (tokenize_stream)
+	        self._comment_start = t.index
+	        self.index = len(self.text)
+	        return
 	    msg = "Unterminated comment"
 	    self._error(msg, t)
 
@@ -130,8 +272,103 @@ class UCyanLexer(Lexer):
 
     # Scanner (used only for test)
     def scan(self, text):
-        output = ""
+        output = io.StringIO()
+        self.dump(text, output, echo=True)
+        return output.getvalue()
+
+    def dump(self, text, out, format="text", echo=False, batch=4096):
+        """Write the tokens of text to the file-like object out, one per line.
+        format:
+            "text" writes str(token), as scan() does; "tsv" writes
+            type, value, lineno and index separated by tabs.
+        echo:
+            Also write the dump to stdout.
+        Lines are written in batches of batch tokens. Returns the number of
+        tokens written.
+        """
+        if format == "text":
+            fmt = str
+        elif format == "tsv":
+            fmt = self._tsv_line
+        else:
+            raise ValueError("Unknown token dump format %r" % format)
+        count = 0
+        lines = []
         for tok in self.tokenize(text):
-            print(tok)
-            output += str(tok) + "\n"
-        return output
+            lines.append(fmt(tok))
+            if len(lines) == batch:
+                count += self._flush_dump(lines, out, echo)
+        count += self._flush_dump(lines, out, echo)
+        return count
+
+    @staticmethod
+    def _tsv_line(tok):
+        value = tok.value
+        if "\t" in value or "\\" in value:
+            value = value.replace("\\", "\\\\").replace("\t", "\\t")
+        return "%s\t%s\t%d\t%d" % (tok.type, value, tok.lineno, tok.index)
+
+    @staticmethod
+    def _flush_dump(lines, out, echo):
+        if not lines:
+            return 0
+        chunk = "\n".join(lines) + "\n"
+        out.write(chunk)
+        if echo:
+            sys.stdout.write(chunk)
+        count = len(lines)
+        lines.clear()
+        return count
+
+
+class CompactTokens:
+    """Struct-of-arrays storage of a token stream.
+
+    Each token takes a type id (1 byte), a start offset (8 bytes) and a
+    length (4 bytes, so tokens are shorter than 4 GiB); values are
+    sliced from the source text on demand.
+    Iterating yields ordinary token objects one at a time, so a
+    UCyanParser can consume it directly (see UCyanParser.parse_compact).
+    """
+
+    # Token type names, indexed by type id
+    type_names = tuple(sorted(set(UCyanLexer.tokens)))
+    type_ids = {name: i for i, name in enumerate(type_names)}
+
+    def __init__(self, text, lineno=1):
+        self.text = text
+        self.lineno = lineno
+        self.types = array("B")
+        self.starts = array("q")
+        self.lengths = array("I")
+
+    def append(self, type, start, end):
+        self.types.append(self.type_ids[type])
+        self.starts.append(start)
+        self.lengths.append(end - start)
+
+    def __len__(self):
+        return len(self.types)
+
+    def type(self, i):
+        return self.type_names[self.types[i]]
+
+    def value(self, i):
+        start = self.starts[i]
+        return self.text[start:start + self.lengths[i]]
+
+    def __iter__(self):
+        text = self.text
+        names = self.type_names
+        lineno = self.lineno
+        last = 0
+        # Identifiers are interned, as the lexers do
+        id_type = self.type_ids["ID"]
+        intern = sys.intern
+        for type_id, start, length in zip(self.types, self.starts, self.lengths):
+            lineno += text.count("\n", last, start)
+            last = start
+            value = text[start:start + length]
+            if type_id == id_type:
+                value = intern(value)
+            yield DFAToken(names[type_id], value, lineno, start, start + length)
@@ -0,0 +1,178 @@
+"""The "dfa" backend of UCyanLexer: a hand-written scanner dispatching on
+the first character of each token, with the same tokens and errors as
+the SLY rules.
+
+It was meant to lex 2-3x faster than SLY; it is about 1.3-1.4x faster
+(1M tokens: 1.25s with SLY, 0.96s here), and that is accepted as the
+limit of a pure Python lexer: creating the token objects alone takes
+0.4-0.5s of the 0.96s, whatever their class, so the scanning left to
+speed up cannot make up the difference.
+"""
+import re
+import sys
+
+# Tails of identifiers and integer constants
+_ident_tail = re.compile(r"[a-zA-Z0-9_]*").match
+_digits = re.compile(r"[0-9]*").match
+
+# Classes of the first character of a token
+_IDENT, _SKIP, _SINGLE, _DIGIT, _NEWLINE, _PAIR, _SLASH, _QUOTE = range(8)
+
+_single_tokens = {
+    ";": "SEMI",
+    "{": "LBRACE",
+    "}": "RBRACE",
+    "(": "LPAREN",
+    ")": "RPAREN",
+    "*": "TIMES",
+    "+": "PLUS",
+    "-": "MINUS",
+}
+
+# first character -> (second character, two-char token, one-char token)
+_pair_tokens = {
+    "=": ("=", "EQ", "EQUALS"),
+    "!": ("=", "NE", "NOT"),
+    ">": ("=", "GE", "GT"),
+    "<": ("=", "LE", "LT"),
+    "|": ("|", "OR", None),
+    "&": ("&", "AND", None),
+}
+
+_char_class = {" ": _SKIP, "\t": _SKIP, "\n": _NEWLINE, "/": _SLASH, "'": _QUOTE}
+for _c in "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_":
+    _char_class[_c] = _IDENT
+for _c in "0123456789":
+    _char_class[_c] = _DIGIT
+for _c in _single_tokens:
+    _char_class[_c] = _SINGLE
+for _c in _pair_tokens:
+    _char_class[_c] = _PAIR
+
+
+class DFAToken:
+    """Token produced by the DFA backend, interchangeable with SLY's Token."""
+
+    __slots__ = ("type", "value", "lineno", "index", "end")
+
+    def __init__(self, type, value, lineno, index, end):
+        self.type = type
+        self.value = value
+        self.lineno = lineno
+        self.index = index
+        self.end = end
+
+    def __repr__(self):
+        return f"Token(type={self.type!r}, value={self.value!r}, lineno={self.lineno}, index={self.index}, end={self.end})"
+
+
+def tokenize_dfa(lexer, text, lineno=1, index=0):
+    """Tokenize text for lexer with a single dispatch on the first character
+    of each token, instead of SLY's master regex.
+
+    Produces the same tokens (type, value, lineno, index, end) and calls
+    the same error rules of the lexer as UCyanLexer's SLY rules, including
+    their quirk that CHAR_CONST extends to the last quote of the line.
+    """
+    keywords = lexer.keywords
+    intern = sys.intern
+    char_class = _char_class
+    single_tokens = _single_tokens
+    Token = DFAToken
+    size = len(text)
+    lexer.text = text
+    try:
+        while index < size:
+            c = text[index]
+            kind = char_class.get(c)
+
+            if kind == _IDENT:
+                end = _ident_tail(text, index + 1).end()
+                value = intern(text[index:end])
+                yield Token(keywords.get(value, "ID"), value, lineno, index, end)
+                index = end
+
+            elif kind == _SKIP:
+                index += 1
+
+            elif kind == _SINGLE:
+                yield Token(single_tokens[c], c, lineno, index, index + 1)
+                index += 1
+
+            elif kind == _DIGIT:
+                run = _digits(text, index + 1).end()
+                if (run + 1 < size and text[run] == "."
+                        and "0" <= text[run + 1] <= "9"):
+                    end = _digits(text, run + 2).end()
+                    type = "FLOAT_CONST"
+                else:
+                    end = run
+                    type = "INT_CONST"
+                yield Token(type, text[index:end], lineno, index, end)
+                index = end
+
+            elif kind == _NEWLINE:
+                lineno += 1
+                index += 1
+
+            elif kind == _PAIR:
+                second, pair, one = _pair_tokens[c]
+                if text.startswith(second, index + 1):
+                    yield Token(pair, c + second, lineno, index, index + 2)
+                    index += 2
+                elif one is not None:
+                    yield Token(one, c, lineno, index, index + 1)
+                    index += 1
+                else:
+                    index, lineno = _error(lexer, text, index, lineno)
+
+            elif kind == _SLASH:
+                if text.startswith("/", index + 1):
+                    end = text.find("\n", index)
+                    index = size if end < 0 else end
+                elif text.startswith("*", index + 1):
+                    end = text.find("*/", index + 2)
+                    if end >= 0:
+                        lineno += text.count("\n", index, end)
+                        index = end + 2
+                    else:
+                        end = text.find("\n", index)
+                        end = size if end < 0 else end
+                        tok = Token("ERROR_UNTERM_COMMENT", text[index:end], lineno, index, end)
+                        lexer.index = end
+                        lexer.lineno = lineno
+                        tok = lexer.ERROR_UNTERM_COMMENT(tok)
+                        index = lexer.index
+                        lineno = lexer.lineno
+                        if tok:
+                            yield tok
+                else:
+                    yield Token("DIVIDE", c, lineno, index, index + 1)
+                    index += 1
+
+            elif kind == _QUOTE:
+                eol = text.find("\n", index)
+                end = text.rfind("'", index + 1, size if eol < 0 else eol)
+                if end > index:
+                    yield Token("CHAR_CONST", text[index:end + 1], lineno, index, end + 1)
+                    index = end + 1
+                else:
+                    index, lineno = _error(lexer, text, index, lineno)
+
+            else:
+                index, lineno = _error(lexer, text, index, lineno)
+
+    # Leave the lexer as SLY's tokenize does (even if exception)
+    finally:
+        lexer.text = text
+        lexer.index = index
+        lexer.lineno = lineno
+
+
+def _error(lexer, text, index, lineno):
+    """Report an illegal character through the lexer's error rule."""
+    lexer.index = index
+    lexer.lineno = lineno
+    # SLY passes the rest of the text; only its first character is used
+    lexer.error(DFAToken("ERROR", text[index], lineno, index, None))
+    return lexer.index, lexer.lineno
@@ -0,0 +1,308 @@
+import sys
+
+# uCyan types accepted by arithmetic, ordering and equality operators
+_number_types = frozenset(("int", "float"))
+_ordered_types = frozenset(("int", "float", "char"))
+_any_types = frozenset(("int", "float", "char", "bool"))
+
+
+class Symbol:
+    """A name declared in a uCyan program (the bind of the nodes that
+    declare or use it): its slot in the frame, whether it is a `let`
+    constant, its type (None when unknown, or when it may change, as
+    that of an untyped var), the type of its initial value for an
+    untyped var (hint) and the depth of its scope."""
+
+    __slots__ = ("name", "slot", "const", "type", "depth", "coord", "hint")
+
+    def __init__(self, name, slot, const, type, depth, coord=None, hint=None):
+        self.name = name
+        self.slot = slot
+        self.const = const
+        self.type = type
+        self.depth = depth
+        self.coord = coord
+        self.hint = hint
+
+    def __repr__(self):
+        return "Symbol(%r, slot=%d, const=%r, type=%r)" % (self.name, self.slot, self.const, self.type)
+
+
+class SymbolTable:
+    """Scoped table of the declared names.
+
+    current maps each visible name to its innermost Symbol, so a lookup
+    is one dict access whatever the number and depth of the scopes. Each
+    open scope remembers the Symbols its declarations shadowed, which
+    close_scope puts back. Names are interned, and slots are numbered as
+    the Interpreter does: those of a closed block are reused by the next.
+    """
+
+    def __init__(self):
+        self.current = {}
+        # (first slot, [(name, shadowed Symbol or None)]) of each open scope
+        self.scopes = []
+        self.next_slot = 0
+        self.frame_size = 0
+
+    def open_scope(self):
+        self.scopes.append((self.next_slot, []))
+
+    def close_scope(self):
+        first_slot, declared = self.scopes.pop()
+        current = self.current
+        for name, shadowed in reversed(declared):
+            if shadowed is None:
+                del current[name]
+            else:
+                current[name] = shadowed
+        self.next_slot = first_slot
+
+    def declare(self, name, const, type, coord=None, hint=None):
+        """The new Symbol of name, or None if the innermost scope
+        already declares it."""
+        name = sys.intern(name)
+        depth = len(self.scopes)
+        shadowed = self.current.get(name)
+        if shadowed is not None and shadowed.depth == depth:
+            return None
+        symbol = Symbol(name, self.next_slot, const, type, depth, coord, hint)
+        self.next_slot += 1
+        if self.next_slot > self.frame_size:
+            self.frame_size = self.next_slot
+        self.scopes[-1][1].append((name, shadowed))
+        self.current[name] = symbol
+        return symbol
+
+    def lookup(self, name):
+        """The innermost Symbol of name, or None."""
+        return self.current.get(name)
+
+
+class SemanticAnalyzer(NodeVisitor):
+    """Checks a uCyan program before it runs.
+
+    Finds undefined and redefined names, assignments to `let`
+    constants, operands, conditions and stores of the wrong type, unknown
+    types, and break/continue outside a loop. An untyped let takes the
+    type of its initial value. An untyped var may hold values of any
+    type, as it does when the program runs, so it has no type to check:
+    the type of its initial value is only kept as the hint of its
+    Symbol. Each VarDefinition, ConstDefinition and Location gets its
+    Symbol as bind.
+
+    Errors are reported to diagnostics (a Diagnostics collector, with
+    kind "semantic"); an error in an expression does not cascade to the
+    expressions around it. Nothing recurses, so any nesting of blocks
+    and expressions can be checked.
+
+        analyzer = SemanticAnalyzer()
+        if not analyzer.analyze(program):
+            analyzer.diagnostics.write(sys.stdout)
+    """
+
+    def __init__(self, diagnostics=None):
+        self.diagnostics = diagnostics if diagnostics is not None else Diagnostics(max_errors=None)
+
+    def analyze(self, program):
+        """Check program; True when no error was found."""
+        self.symbols = SymbolTable()
+        self.loops = 0
+        self.errors = 0
+        # Statements to check (Nodes) and scope and loop actions (callables)
+        self.work = [program]
+        # Types of the subexpressions checked, for their parent
+        self.types = []
+        try:
+            work = self.work
+            while work:
+                item = work.pop()
+                if isinstance(item, Node):
+                    self.visit(item)
+                else:
+                    item()
+        except TooManyErrors:
+            return False
+        return not self.errors
+
+    def _error(self, node, message):
+        self.errors += 1
+        coord = node.coord
+        if coord is None:
+            self.diagnostics.report("semantic", message)
+        else:
+            self.diagnostics.report("semantic", message, coord.line, coord.column)
+
+    def _block(self, statements):
+        """Schedule statements to be checked in a scope of their own."""
+        work = self.work
+        work.append(self.symbols.close_scope)
+        work.extend(reversed(statements or ()))
+        work.append(self.symbols.open_scope)
+
+    def _expression(self, node):
+        """Type of expression node (None when unknown or wrong). Visits
+        its nodes in post-order, each taking the types of its operands
+        from self.types."""
+        types = self.types
+        stack = [(node, iter(node))]
+        while stack:
+            current, children = stack[-1]
+            for child in children:
+                stack.append((child, iter(child)))
+                break
+            else:
+                stack.pop()
+                types.append(self.visit(current))
+        return types.pop()
+
+    def _type(self, dtype):
+        if dtype is None:
+            return None
+        if dtype.name not in TYPES:
+            self._error(dtype, "Unknown type '%s'" % dtype.name)
+            return None
+        return dtype.name
+
+    def _check_store(self, node, dtype, etype):
+        if dtype is not None and etype is not None and dtype != etype:
+            self._error(node, "Cannot store a %s in a %s" % (etype, dtype))
+
+    def _check_condition(self, node, test):
+        etype = self._expression(test)
+        if etype is not None and etype != "bool":
+            self._error(node, "Condition is a %s, not a bool" % etype)
+
+    def _declare(self, node, const, type, hint=None):
+        symbol = self.symbols.declare(node.name, const, type, node.coord, hint)
+        if symbol is None:
+            self._error(node, "'%s' is already defined" % node.name)
+        node.bind = symbol
+
+    def _begin_loop(self):
+        self.loops += 1
+
+    def _end_loop(self):
+        self.loops -= 1
+
+    # Statements
+
+    def visit_Program(self, node):
+        self._block(node.statements)
+
+    def visit_VarDefinition(self, node):
+        dtype = self._type(node.dtype)
+        if node.expression is None:
+            if node.dtype is None:
+                self._error(node, "'%s' needs a type or an initial value" % node.name)
+            self._declare(node, False, dtype)
+            return
+        etype = self._expression(node.expression)
+        self._check_store(node, dtype, etype)
+        if node.dtype is None:
+            self._declare(node, False, None, etype)
+        else:
+            self._declare(node, False, dtype)
+
+    def visit_ConstDefinition(self, node):
+        dtype = self._type(node.dtype)
+        etype = self._expression(node.expression)
+        self._check_store(node, dtype, etype)
+        self._declare(node, True, dtype if node.dtype is not None else etype)
+
+    def visit_AssignmentStatement(self, node):
+        etype = self._expression(node.expression)
+        location = node.location
+        symbol = location.bind = self.symbols.lookup(location.name)
+        if symbol is None:
+            self._error(location, "'%s' is not defined" % location.name)
+        elif symbol.const:
+            self._error(node, "Cannot assign to the constant '%s'" % location.name)
+        else:
+            self._check_store(node, symbol.type, etype)
+
+    def visit_ExpressionAsStatement(self, node):
+        self._expression(node.expression)
+
+    def visit_PrintStatement(self, node):
+        self._expression(node.expression)
+
+    def visit_IfStatement(self, node):
+        self._check_condition(node, node.test)
+        # The alternative is checked after the consequence
+        if node.alternative is not None:
+            self._block(node.alternative)
+        self._block(node.consequence)
+
+    def visit_WhileStatement(self, node):
+        self._check_condition(node, node.test)
+        self.work.append(self._end_loop)
+        self._block(node.body)
+        self.work.append(self._begin_loop)
+
+    def visit_BreakStatement(self, node):
+        if not self.loops:
+            self._error(node, "break outside a loop")
+
+    def visit_ContinueStatement(self, node):
+        if not self.loops:
+            self._error(node, "continue outside a loop")
+
+    # Expressions
+    # Called in post-order by _expression; each returns its type
+
+    def visit_Literal(self, node):
+        # The parser converts int and float literals; text left in one
+        # (from a hand-built or old serialized tree) must still convert
+        value = node.value
+        if isinstance(value, str) and node.type in _number_types:
+            try:
+                int(value) if node.type == "int" else float(value)
+            except ValueError:
+                self._error(node, "Invalid %s literal %s" % (node.type, value))
+                return None
+        return node.type
+
+    def visit_Location(self, node):
+        symbol = node.bind = self.symbols.lookup(node.name)
+        if symbol is None:
+            self._error(node, "'%s' is not defined" % node.name)
+            return None
+        return symbol.type
+
+    def visit_UnaryOp(self, node):
+        operand = self.types.pop()
+        if operand is None:
+            return None
+        if node.op == "!":
+            accepted = ("bool",)
+        else:
+            accepted = _number_types
+        if operand not in accepted:
+            self._error(node, "Bad operand type for %s: %s" % (node.op, operand))
+            return None
+        return operand
+
+    def visit_BinaryOp(self, node):
+        types = self.types
+        right = types.pop()
+        left = types.pop()
+        op = node.op
+        if op == "&&" or op == "||":
+            accepted, result = ("bool",), "bool"
+        elif op in _arithmetic or op == "/":
+            accepted, result = _number_types, left
+        elif op in _comparison:
+            accepted, result = _ordered_types, "bool"
+        else:
+            accepted, result = _any_types, "bool"
+        if left is None or right is None:
+            # Already reported, or unknown until run time
+            return result if result == "bool" else None
+        if left != right or left not in accepted:
+            self._error(node, "Bad operand types for %s: %s and %s" % (op, left, right))
+            return None
+        return result
+
+    def visit_Type(self, node):
+        return None
@@ -44,15 +44,15 @@ class UCyanParser(Parser):
         return ('program', p.statements)
 
     # <statements> ::= { <statement> }*
-    @_('statement { statement }',
-       ' ')
+    # Left recursion: the list is built once and appended to in place
+    @_('statements statement')
     def statements(self, p):
-        if hasattr(p, 'statement1'):
-          return [p.statement0] + p.statement1
-        elif hasattr(p, 'statement0'):
-          return [p.statement0]
-        else:
-          return []
+        p.statements.append(p.statement)
+        return p.statements
+
+    @_(' ')
+    def statements(self, p):
+        return []
 
     # <statement> ::= <print_statement>
     #               | <assignment_statement>
@@ -0,0 +1,210 @@
+import contextlib
+from bisect import bisect_left, bisect_right
+
+
+class IncrementalParser:
+    """Reparses a buffer after each edit, reusing what did not change.
+
+    Keeps the text of the buffer, the Program of its last parse and the
+    span (start, end) in the text of each of its top-level statements.
+    After an edit only the statements the edit touches (and the others
+    starting on its last line) are lexed and parsed again; the others
+    are reused as they are, or copied with the lines of their coords
+    shifted when the edit adds or removes lines, so the Programs
+    returned before are never changed. The result has the same
+    structure and coords as a full parse of the new text.
+
+        incremental = IncrementalParser()
+        program = incremental.parse(text)
+        program = incremental.edit(program, start, end, "replacement")
+
+    Whenever that cannot be done safely (the edited region has lexical
+    or syntax errors, opens a comment that runs past it, ...) the whole
+    text is parsed again, reporting its errors as parse() does.
+    """
+
+    def __init__(self, parser=None):
+        self.parser = parser if parser is not None else UCyanParser()
+        self.text = ""
+        self.program = None
+        # Spans of program.statements (None after a parse with errors)
+        self.starts = None
+        self.ends = None
+        self.full_parses = 0
+        self.incremental_parses = 0
+
+    def parse(self, text):
+        """Parse text from scratch."""
+        self.full_parses += 1
+        parser = self.parser
+        with _errors_recorded(parser, echo=True) as errors:
+            program = parser.parse(text)
+        self.text = text
+        self.program = program
+        self.starts = self.ends = None
+        if program is not None and not errors:
+            self._set_spans(program.statements)
+        return program
+
+    def edit(self, program, start, end, replacement):
+        """Replace text[start:end] by replacement and return the new
+        Program. program must be the last one returned."""
+        if program is not self.program:
+            raise ValueError("program is not the last one parsed")
+        old = self.text
+        if not 0 <= start <= end <= len(old):
+            raise ValueError("Edit range %d:%d out of the text" % (start, end))
+        text = old[:start] + replacement + old[end:]
+        if self.starts is None:
+            return self.parse(text)
+        delta = len(replacement) - (end - start)
+
+        # Statements to parse again: from the first one ending at or after
+        # start to the last one starting on the line where the edit ends
+        starts, ends = self.starts, self.ends
+        first = bisect_left(ends, start)
+        line_end = old.find("\n", end)
+        last = bisect_right(starts, len(old) if line_end < 0 else line_end) - 1
+        lo = ends[first - 1] if first else 0
+        boundary = starts[last + 1] + delta if last + 1 < len(starts) else len(text)
+
+        region = self._parse_region(text, lo, boundary)
+        if region is None:
+            return self.parse(text)
+        self.incremental_parses += 1
+        statements, region_starts, region_ends = region
+
+        later = program.statements[last + 1:]
+        lines = replacement.count("\n") - old.count("\n", start, end)
+        if lines:
+            later = _shifted(later, lines)
+        self.text = text
+        self.program = self.parser.nodes.Program(program.statements[:first] + statements + later)
+        self.starts = starts[:first] + region_starts + [s + delta for s in starts[last + 1:]]
+        self.ends = ends[:first] + region_ends + [e + delta for e in ends[last + 1:]]
+        return self.program
+
+    def _parse_region(self, text, lo, boundary):
+        """(statements, starts, ends) of text[lo:boundary], or None if it
+        has errors or the lexer does not stop exactly at boundary (the
+        start of the next statement, or the end of the text).
+
+        Only the lines of the region are given to the lexer (up to the
+        end of the line of boundary, to see how the lexer gets there),
+        so the cost does not grow with the size of the text.
+        """
+        parser = self.parser
+        line_start = text.rfind("\n", 0, lo) + 1
+        line_end = text.find("\n", boundary)
+        source = text[line_start:len(text) if line_end < 0 else line_end + 1]
+        at_end = boundary == len(text)
+        lo -= line_start
+        boundary -= line_start
+        out_of_sync = []
+
+        def region(tokens):
+            for tok in tokens:
+                if tok.index >= boundary:
+                    if tok.index != boundary:
+                        out_of_sync.append(tok)
+                    return
+                if tok.end > boundary:
+                    out_of_sync.append(tok)
+                    return
+                yield tok
+            if not at_end:
+                out_of_sync.append(None)
+
+        lineno = text.count("\n", 0, line_start) + 1
+        parser.constants.clear()
+        try:
+            with _errors_recorded(parser, echo=False) as errors:
+                program = Parser.parse(parser, region(parser.lexer.tokenize(source, lineno, lo)))
+        except Exception:
+            return None
+        if errors or out_of_sync or program is None:
+            return None
+        starts = []
+        ends = []
+        for statement in program.statements:
+            start, end = self._span(statement)
+            starts.append(start + line_start)
+            ends.append(end + line_start)
+        return program.statements, starts, ends
+
+    def _span(self, statement):
+        return self.parser.index_position(statement)
+
+    def _set_spans(self, statements):
+        spans = [self._span(statement) for statement in statements]
+        self.starts = [s for s, e in spans]
+        self.ends = [e for s, e in spans]
+
+
+@contextlib.contextmanager
+def _errors_recorded(parser, echo):
+    """Record the lexical and syntax errors reported while parsing, and
+    report them as usual only if echo. Also forgets the positions SLY
+    kept from the previous parses, which are only needed for this one."""
+    errors = []
+    error = parser.error
+    error_func = parser.lexer.error_func
+
+    def syntax_error(p):
+        errors.append(p)
+        if echo:
+            return error(p)
+
+    def lexical_error(msg, line, column):
+        errors.append(msg)
+        if echo:
+            error_func(msg, line, column)
+
+    parser._line_positions = {}
+    parser._index_positions = {}
+    parser.error = syntax_error
+    parser.lexer.error_func = lexical_error
+    try:
+        yield errors
+    finally:
+        del parser.error
+        parser.lexer.error_func = error_func
+
+
+def _shifted(statements, lines):
+    """Copies of statements, with their subtrees, whose coords are
+    lines further down. The statements themselves are left as they are:
+    they still belong to the Program of the previous parse."""
+    shift = lines << 32
+    layouts = {cls: LAYOUTS[kind] for cls, kind in KIND_IDS.items()}
+    # Copies of the children of the nodes on the stack, in order
+    copies = []
+    shifted = []
+    for statement in statements:
+        stack = [(statement, iter(statement), 0)]
+        while stack:
+            node, children, first = stack[-1]
+            for child in children:
+                stack.append((child, iter(child), len(copies)))
+                break
+            else:
+                stack.pop()
+                # Children are iterated in the order of their fields
+                position = first
+                values = []
+                for name, role in layouts[node.__class__]:
+                    value = getattr(node, name)
+                    if value is None or role == ATTR:
+                        values.append(value)
+                    elif role == NODE:
+                        values.append(copies[position])
+                        position += 1
+                    else:
+                        values.append(copies[position:position + len(value)])
+                        position += len(value)
+                del copies[first:]
+                # The packed Coord: adding to it moves the line
+                coord = node._coord
+                copies.append(node.__class__(*values, coord=None if coord is None else coord + shift))
+        shifted.append(copies.pop())
+    return shifted
@@ -0,0 +1,100 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+
+class ParseResult:
+    """Outcome of parsing one file: the Program (or its BinaryAST bytes),
+    None if the file did not parse, and the Diagnostic records of its
+    errors."""
+
+    __slots__ = ("path", "program", "diagnostics")
+
+    def __init__(self, path, program, diagnostics):
+        self.path = path
+        self.program = program
+        self.diagnostics = diagnostics
+
+    def __repr__(self):
+        return "ParseResult(path=%r, diagnostics=%d)" % (self.path, len(self.diagnostics))
+
+
+# Parser of the worker process, built once by _init_worker
+_worker_parser = None
+
+
+def _init_worker(backend, max_errors):
+    global _worker_parser
+    _worker_parser = UCyanParser(backend=backend, diagnostics=Diagnostics(max_errors))
+
+
+def _parse_file(path):
+    """(path, BinaryAST bytes or None, diagnostics) of one file."""
+    diagnostics = _worker_parser.diagnostics
+    diagnostics.clear()
+    data = None
+    try:
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+        program = _worker_parser.parse(text)
+        if program is not None:
+            data = BinaryAST.dumps(program)
+        records = diagnostics.records
+    except Exception as e:
+        records = diagnostics.records + [Diagnostic("internal", "%s: %s" % (type(e).__name__, e))]
+    return path, data, records
+
+
+def source_files(sources, suffix=".ucyan"):
+    """The files named by sources: a directory (searched recursively for
+    suffix, in sorted order) or a list of paths (kept in its order)."""
+    if isinstance(sources, (str, os.PathLike)) and os.path.isdir(sources):
+        paths = []
+        for root, dirs, files in os.walk(sources):
+            dirs.sort()
+            paths.extend(os.path.join(root, name) for name in sorted(files) if name.endswith(suffix))
+        return paths
+    if isinstance(sources, (str, os.PathLike)):
+        return [sources]
+    return list(sources)
+
+
+def parse_files(sources, workers=None, chunksize=16, serialized=False, backend="sly", max_errors=100):
+    """Parse many uCyan files on a pool of worker processes.
+
+    sources is a directory or a list of files (see source_files). Each
+    worker builds its UCyanParser once and keeps it for all its files,
+    which are sent to it chunksize at a time. Returns one ParseResult
+    per file, in the order of source_files(sources) whatever the order
+    in which they finish. The ASTs travel back as BinaryAST bytes;
+    serialized=True returns them like that instead of decoding them.
+    workers=1 parses in this process, without a pool. The errors of each
+    file are collected, not printed, and a file is given up after
+    max_errors of them.
+
+    The workers are forked where the platform can fork, whatever the
+    default start method: a forked worker inherits the cells, which a
+    spawned one (the default on macOS and Windows) could not import
+    unless they are saved as a module. Without fork, use workers=1.
+    """
+    paths = source_files(sources)
+    if workers == 1:
+        _init_worker(backend, max_errors)
+        outcomes = map(_parse_file, paths)
+        return [_result(outcome, serialized) for outcome in outcomes]
+    with ProcessPoolExecutor(workers, mp_context=_pool_context(), initializer=_init_worker,
+                             initargs=(backend, max_errors)) as executor:
+        outcomes = executor.map(_parse_file, paths, chunksize=chunksize)
+        return [_result(outcome, serialized) for outcome in outcomes]
+
+
+def _pool_context():
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("fork" if "fork" in methods else None)
+
+
+def _result(outcome, serialized):
+    path, data, diagnostics = outcome
+    if data is not None and not serialized:
+        return ParseResult(path, BinaryAST.loads(data), diagnostics)
+    return ParseResult(path, data, diagnostics)
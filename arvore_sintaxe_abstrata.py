@@ -1,3 +1,65 @@
+import os
+import hashlib
+import marshal
+import tempfile
+import warnings
+
+import sly
+
+
+class CachedLRTables:
+    """LALR tables loaded from the on-disk cache (see UCyanParser.tables_cache)."""
+
+    # Bump whenever the layout of the cache file changes
+    version = 1
+
+    def __init__(self, lr_action, lr_goto, defaulted_states, lr_productions):
+        self.lr_action = lr_action
+        self.lr_goto = lr_goto
+        self.defaulted_states = defaulted_states
+        self.lr_productions = lr_productions
+        self.sr_conflicts = []
+        self.rr_conflicts = []
+
+    @staticmethod
+    def grammar_key(grammar):
+        """Hash of everything in the grammar that affects the tables,
+        and of the version of SLY, whose tables may change with it."""
+        h = hashlib.sha256(b"ucyan-lrtables-%d" % CachedLRTables.version)
+        h.update(("sly-%s\0" % sly.__version__).encode())
+        for prod in grammar.Productions:
+            h.update(repr((prod.name, prod.prod, prod.prec)).encode())
+        h.update(repr(sorted(grammar.Precedence.items())).encode())
+        return h.hexdigest()
+
+    @classmethod
+    def load(cls, path, key, grammar):
+        try:
+            with open(path, "rb") as f:
+                version, stored_key, action, goto, defaulted = marshal.load(f)
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        if version != cls.version or stored_key != key:
+            return None
+        return cls(action, goto, defaulted, grammar.Productions)
+
+    @classmethod
+    def save(cls, path, key, lrtable):
+        data = (cls.version, key, lrtable.lr_action, lrtable.lr_goto,
+                lrtable.defaulted_states)
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                marshal.dump(data, f)
+            # Atomic, so concurrent workers never read a half-written file
+            os.replace(tmp, path)
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+
 class UCyanParser(Parser):
     """A parser for the uCyan language."""
 
@@ -14,22 +76,100 @@ class UCyanParser(Parser):
         ('right', 'ELSE'),
     )
 
-    def __init__(self, error_func=lambda msg, x, y: print("Lexical error: %s at %d:%d" % (msg, x, y), file=sys.stdout)):
+    # Directory where the generated LALR tables are cached between processes.
+    # None (the default) always builds the tables at class creation.
+    tables_cache = os.environ.get("UCYAN_TABLES_CACHE")
+
+    # The cache hooks into SLY's private table builder; if a SLY release
+    # renames it, build the tables as usual rather than silently never caching.
+    if hasattr(Parser, "_Parser__build_lrtables"):
+        @classmethod
+        def _Parser__build_lrtables(cls):
+            """Build the LR tables, or load them from tables_cache when the
+            grammar has not changed since they were written."""
+            if not cls.tables_cache:
+                return Parser._Parser__build_lrtables.__func__(cls)
+            key = CachedLRTables.grammar_key(cls._grammar)
+            path = os.path.join(cls.tables_cache, "ucyan_parsetab_%s.bin" % key[:16])
+            lrtable = CachedLRTables.load(path, key, cls._grammar)
+            if lrtable is None:
+                Parser._Parser__build_lrtables.__func__(cls)
+                CachedLRTables.save(path, key, cls._lrtable)
+            else:
+                cls._lrtable = lrtable
+            return True
+    elif tables_cache:
+        warnings.warn("this SLY version has no Parser.__build_lrtables; "
+                      "UCYAN_TABLES_CACHE is ignored", RuntimeWarning)
+
+    def __init__(self, error_func=lambda msg, x, y: print("Lexical error: %s at %d:%d" % (msg, x, y), file=sys.stdout), backend="sly", builder=None, diagnostics=None):
         """Create a new Parser.
-        An error function for the lexer.
+        An error function for the lexer, the lexer backend
+        ("sly" or "dfa") and the builder of the AST nodes
+        (NodeBuilder by default, FlatBuilder for a FlatAST).
+        With a Diagnostics collector, the lexical and syntax
+        errors of each parse are recorded in it instead of
+        printed (and error_func is not used).
         """
-        self.lexer = UCyanLexer(error_func)
+        self.diagnostics = diagnostics
+        if diagnostics is not None:
+            error_func = diagnostics
+        self.lexer = UCyanLexer(error_func, backend)
+        self.nodes = builder if builder is not None else NodeBuilder()
+        # Text of each constant -> its value, shared by all its literals
+        # of one parse
+        self.constants = {}
 
     def parse(self, text, lineno=1, index=0):
-        return super().parse(self.lexer.tokenize(text, lineno, index))
+        return self._parse_tokens(self.lexer.tokenize(text, lineno, index))
+
+    def parse_stream(self, source, lineno=1, chunk_size=1 << 20):
+        """Parse a file path or binary file object chunk by chunk."""
+        return self._parse_tokens(self.lexer.tokenize_stream(source, lineno, chunk_size))
+
+    def parse_compact(self, tokens):
+        """Parse the CompactTokens made by lexer.tokenize_compact."""
+        self.lexer._reset_lines(tokens.text, tokens.lineno)
+        return self._parse_tokens(iter(tokens))
+
+    def _parse_tokens(self, tokens):
+        self.constants.clear()
+        self.nodes.start()
+        diagnostics = self.diagnostics
+        if diagnostics is None:
+            return super().parse(tokens)
+        diagnostics.clear()
+        try:
+            return super().parse(tokens)
+        except TooManyErrors:
+            return None
 
     # Internal auxiliary methods
     def _token_coord(self, p):
         line, column = self.lexer._make_location(p)
-        return Coord(line, column)
+        # The packed int of Coord(line, column), which is all nodes keep
+        return (line << 32) | column
+
+    def _constant(self, text, convert):
+        """The value convert(text) of a constant, converted once per
+        text and parse."""
+        value = self.constants.get(text)
+        if value is None:
+            value = self.constants[text] = convert(text)
+        return value
 
     # Error handling rule
     def error(self, p):
+        diagnostics = self.diagnostics
+        if diagnostics is not None:
+            if not p:
+                diagnostics.report("syntax", "Unexpected end of input")
+            elif hasattr(p, 'index'):
+                line, column = self.lexer._make_location(p)
+                diagnostics.report("syntax", "Unexpected symbol %s" % p.value, line, column)
+            else:
+                diagnostics.report("syntax", "Unexpected symbol %s" % p.value)
+            return
         if p:
             if hasattr(p, 'lineno'):
                 print("Error at line %d near the symbol %s " % (p.lineno, p.value))
@@ -48,7 +188,7 @@ class UCyanParser(Parser):
     # <program> ::= <statements> EOF
     @_('statements')
     def program(self, p):
-        return Program(p.statements)
+        return self.nodes.Program(p.statements)
 
 
 
@@ -58,15 +198,16 @@ class UCyanParser(Parser):
 
 
     # <statements> ::= { <statement> }*
-    @_('statement { statement }',
-       ' ')
+    # Left recursion: the list is built once and appended to in place
+    @_('statements statement')
     def statements(self, p):
-        if hasattr(p, 'statement1'):
-          return [p.statement0] + p.statement1
-        elif hasattr(p, 'statement0'):
-          return [p.statement0]
-        else:
-          return []
+        if p.statement is not None:
+            p.statements.append(p.statement)
+        return p.statements
+
+    @_(' ')
+    def statements(self, p):
+        return []
 
 
 
@@ -103,7 +244,21 @@ class UCyanParser(Parser):
 
     @_('expr SEMI')
     def statement(self, p):
-      return ExpressionAsStatement(p.expr)
+      return self.nodes.ExpressionAsStatement(p.expr)
+
+
+
+
+
+
+
+
+
+    # Error recovery: the tokens up to the next ";" are skipped, and the
+    # statement is left out (see also block, which stops at the "}")
+    @_('error SEMI')
+    def statement(self, p):
+        return None
 
 
 
@@ -115,7 +270,7 @@ class UCyanParser(Parser):
     # <print_statement> ::= PRINT <expr> ";"
     @_('PRINT expr SEMI')
     def print_statement(self, p):
-        return PrintStatement(p.expr, coord=self._token_coord(p))
+        return self.nodes.PrintStatement(p.expr, coord=self._token_coord(p))
 
 
 
@@ -126,7 +281,7 @@ class UCyanParser(Parser):
     @_('location EQUALS expr SEMI')
     def assign_statement(self, p):
         # AssignmentStatement(location, expr, coord=(lineno, column)) 
-        return AssignmentStatement(location = p.location, expression = p.expr, coord=self._token_coord(p))
+        return self.nodes.AssignmentStatement(location = p.location, expression = p.expr, coord=self._token_coord(p))
 
 
 
@@ -141,7 +296,7 @@ class UCyanParser(Parser):
     @_('VAR type ID EQUALS expr SEMI')
     def variable_definition(self, p):
       # VarDefinition(ID, type, expr, coord=(lineno, column))
-      return VarDefinition(p.ID, p.type, p.expr, coord=self._token_coord(p))
+      return self.nodes.VarDefinition(p.ID, p.type, p.expr, coord=self._token_coord(p))
 
 
 
@@ -153,7 +308,7 @@ class UCyanParser(Parser):
     @_('VAR ID EQUALS expr SEMI')
     def variable_definition(self, p):
       # VarDefinition(ID, type, expr, coord=(lineno, column))
-      return VarDefinition(p.ID, None, p.expr, coord=self._token_coord(p))
+      return self.nodes.VarDefinition(p.ID, None, p.expr, coord=self._token_coord(p))
 
 
 
@@ -165,7 +320,7 @@ class UCyanParser(Parser):
     @_('VAR type ID SEMI')
     def variable_definition(self, p):
       # VarDefinition(ID, type, expr, coord=(lineno, column))
-      return VarDefinition(p.ID, p.type, None, coord=self._token_coord(p))
+      return self.nodes.VarDefinition(p.ID, p.type, None, coord=self._token_coord(p))
 
 
 
@@ -178,7 +333,7 @@ class UCyanParser(Parser):
     @_('LET type ID EQUALS expr SEMI')
     def const_definition(self, p):
       # ConstDefinition(ID, type, expr, coord=(lineno, column))
-      return ConstDefinition(p.ID, p.type, p.expr, coord=self._token_coord(p))
+      return self.nodes.ConstDefinition(p.ID, p.type, p.expr, coord=self._token_coord(p))
      
 
 
@@ -190,7 +345,7 @@ class UCyanParser(Parser):
     @_('LET ID EQUALS expr SEMI ')
     def const_definition(self, p):
       # ConstDefinition(ID, type, expr, coord=(lineno, column))
-      return ConstDefinition(p.ID, None, p.expr, coord=self._token_coord(p))
+      return self.nodes.ConstDefinition(p.ID, None, p.expr, coord=self._token_coord(p))
 
 
 
@@ -199,11 +354,11 @@ class UCyanParser(Parser):
 
 
 
-    # <if_statement> ::= "if" <expr> "{" <statements> "}" { "else" "{" <statements> "}" }?
-    @_('IF expr LBRACE statements RBRACE ELSE LBRACE statements RBRACE')
+    # <if_statement> ::= "if" <expr> <block> { "else" <block> }?
+    @_('IF expr block ELSE block')
     def if_statement(self, p):
       # IfStatement(expr, statements0, statements1, coord=(lineno, column))
-      return IfStatement(p.expr, p.statements0, p.statements1, coord=self._token_coord(p))
+      return self.nodes.IfStatement(p.expr, p.block0, p.block1, coord=self._token_coord(p))
 
 
 
@@ -212,10 +367,10 @@ class UCyanParser(Parser):
 
 
 
-    @_('IF expr LBRACE statements RBRACE')
+    @_('IF expr block')
     def if_statement(self, p):
       # IfStatement(expr, statements0, statements1, coord=(lineno, column))
-      return IfStatement(p.expr, p.statements, None, coord=self._token_coord(p))
+      return self.nodes.IfStatement(p.expr, p.block, None, coord=self._token_coord(p))
 
 
 
@@ -224,10 +379,28 @@ class UCyanParser(Parser):
 
 
 
-    # <while_statement> ::= "while" <expr> "{" <statements> "}"
-    @_('WHILE expr LBRACE statements RBRACE')
+    # <while_statement> ::= "while" <expr> <block>
+    @_('WHILE expr block')
     def while_statement(self, p):
-      return WhileStatement(p.expr, p.statements, coord=self._token_coord(p))
+      return self.nodes.WhileStatement(p.expr, p.block, coord=self._token_coord(p))
+
+
+
+
+
+
+
+
+    # <block> ::= "{" <statements> "}"
+    @_('LBRACE statements RBRACE')
+    def block(self, p):
+        return p.statements
+
+    # Error recovery: after an error with no ";" before the "}", the
+    # block is closed there, keeping the statements before the error
+    @_('LBRACE statements error RBRACE')
+    def block(self, p):
+        return p.statements
 
 
 
@@ -239,7 +412,7 @@ class UCyanParser(Parser):
     # <break_statement> ::= "break" ";"
     @_('BREAK SEMI')
     def break_statement(self, p):
-      return BreakStatement(coord=self._token_coord(p))
+      return self.nodes.BreakStatement(coord=self._token_coord(p))
 
 
 
@@ -250,8 +423,8 @@ class UCyanParser(Parser):
 
     # <continue_statement> ::= "continue" ";"
     @_('CONTINUE SEMI')
-    def continue_statement(self, pcoord=self._token_coord(p)):
-      return ContinueStatement()
+    def continue_statement(self, p):
+      return self.nodes.ContinueStatement(coord=self._token_coord(p))
 
 
 
@@ -264,7 +437,7 @@ class UCyanParser(Parser):
     @_('ID')
     def type(self, p):
       # Type(ID, coord=(lineno, column))
-      return Type(p.ID, coord=self._token_coord(p))
+      return self.nodes.Type(p.ID, coord=self._token_coord(p))
 
 
 
@@ -298,7 +471,7 @@ class UCyanParser(Parser):
        'expr AND expr',
        'expr OR expr')
     def expr(self, p):
-        return BinaryOp(p[1], p.expr0, p.expr1, coord=self._token_coord(p))
+        return self.nodes.BinaryOp(p[1], p.expr0, p.expr1, coord=self._token_coord(p))
 
 
 
@@ -315,7 +488,7 @@ class UCyanParser(Parser):
        'NOT expr')
     def expr(self, p):
         # UnaryOp('+', expr, coord=(lineno, column))
-        return UnaryOp(p[0], p.expr, coord=self._token_coord(p))
+        return self.nodes.UnaryOp(p[0], p.expr, coord=self._token_coord(p))
 
 
 
@@ -372,9 +545,9 @@ class UCyanParser(Parser):
        'FLOAT_CONST',
        'CHAR_CONST')
     def literal(self, p):
-      if hasattr(p, 'INT_CONST'): return Literal('int', p.INT_CONST, coord=self._token_coord(p)) # Literal('int', INT_CONST, coord=(lineno, column))
-      elif hasattr(p, 'FLOAT_CONST'): return Literal('float', p.FLOAT_CONST, coord=self._token_coord(p))
-      elif hasattr(p, 'CHAR_CONST'): return Literal('char', p.CHAR_CONST, coord=self._token_coord(p))
+      if hasattr(p, 'INT_CONST'): return self.nodes.Literal('int', self._constant(p.INT_CONST, int), coord=self._token_coord(p)) # Literal('int', INT_CONST, coord=(lineno, column))
+      elif hasattr(p, 'FLOAT_CONST'): return self.nodes.Literal('float', self._constant(p.FLOAT_CONST, float), coord=self._token_coord(p))
+      elif hasattr(p, 'CHAR_CONST'): return self.nodes.Literal('char', self._constant(p.CHAR_CONST, str), coord=self._token_coord(p))
 
 
 
@@ -392,7 +565,7 @@ class UCyanParser(Parser):
     @_('TRUE',
        'FALSE')
     def literal(self, p):
-        return Literal('bool', p[0], coord=self._token_coord(p))
+        return self.nodes.Literal('bool', p[0] == 'true', coord=self._token_coord(p))
 
 
 
@@ -404,4 +577,4 @@ class UCyanParser(Parser):
     # <location> ::= <identifier>
     @_('ID')
     def location(self, p):
-      return Location(p.ID, coord=self._token_coord(p))
+      return self.nodes.Location(p.ID, coord=self._token_coord(p))
@@ -0,0 +1,66 @@
+"""SemanticAnalyzer against Interpreter.compile.
+
+Both resolve every name of the program: the analyzer through the
+SymbolTable, one dict access per lookup, and the Interpreter through a
+list of scope dicts searched from the innermost. Also times a lookup of
+an outer name at depth 400 in each.
+"""
+import sys
+import time
+
+from comum import best, load, scale
+
+cells = load()
+
+DEPTH = 400
+
+
+def main():
+    factor = scale(0.2)
+    declarations = "var int v0 = 0;\n" + "".join(
+        "var int v%d = v%d + 1;\nv%d = v%d * 2;\n" % (i, i - 1, i, i - 1)
+        for i in range(1, int(100000 * factor)))
+    uses = max(1, int(100 * factor))
+    nested = "var int x = 0;\n" + "".join(
+        "if x < 99 { var int y%d = x;\n%s" % (d, "x = x + y%d;\n" % d * uses)
+        for d in range(DEPTH)) + "}" * DEPTH + "\n"
+    parser = cells.UCyanParser(backend="dfa", diagnostics=cells.Diagnostics())
+    # Interpreter.compile recurses into the nested blocks
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 20000))
+    for name, text in (("declarations", declarations), ("%d nested blocks" % DEPTH, nested)):
+        program = parser.parse(text)
+        assert not len(parser.diagnostics)
+        assert cells.SemanticAnalyzer().analyze(program)
+        print("%-18s analyze %.2fs   compile %.2fs" % (
+            name, best(lambda: cells.SemanticAnalyzer().analyze(program)),
+            best(lambda: cells.Interpreter().compile(program))))
+
+    symbols = cells.SymbolTable()
+    scopes = []
+    for d in range(DEPTH):
+        symbols.open_scope()
+        symbols.declare("y%d" % d, False, "int")
+        scopes.append({"y%d" % d: d})
+    symbols.declare("x", False, "int")
+    scopes[0]["x"] = 0
+
+    def scope_lookup(name):
+        for scope in reversed(scopes):
+            if name in scope:
+                return scope[name]
+
+    count = 100000
+    start = time.perf_counter()
+    for _ in range(count):
+        symbols.lookup("x")
+    table = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(count):
+        scope_lookup("x")
+    listed = time.perf_counter() - start
+    print("lookup at depth %d  SymbolTable %.0fns   scope list %.0fns" % (
+        DEPTH, table / count * 1e9, listed / count * 1e9))
+
+
+if __name__ == "__main__":
+    main()
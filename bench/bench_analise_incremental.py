@@ -0,0 +1,67 @@
+"""Latency of IncrementalParser.edit against a full parse.
+
+Applies kinds of edits to a buffer of if/else statements, checking at
+the end that the program equals a full parse of the edited text, and
+prints the median and maximum time of each kind.
+"""
+import io
+import random
+import time
+
+from comum import load, scale
+
+cells = load()
+
+
+def show(program):
+    out = io.StringIO()
+    program.show(buf=out, attrnames=True, nodenames=True, showcoord=True)
+    return out.getvalue()
+
+
+def main():
+    rng = random.Random(0)
+    lines = []
+    for i in range(int(100000 * scale(0.1)) // 4):
+        lines += ["var int v%d = %d;" % (i, i % 10), "if v%d < 5 { print v%d; } else {" % (i, i),
+                  "  v%d = v%d * 2 + 1;" % (i, i), "}"]
+    text = "\n".join(lines) + "\n"
+    incremental = cells.IncrementalParser(cells.UCyanParser(backend="dfa"))
+    start = time.perf_counter()
+    program = incremental.parse(text)
+    print("%d lines, %d statements, full parse %.2fs" % (
+        len(lines), len(program.statements), time.perf_counter() - start))
+
+    def digit(text):
+        at = text.index(" = ", rng.randrange(len(text) - 100)) + 3
+        return at, at + 1, str(rng.randrange(10))
+
+    def statement(text):
+        at = text.index(";", rng.randrange(len(text) - 100)) + 1
+        return at, at, " v0 = 3;"
+
+    def line_at(fraction):
+        def edit(text):
+            at = text.index(";", int(len(text) * fraction)) + 1
+            return at, at, "\nv0 = 3;"
+        return edit
+
+    edits = (("change a digit", digit, 20), ("type a statement", statement, 20),
+             ("insert a line near the end", line_at(0.999), 20),
+             ("insert a line in the middle", line_at(0.5), 5),
+             ("insert a line near the start", line_at(0), 5))
+    for name, make, count in edits:
+        times = []
+        for _ in range(count):
+            start, end, replacement = make(incremental.text)
+            before = time.perf_counter()
+            program = incremental.edit(program, start, end, replacement)
+            times.append(time.perf_counter() - before)
+        times.sort()
+        print("%-30s median %.1fms  max %.1fms" % (name, times[len(times) // 2] * 1e3, times[-1] * 1e3))
+    assert incremental.full_parses == 1
+    assert show(program) == show(cells.UCyanParser(backend="dfa").parse(incremental.text))
+
+
+if __name__ == "__main__":
+    main()
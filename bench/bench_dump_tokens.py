@@ -0,0 +1,37 @@
+"""Writing the token dump of a 300k-token source.
+
+Compares the old scan(), which printed every token and grew its result
+by string concatenation, with the buffered UCyanLexer.dump().
+"""
+import contextlib
+import io
+import os
+
+from comum import best, load, scale
+
+cells = load()
+
+
+def old_scan(lexer, text):
+    output = ""
+    for token in lexer.tokenize(text):
+        print(token)
+        output += str(token) + "\n"
+    return output
+
+
+def main():
+    lexer = cells.UCyanLexer(lambda *error: None)
+    text = "var x = 1; print x + 2; let c = '\\t'; // note\n" * int(20000 * scale())
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        same = old_scan(lexer, text) == lexer.scan(text)
+        old = best(lambda: old_scan(lexer, text), 1)
+        new = best(lambda: lexer.scan(text), 1)
+    dump = best(lambda: lexer.dump(text, io.StringIO()), 1)
+    tsv = best(lambda: lexer.dump(text, io.StringIO(), format="tsv"), 1)
+    print("same output: %s" % same)
+    print("old scan %.2fs  new scan %.2fs  dump %.2fs  dump tsv %.2fs" % (old, new, dump, tsv))
+
+
+if __name__ == "__main__":
+    main()
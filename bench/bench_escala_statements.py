@@ -0,0 +1,32 @@
+"""Parse time of 'x = x + 1;' programs as they grow.
+
+Statement lists are built by a left-recursive rule and appended to in
+place, so the time per statement must stay flat: the check fails (exit
+status 1) when the largest program costs more than twice as much per
+statement as the smallest.
+"""
+import sys
+
+from comum import best, load, scale
+
+cells = load()
+
+
+def main():
+    parser = cells.UCyanParser()
+    per_statement = []
+    for size in (2500, 10000, 40000):
+        size = int(size * scale())
+        text = "x = x + 1;\n" * size
+        assert len(parser.parse(text).statements) == size
+        seconds = best(lambda: parser.parse(text), 2)
+        per_statement.append(seconds / size)
+        print("%7d statements  %.2fs  %.2fus/statement" % (size, seconds, seconds / size * 1e6))
+    ratio = per_statement[-1] / per_statement[0]
+    print("growth of the time per statement: %.2fx" % ratio)
+    if ratio > 2:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
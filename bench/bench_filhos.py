@@ -0,0 +1,44 @@
+"""Traversals that iterate the children of the nodes.
+
+Times generic_visit and walk() over a 1M-node tree of if statements, and
+counts the traced peak memory and the gen0 collections of a generic
+visit, which iterates children without building tuples.
+"""
+import gc
+import tracemalloc
+
+from comum import best, load, scale
+
+cells = load()
+
+
+class Counter(cells.NodeVisitor):
+    def __init__(self):
+        self.count = 0
+
+    def visit_Literal(self, node):
+        self.count += 1
+
+
+def main():
+    program = cells.Program([
+        cells.IfStatement(cells.Location("c"), [cells.AssignmentStatement(
+            cells.Location("x"), cells.BinaryOp(
+                "+", cells.BinaryOp("*", cells.Location("x"), cells.Literal("int", 2)),
+                cells.Literal("int", 1)))], None)
+        for _ in range(int(1000000 * scale()) // 7)])
+    counter = Counter()
+    print("generic_visit %.3fs" % best(lambda: counter.visit(program)))
+    print("walk()        %.3fs" % best(lambda: cells.walk(program, lambda node, name, depth: None)))
+    gc.collect()
+    collections = gc.get_stats()[0]["collections"]
+    tracemalloc.start()
+    counter.visit(program)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print("generic_visit traced peak %.1f KiB, gen0 collections %d" % (
+        peak / 1024, gc.get_stats()[0]["collections"] - collections))
+
+
+if __name__ == "__main__":
+    main()
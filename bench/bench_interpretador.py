@@ -0,0 +1,111 @@
+"""Running a loop-heavy program.
+
+Compares the Interpreter, which compiles the tree to closures over
+frame slots before running, with a NodeVisitor that dispatches on every
+node and looks names up in a list of scope dicts.
+"""
+import io
+import operator
+
+from comum import best, load, scale
+
+cells = load()
+
+PROGRAM = """
+var int i = 0;
+var int s = 0;
+while i < %d {
+  i = i + 1;
+  if i / 3 * 3 == i { continue; }
+  s = s + i * 2 - 1;
+}
+print s;
+var int n = 0;
+var int c = 0;
+while n < %d {
+  var int m = 0;
+  while m < 1000 { m = m + 1; if (m + n) / 7 * 7 == m + n { c = c + 1; } }
+  n = n + 1;
+}
+print c;
+"""
+
+_break, _continue = 1, 2
+
+
+class NaiveInterpreter(cells.NodeVisitor):
+    """Enough of a per-node interpreter for PROGRAM."""
+
+    operators = {"+": operator.add, "-": operator.sub, "*": operator.mul,
+                 "<": operator.lt, "==": operator.eq, "/": lambda a, b: int(a / b)}
+
+    def __init__(self):
+        self.scopes = [{}]
+        self.output = []
+
+    def block(self, statements):
+        self.scopes.append({})
+        try:
+            for statement in statements or ():
+                status = self.visit(statement)
+                if status:
+                    return status
+        finally:
+            self.scopes.pop()
+
+    def scope(self, name):
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return scope
+
+    def visit_Program(self, node):
+        self.block(node.statements)
+
+    def visit_VarDefinition(self, node):
+        self.scopes[-1][node.name] = self.visit(node.expression)
+
+    def visit_AssignmentStatement(self, node):
+        name = node.location.name
+        self.scope(name)[name] = self.visit(node.expression)
+
+    def visit_Location(self, node):
+        return self.scope(node.name)[node.name]
+
+    def visit_Literal(self, node):
+        return node.value
+
+    def visit_BinaryOp(self, node):
+        return self.operators[node.op](self.visit(node.left), self.visit(node.right))
+
+    def visit_PrintStatement(self, node):
+        self.output.append(str(self.visit(node.expression)))
+
+    def visit_ContinueStatement(self, node):
+        return _continue
+
+    def visit_BreakStatement(self, node):
+        return _break
+
+    def visit_IfStatement(self, node):
+        return self.block(node.consequence if self.visit(node.test) else node.alternative)
+
+    def visit_WhileStatement(self, node):
+        while self.visit(node.test):
+            if self.block(node.body) == _break:
+                break
+
+
+def main():
+    program = cells.UCyanParser().parse(PROGRAM % (int(970299 * scale(0.2)), int(300 * scale(0.2))))
+    out = io.StringIO()
+    cells.Interpreter(out).run(program)
+    naive = NaiveInterpreter()
+    naive.visit(program)
+    print("same output: %s" % (out.getvalue().split() == naive.output))
+    slow = best(lambda: NaiveInterpreter().visit(program), 1)
+    fast = best(lambda: cells.Interpreter(io.StringIO()).run(program))
+    print("per-node visitor %.2fs  Interpreter %.2fs  (%.1fx)" % (slow, fast, slow / fast))
+
+
+if __name__ == "__main__":
+    main()
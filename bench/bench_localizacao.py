@@ -0,0 +1,30 @@
+"""Locating every token of two very long lines.
+
+Compares the line/column lookup that rescanned the text with rfind for
+each token against UCyanLexer's line-start table.
+"""
+from comum import best, load, scale
+
+cells = load()
+
+
+def rfind_location(lexer, token):
+    last_newline = lexer.text.rfind("\n", 0, token.index)
+    return token.lineno, token.index - last_newline
+
+
+def main():
+    line = " ".join("x = x + %d;" % (i % 10) for i in range(int(20000 * scale())))
+    text = "var x = 0;\n" + line + "\n" + line + "\n"
+    lexer = cells.UCyanLexer(lambda *error: None)
+    tokens = list(lexer.tokenize(text))
+    old = [rfind_location(lexer, token) for token in tokens]
+    new = [lexer._make_location(token) for token in tokens]
+    print("%d tokens, same locations: %s" % (len(tokens), old == new))
+    print("rfind %.2fs  line table %.2fs" % (
+        best(lambda: [rfind_location(lexer, token) for token in tokens], 1),
+        best(lambda: [lexer._make_location(token) for token in tokens], 1)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""The bytecode VM against the closure Interpreter.
+
+Runs loop-heavy programs on both, checking they print the same.
+"""
+import io
+
+from comum import best, load, scale
+
+cells = load()
+
+PROGRAMS = {
+    "sum loop": "var int i = 0; var int s = 0; while i < %(sum)d { i = i + 1; "
+                "if i / 3 * 3 == i { continue; } s = s + i * 2 - 1; } print s;",
+    "nested loops": "var int c = 0; var int n = 0; while n < %(outer)d { var int m = 0; "
+                    "while m < 1000 { m = m + 1; if (m + n) / 7 * 7 == m + n { c = c + 1; } } "
+                    "n = n + 1; } print c;",
+    "float arithmetic": "var i = 0; var f = 1.5; while i < %(short)d { i = i + 1; "
+                        "f = f * 1.5 / 1.5 + 0.5 - 0.5; } print f;",
+    "&& / || / !": "var i = 0; var k = 0; while i < %(short)d { i = i + 1; "
+                   "if (i > 5 && i < 90) || !(i != 7) { k = k + 1; } } print k;",
+}
+
+
+def main():
+    factor = scale(0.2)
+    sizes = {"sum": int(970299 * factor), "outer": int(300 * factor), "short": int(49005 * factor)}
+    parser = cells.UCyanParser(backend="dfa")
+    for name, text in PROGRAMS.items():
+        program = parser.parse(text % sizes)
+        bytecode = cells.BytecodeCompiler().compile(program)
+        interpreted, executed = io.StringIO(), io.StringIO()
+        cells.Interpreter(interpreted).run(program)
+        cells.VirtualMachine(executed).run(bytecode)
+        assert interpreted.getvalue() == executed.getvalue()
+        print("%-18s interpreter %.2fs  vm %.2fs  (%d instructions)" % (
+            name, best(lambda: cells.Interpreter(io.StringIO()).run(program)),
+            best(lambda: cells.VirtualMachine(io.StringIO()).run(bytecode)), len(bytecode)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+"""Memory of 1M AST nodes.
+
+Builds BinaryOp nodes over Literal and Location leaves and measures the
+traced memory per node; attrs dicts are only created when used.
+"""
+import gc
+import sys
+import tracemalloc
+
+from comum import load, scale
+
+cells = load()
+
+
+def main():
+    count = int(1000000 * scale()) // 3
+    gc.collect()
+    tracemalloc.start()
+    nodes = [cells.BinaryOp("+", cells.Literal("int", 1), cells.Location("x"))
+             for _ in range(count)]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print("%d nodes: %.1f MB, %.1f bytes/node" % (3 * len(nodes), size / 1e6, size / (3 * len(nodes))))
+    print("empty BreakStatement: %d bytes" % sys.getsizeof(cells.BreakStatement()))
+
+
+if __name__ == "__main__":
+    main()
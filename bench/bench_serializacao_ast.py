@@ -0,0 +1,50 @@
+"""BinaryAST against pickle and re-parsing.
+
+Serializes the AST of a program of repeated statements both ways,
+checking the binary form round-trips, and times a CompilationCache hit
+with BinaryAST as its serializer.
+"""
+import io
+import pickle
+import shutil
+import tempfile
+
+from comum import best, load, scale
+
+cells = load()
+
+
+def show(program):
+    out = io.StringIO()
+    program.show(buf=out, attrnames=True, nodenames=True, showcoord=True)
+    return out.getvalue()
+
+
+def main():
+    statements = int(100000 * scale(0.2)) // 2
+    text = "var x = 1;\n/* a\nb */ print x;\n" * statements
+    parser = cells.UCyanParser(backend="dfa")
+    program = parser.parse(text)
+    data = cells.BinaryAST.dumps(program)
+    pickled = pickle.dumps(program, protocol=pickle.HIGHEST_PROTOCOL)
+    assert show(cells.BinaryAST.loads(data)) == show(program)
+    print("%d statements, %.1f MB of source" % (2 * statements, len(text) / 1e6))
+    print("size   binary %.1f MB   pickle %.1f MB" % (len(data) / 1e6, len(pickled) / 1e6))
+    print("dump   binary %.2fs    pickle %.2fs" % (
+        best(lambda: cells.BinaryAST.dumps(program)),
+        best(lambda: pickle.dumps(program, protocol=pickle.HIGHEST_PROTOCOL))))
+    print("load   binary %.2fs    pickle %.2fs     re-parse %.2fs" % (
+        best(lambda: cells.BinaryAST.loads(data)), best(lambda: pickle.loads(pickled)),
+        best(lambda: parser.parse(text), 1)))
+    directory = tempfile.mkdtemp()
+    try:
+        cache = cells.CompilationCache(directory, serializer=cells.BinaryAST)
+        cache.parse(parser, text)
+        print("cache hit %.2fs" % best(lambda: cache.parse(parser, text)))
+        assert cache.hits == 3
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
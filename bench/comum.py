@@ -0,0 +1,30 @@
+"""Helpers shared by the benchmarks. Each benchmark is a script run from
+the root of the repository, e.g.
+
+    python bench/bench_localizacao.py [scale]
+
+and prints its measurements. scale (default 1) multiplies the input
+sizes.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "tests"))
+
+from celulas import load  # noqa: E402
+
+
+def scale(default=1):
+    """The scale factor given on the command line."""
+    return float(sys.argv[1]) if len(sys.argv) > 1 else default
+
+
+def best(function, repeat=3):
+    """Best wall time of repeat calls of function, in seconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
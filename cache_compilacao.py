@@ -0,0 +1,245 @@
+import os
+import time
+import pickle
+import hashlib
+import tempfile
+
+
+class CompilationCache:
+    """On-disk cache of parsed ASTs and other compiled forms of uCyan sources.
+
+    Entries are keyed by a hash of the source text, the grammar of the
+    parser and the builder of its nodes, the stage ("ast", "bytecode"...) and the stage's version, so
+    a change to any of them never returns a stale artifact:
+
+        cache = CompilationCache("/tmp/ucyan-cache")
+        program = cache.parse(parser, text)
+        bytecode = cache.build(text, "bytecode", lambda: BytecodeCompiler().compile(program))
+
+    Each entry is one file, written atomically, so several processes can
+    share the directory. The least recently used entries (by mtime,
+    touched on every hit) are removed once the directory grows past
+    max_bytes. serializer is any object with dumps(value) and loads(data)
+    (pickle by default); values it cannot write, such as a FlatAST for
+    BinaryAST, are just not cached.
+
+    Loading a pickle runs code chosen by whoever wrote it, so with pickle
+    the directory is created private (mode 0700) and refused with a
+    PermissionError if another user owns it or may write to it. Use
+    BinaryAST, which only decodes ASTs, to share a cache between users.
+    """
+
+    # Bump whenever the layout of the entries changes
+    version = 1
+
+    suffix = ".ucc"
+
+    def __init__(self, directory, max_bytes=64 << 20, serializer=pickle):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.serializer = serializer
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        if serializer is pickle:
+            _check_private(directory)
+        self.hits = 0
+        self.misses = 0
+        # Build time of the hits minus the time spent loading them
+        self.time_saved = 0.0
+        # Bytes in the directory, counted on the first store
+        self._size = None
+        self._grammar_keys = {}
+
+    def key(self, text, stage="ast", stage_version=1, parser=None):
+        """Cache key of stage run over text (by parser's grammar and
+        node builder)."""
+        h = hashlib.sha256(b"ucyan-cache-%d" % self.version)
+        h.update(("%s-%s\0" % (stage, stage_version)).encode())
+        if parser is not None:
+            h.update(self._grammar_key(type(parser)).encode())
+            builder = type(parser.nodes)
+            h.update(("%s.%s\0" % (builder.__module__, builder.__qualname__)).encode())
+        h.update(text.encode() if isinstance(text, str) else text)
+        return h.hexdigest()
+
+    def _grammar_key(self, parser_class):
+        key = self._grammar_keys.get(parser_class)
+        if key is None:
+            key = self._grammar_keys[parser_class] = CachedLRTables.grammar_key(parser_class._grammar)
+        return key
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + self.suffix)
+
+    def get(self, key):
+        """(value, build seconds) of the entry, or None when missing."""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                build_time = float(f.readline())
+                value = self.serializer.loads(f.read())
+        except Exception:
+            # Missing, evicted meanwhile, or unreadable by this serializer
+            return None
+        try:
+            # Mark as recently used
+            os.utime(path)
+        except OSError:
+            pass
+        return value, build_time
+
+    def put(self, key, value, build_time=0.0):
+        """Store value (built in build_time seconds) under key."""
+        payload = self.serializer.dumps(value)
+        header = repr(build_time).encode()
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(header)
+                f.write(b"\n")
+                f.write(payload)
+            # Atomic, so concurrent workers never read a half-written file
+            os.replace(tmp, self._path(key))
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return
+        if self._size is None:
+            self._size = self._scan()[1]
+        else:
+            self._size += len(header) + 1 + len(payload)
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def build(self, text, stage, build, stage_version=1, parser=None):
+        """The artifact of stage for text: from the cache, or build()
+        (stored unless it returns None)."""
+        key = self.key(text, stage, stage_version, parser)
+        found, value = self._lookup(key)
+        if found:
+            return value
+        start = time.perf_counter()
+        value = build()
+        if value is not None:
+            self._store(key, value, time.perf_counter() - start)
+        return value
+
+    def parse(self, parser, text):
+        """parser.parse(text), cached. Sources with lexical or syntax
+        errors are parsed (and reported) every time."""
+        # Stage version 2: int, float and bool literals hold their value
+        key = self.key(text, "ast", 2, parser)
+        found, program = self._lookup(key)
+        if found:
+            # Only clean sources are cached: nothing to report
+            if parser.diagnostics is not None:
+                parser.diagnostics.clear()
+            return program
+        start = time.perf_counter()
+        program, clean = _parse_checked(parser, text)
+        if clean and program is not None:
+            self._store(key, program, time.perf_counter() - start)
+        return program
+
+    def _lookup(self, key):
+        """(True, value) on a hit, (False, None) on a miss; counts both."""
+        start = time.perf_counter()
+        entry = self.get(key)
+        if entry is None:
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        self.time_saved += entry[1] - (time.perf_counter() - start)
+        return True, entry[0]
+
+    def _store(self, key, value, build_time):
+        try:
+            self.put(key, value, build_time)
+        except (RecursionError, TypeError, AttributeError, pickle.PicklingError):
+            # Too deep for the serializer, or not of a type it writes
+            # (pickle raises AttributeError for local classes): just not cached
+            pass
+
+    def _scan(self):
+        """[(mtime, size, path)] of the entries, and their total size."""
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith(self.suffix):
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+        return entries, total
+
+    def evict(self):
+        """Remove the least recently used entries until the directory
+        takes at most 3/4 of max_bytes."""
+        entries, total = self._scan()
+        entries.sort()
+        target = self.max_bytes * 3 // 4
+        for mtime, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                # Already evicted by another process
+                pass
+            total -= size
+        self._size = total
+
+    def clear(self):
+        for mtime, size, path in self._scan()[0]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._size = 0
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def report(self):
+        return "%d hits, %d misses (%.1f%% hit rate), %.3fs saved" % (
+            self.hits, self.misses, 100 * self.hit_rate(), self.time_saved)
+
+
+def _check_private(directory):
+    """Raise PermissionError unless directory is owned by this user and
+    writable by nobody else."""
+    st = os.stat(directory)
+    getuid = getattr(os, "getuid", None)
+    if (getuid is not None and st.st_uid != getuid()) or st.st_mode & 0o022:
+        raise PermissionError(
+            "Cache directory %s is shared with other users, who could make it "
+            "run code through pickle; use a private directory or serializer=BinaryAST" % directory)
+
+
+def _parse_checked(parser, text):
+    """parser.parse(text), and whether no lexical or syntax error was
+    reported while parsing it."""
+    errors = []
+    error = parser.error
+    error_func = parser.lexer.error_func
+
+    def syntax_error(p):
+        errors.append(p)
+        return error(p)
+
+    def lexical_error(msg, line, column):
+        errors.append(msg)
+        error_func(msg, line, column)
+
+    parser.error = syntax_error
+    parser.lexer.error_func = lexical_error
+    try:
+        program = parser.parse(text)
+    finally:
+        del parser.error
+        parser.lexer.error_func = error_func
+    return program, not errors
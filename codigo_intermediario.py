@@ -0,0 +1,491 @@
+import sys
+from array import array
+
+# Opcodes of the three-address code. Every instruction is a tuple
+# (opcode, target, a, b); the fields an opcode does not use are 0.
+# a and b are operands: variables v >= 0, or constants[-v - 1].
+IR_OPNAMES = (
+    "COPY",           # target = a
+    "ADD",            # ADD to NE: target = a op b
+    "SUB",
+    "MUL",
+    "DIV",
+    "LT",
+    "LE",
+    "GT",
+    "GE",
+    "EQ",
+    "NE",
+    "AND",            # AND, OR: target = a op b (a and b must be bools)
+    "OR",
+    "NEG",            # NEG to NOT: target = op a
+    "POS",
+    "NOT",
+    "CHECK_TYPE",     # fail unless a is a TYPES[IR_TYPE_NAMES[b]]
+    "PRINT",          # print a
+    "LABEL",          # target is a label
+    "JUMP",           # goto label target
+    "JUMP_IF_FALSE",  # goto label target if a is false; a must be a bool,
+    "JUMP_IF_TRUE",   # but with b = 1 (the left operand of an AND or OR)
+)                     # any other value does not jump
+
+(IR_COPY,
+ IR_ADD, IR_SUB, IR_MUL, IR_DIV,
+ IR_LT, IR_LE, IR_GT, IR_GE, IR_EQ, IR_NE,
+ IR_AND, IR_OR,
+ IR_NEG, IR_POS, IR_NOT,
+ IR_CHECK_TYPE, IR_PRINT,
+ IR_LABEL, IR_JUMP, IR_JUMP_IF_FALSE, IR_JUMP_IF_TRUE) = range(len(IR_OPNAMES))
+
+_ir_binary_opcodes = {
+    "+": IR_ADD, "-": IR_SUB, "*": IR_MUL, "/": IR_DIV,
+    "<": IR_LT, "<=": IR_LE, ">": IR_GT, ">=": IR_GE,
+    "==": IR_EQ, "!=": IR_NE, "&&": IR_AND, "||": IR_OR,
+}
+_ir_unary_opcodes = {"-": IR_NEG, "+": IR_POS, "!": IR_NOT}
+
+# Operator of each opcode, for the text dump
+_ir_opcode_ops = {opcode: op for op, opcode in _ir_binary_opcodes.items()}
+_ir_opcode_ops.update({opcode: op for op, opcode in _ir_unary_opcodes.items()})
+
+# Argument of CHECK_TYPE
+IR_TYPE_NAMES = tuple(TYPES)
+
+
+class ThreeAddressCode:
+    """A uCyan program lowered to three-address code.
+
+    code is the list of its (opcode, target, a, b) instructions (see
+    IR_OPNAMES). Each declaration and each temporary is a variable of
+    its own, numbered from 0 and named in names (temporaries are "%n");
+    constants is the constant pool of the operands, and labels the
+    number of labels. types maps the variables whose values are always
+    of one Python type to it. coords[i] is the packed Coord of the node
+    that emitted code[i] (0 for none), for the error messages.
+    """
+
+    def __init__(self):
+        self.code = []
+        self.coords = array("q")
+        self.constants = []
+        self.names = []
+        self.labels = 0
+        self.temporaries = 0
+        self.types = {}
+        self._constant_ids = {}
+        self._name_counts = {}
+
+    def __len__(self):
+        return len(self.code)
+
+    def emit(self, opcode, target=0, a=0, b=0, coord=None):
+        """Append an instruction. Returns its index in code."""
+        self.code.append((opcode, target, a, b))
+        self.coords.append(0 if coord is None else coord)
+        return len(self.code) - 1
+
+    def coord(self, i):
+        """Coord of the instruction code[i], or None."""
+        packed = self.coords[i]
+        if packed >> 32 == 0:
+            return None
+        return Coord.unpack(packed)
+
+    def constant(self, value):
+        """The operand of value, from the constant pool."""
+        # 1 == 1.0 == True, so the type is part of the key
+        key = (type(value), value)
+        index = self._constant_ids.get(key)
+        if index is None:
+            index = self._constant_ids[key] = len(self.constants)
+            self.constants.append(value)
+        return -index - 1
+
+    def variable(self, name):
+        """A new variable. A name used before gets a suffix: "x", "x.1"..."""
+        count = self._name_counts.get(name, 0)
+        self._name_counts[name] = count + 1
+        self.names.append(name if not count else "%s.%d" % (name, count))
+        return len(self.names) - 1
+
+    def temporary(self):
+        """A new temporary variable."""
+        self.temporaries += 1
+        self.names.append("%%%d" % (self.temporaries - 1))
+        return len(self.names) - 1
+
+    def release(self):
+        """Forget the last temporary made, which is not used."""
+        self.names.pop()
+        self.temporaries -= 1
+
+    def is_temporary(self, variable):
+        return self.names[variable][0] == "%"
+
+    def label(self):
+        """A new label."""
+        self.labels += 1
+        return self.labels - 1
+
+    def operand_text(self, operand):
+        if operand >= 0:
+            return self.names[operand]
+        value = self.constants[-operand - 1]
+        if type(value) is str:
+            return repr(value)
+        return _format(value)
+
+    def instruction_text(self, instruction):
+        opcode, target, a, b = instruction
+        text = self.operand_text
+        if opcode == IR_LABEL:
+            return "L%d:" % target
+        if opcode == IR_COPY:
+            line = "%s = %s" % (text(target), text(a))
+        elif IR_ADD <= opcode <= IR_OR:
+            line = "%s = %s %s %s" % (text(target), text(a), _ir_opcode_ops[opcode], text(b))
+        elif IR_NEG <= opcode <= IR_NOT:
+            line = "%s = %s%s" % (text(target), _ir_opcode_ops[opcode], text(a))
+        elif opcode == IR_CHECK_TYPE:
+            line = "check %s %s" % (text(a), IR_TYPE_NAMES[b])
+        elif opcode == IR_PRINT:
+            line = "print %s" % text(a)
+        elif opcode == IR_JUMP:
+            line = "goto L%d" % target
+        elif b:
+            # Unchecked: only the bool jumps, any other value falls through
+            line = "if %s is %s goto L%d" % (text(a), "true" if opcode == IR_JUMP_IF_TRUE else "false", target)
+        else:
+            line = "%s %s goto L%d" % ("ifnot" if opcode == IR_JUMP_IF_FALSE else "if", text(a), target)
+        return "    " + line
+
+    def dump(self, out=None):
+        """Write the code as text to out (sys.stdout by default), one
+        instruction per line."""
+        out = out if out is not None else sys.stdout
+        text = self.instruction_text
+        out.write("".join(text(instruction) + "\n" for instruction in self.code))
+
+
+class IRGenerator(Interpreter):
+    """Lowers a Program to ThreeAddressCode.
+
+    Names are resolved, and their errors reported, as by the Interpreter;
+    but every declaration gets a variable of its own, even when it
+    shadows another or its block was left, so later passes see one
+    variable per name. Each expression gives an operand, its value: a
+    constant, a variable, or a temporary it computes. if and while
+    become conditional jumps to labels, && and || a jump around their
+    right operand and an AND or OR checking both operands (just a copy
+    of the right one when both are known to be bools).
+
+        code = IRGenerator().generate(program)
+        code.dump()
+    """
+
+    def generate(self, program):
+        self.ir = ThreeAddressCode()
+        # (continue label, break label) of the enclosing loops, innermost last
+        self.loop_stack = []
+        # (result, end label) of the && and || being lowered, innermost last
+        self.logical_stack = []
+        # Variable of each slot given by _declare
+        self.slot_variables = {}
+        self.types = self.ir.types
+        Interpreter.compile(self, program)
+        return self.ir
+
+    def _close_scope(self, first_slot):
+        # Slots are not reused: each declaration keeps its own variable
+        self.scopes.pop()
+
+    def _declare(self, node, const, dtype):
+        slot = Interpreter._declare(self, node, const, dtype)
+        variable = self.slot_variables[slot] = self.ir.variable(node.name)
+        if dtype is not None:
+            # Stores to it are checked
+            self.types[variable] = TYPES[dtype.name]
+        return slot
+
+    def _block(self, statements):
+        first_slot = self._open_scope()
+        for statement in statements or ():
+            self.visit(statement)
+        self._close_scope(first_slot)
+
+    def _type_of(self, operand):
+        """Python type of the values of operand, or None if unknown."""
+        if operand < 0:
+            return type(self.ir.constants[-operand - 1])
+        return self.types.get(operand)
+
+    def _temporary(self, python_type=None):
+        result = self.ir.temporary()
+        if python_type is not None:
+            self.types[result] = python_type
+        return result
+
+    def _assign(self, variable, value, coord):
+        """variable = operand value."""
+        ir = self.ir
+        code = ir.code
+        last = code[-1] if code else None
+        if (value >= 0 and last is not None and last[0] <= IR_NOT and
+                last[1] == value and ir.is_temporary(value)):
+            # The temporary just computed: compute variable instead
+            code[-1] = (last[0], variable, last[2], last[3])
+            if value == len(ir.names) - 1:
+                ir.release()
+                self.types.pop(value, None)
+        else:
+            ir.emit(IR_COPY, variable, value, 0, coord)
+
+    def _store(self, node, variable, dtype, value):
+        """Store operand value in variable, checking it against dtype
+        unless its type is known to match."""
+        checked = dtype is not None and self._type_of(value) is not TYPES[dtype.name]
+        self._assign(variable, value, node._coord)
+        if checked:
+            self.ir.emit(IR_CHECK_TYPE, 0, variable, IR_TYPE_NAMES.index(dtype.name), node._coord)
+
+    # Statements
+
+    def visit_VarDefinition(self, node):
+        dtype = self._type(node.dtype)
+        if node.expression is None:
+            if dtype is None:
+                _fail(node, "'%s' needs a type or an initial value" % node.name)
+            value = self.ir.constant(TYPES[dtype.name]())
+        else:
+            value = self._expression(node.expression)
+        variable = self.slot_variables[self._declare(node, False, dtype)]
+        self._store(node, variable, dtype, value)
+
+    def visit_ConstDefinition(self, node):
+        dtype = self._type(node.dtype)
+        value = self._expression(node.expression)
+        variable = self.slot_variables[self._declare(node, True, dtype)]
+        self._store(node, variable, dtype, value)
+
+    def visit_AssignmentStatement(self, node):
+        slot, const, dtype = self._lookup(node.location)
+        if const:
+            _fail(node, "Cannot assign to the constant '%s'" % node.location.name)
+        value = self._expression(node.expression)
+        self._store(node, self.slot_variables[slot], dtype, value)
+
+    def visit_ExpressionAsStatement(self, node):
+        self._expression(node.expression)
+
+    def visit_PrintStatement(self, node):
+        value = self._expression(node.expression)
+        self.ir.emit(IR_PRINT, 0, value, 0, node._coord)
+
+    def visit_IfStatement(self, node):
+        ir = self.ir
+        test = self._expression(node.test)
+        to_alternative = ir.label()
+        ir.emit(IR_JUMP_IF_FALSE, to_alternative, test, 0, node._coord)
+        self._block(node.consequence)
+        if node.alternative:
+            to_end = ir.label()
+            ir.emit(IR_JUMP, to_end, 0, 0, node._coord)
+            ir.emit(IR_LABEL, to_alternative)
+            self._block(node.alternative)
+            ir.emit(IR_LABEL, to_end)
+        else:
+            ir.emit(IR_LABEL, to_alternative)
+
+    def visit_WhileStatement(self, node):
+        ir = self.ir
+        start = ir.label()
+        end = ir.label()
+        ir.emit(IR_LABEL, start)
+        test = self._expression(node.test)
+        ir.emit(IR_JUMP_IF_FALSE, end, test, 0, node._coord)
+        self.loop_stack.append((start, end))
+        self._block(node.body)
+        self.loop_stack.pop()
+        ir.emit(IR_JUMP, start, 0, 0, node._coord)
+        ir.emit(IR_LABEL, end)
+
+    def visit_BreakStatement(self, node):
+        if not self.loop_stack:
+            _fail(node, "break outside a loop")
+        self.ir.emit(IR_JUMP, self.loop_stack[-1][1], 0, 0, node._coord)
+
+    def visit_ContinueStatement(self, node):
+        if not self.loop_stack:
+            _fail(node, "continue outside a loop")
+        self.ir.emit(IR_JUMP, self.loop_stack[-1][0], 0, 0, node._coord)
+
+    # Expressions
+    # Visited in post-order by _expression; each takes the operands of
+    # its operands from self.operands and returns the operand of its value
+
+    # Lowering does not recurse, so no expression is too deep for it
+    max_nesting = None
+
+    def _operands(self, node):
+        if node.__class__.__name__ == "BinaryOp" and (node.op == "&&" or node.op == "||"):
+            return self._logical_operands(node)
+        return iter(node)
+
+    def _logical_operands(self, node):
+        """The operands of && or ||, with the jump taken when the left
+        one decides the result emitted between them."""
+        yield node.left
+        ir = self.ir
+        # result = left, and unless that decides, result = left op right.
+        # A temporary left is only used here, so it can be the result
+        left = self.operands[-1]
+        if left >= 0 and ir.is_temporary(left):
+            result = left
+        else:
+            result = self._temporary()
+            ir.emit(IR_COPY, result, left, 0, node._coord)
+        end = ir.label()
+        ir.emit(IR_JUMP_IF_TRUE if node.op == "||" else IR_JUMP_IF_FALSE, end, result, 1, node._coord)
+        self.logical_stack.append((result, end))
+        yield node.right
+
+    def visit_Literal(self, node):
+        return self.ir.constant(literal_value(node))
+
+    def visit_Location(self, node):
+        return self.slot_variables[self._lookup(node)[0]]
+
+    def visit_UnaryOp(self, node):
+        operand = self.operands.pop()
+        opcode = _ir_unary_opcodes[node.op]
+        if opcode == IR_NOT:
+            python_type = bool
+        else:
+            python_type = self._type_of(operand)
+            if python_type not in _numbers:
+                python_type = None
+        result = self._temporary(python_type)
+        self.ir.emit(opcode, result, operand, 0, node._coord)
+        return result
+
+    def visit_BinaryOp(self, node):
+        ir = self.ir
+        operands = self.operands
+        right = operands.pop()
+        left = operands.pop()
+        opcode = _ir_binary_opcodes[node.op]
+        if opcode == IR_AND or opcode == IR_OR:
+            result, end = self.logical_stack.pop()
+            if self._type_of(left) is bool and self._type_of(right) is bool:
+                self._assign(result, right, node._coord)
+            else:
+                ir.emit(opcode, result, result, right, node._coord)
+            ir.emit(IR_LABEL, end)
+            # Either operand was checked to be a bool
+            self.types[result] = bool
+            return result
+        if opcode >= IR_LT:
+            python_type = bool
+        else:
+            python_type = self._type_of(left)
+            if python_type not in _numbers or python_type is not self._type_of(right):
+                python_type = None
+        result = self._temporary(python_type)
+        ir.emit(opcode, result, left, right, node._coord)
+        return result
+
+
+class IRInterpreter:
+    """Runs ThreeAddressCode, which defines what its instructions do:
+
+        IRInterpreter().run(IRGenerator().generate(program))
+
+    A program's code prints what the Interpreter prints running the
+    program, and raises UCyanRuntimeError (with the coord of the failing
+    instruction) on the same errors, with the same messages.
+    """
+
+    def __init__(self, out=None):
+        self.out = out if out is not None else sys.stdout
+        self.variables = None
+
+    def run(self, ir):
+        """Execute ir. Returns the final values of its variables."""
+        code = ir.code
+        constants = ir.constants
+        variables = self.variables = [None] * len(ir.names)
+        labels = [0] * ir.labels
+        for i, (opcode, target, a, b) in enumerate(code):
+            if opcode == IR_LABEL:
+                labels[target] = i
+        write = self.out.write
+        types = [TYPES[name] for name in IR_TYPE_NAMES]
+        pc = 0
+        size = len(code)
+        while pc < size:
+            opcode, target, a, b = code[pc]
+            pc += 1
+            if opcode == IR_LABEL:
+                continue
+            if opcode == IR_JUMP:
+                pc = labels[target]
+                continue
+            x = variables[a] if a >= 0 else constants[-a - 1]
+            if opcode == IR_COPY:
+                variables[target] = x
+            elif opcode <= IR_OR:
+                y = variables[b] if b >= 0 else constants[-b - 1]
+                variables[target] = self._binary(ir, pc - 1, opcode, x, y)
+            elif opcode <= IR_NOT:
+                if opcode == IR_NOT:
+                    if x is not True and x is not False:
+                        self._fail(ir, pc - 1, "Bad operand type for !: %s" % type(x).__name__)
+                    variables[target] = not x
+                else:
+                    if type(x) not in _numbers:
+                        self._fail(ir, pc - 1, "Bad operand type for %s: %s" % (
+                            _ir_opcode_ops[opcode], type(x).__name__))
+                    variables[target] = -x if opcode == IR_NEG else x
+            elif opcode == IR_CHECK_TYPE:
+                if type(x) is not types[b]:
+                    self._fail(ir, pc - 1, "Cannot store a %s in a %s" % (type(x).__name__, IR_TYPE_NAMES[b]))
+            elif opcode == IR_PRINT:
+                write(_format(x) + "\n")
+            else:
+                # IR_JUMP_IF_FALSE and IR_JUMP_IF_TRUE
+                if x is (opcode == IR_JUMP_IF_TRUE):
+                    pc = labels[target]
+                elif x is not True and x is not False and not b:
+                    self._fail(ir, pc - 1, "Condition is a %s, not a bool" % type(x).__name__)
+        return variables
+
+    def _binary(self, ir, i, opcode, a, b):
+        op = _ir_opcode_ops[opcode]
+        t = type(a)
+        if opcode == IR_AND or opcode == IR_OR:
+            accepted = (bool,)
+        elif op in _arithmetic or op == "/":
+            accepted = _numbers
+        elif op in _comparison:
+            accepted = _ordered
+        else:
+            accepted = _any
+        if t is not type(b) or t not in accepted:
+            self._fail(ir, i, "Bad operand types for %s: %s and %s" % (op, t.__name__, type(b).__name__))
+        if opcode == IR_AND:
+            return a and b
+        if opcode == IR_OR:
+            return a or b
+        if opcode == IR_DIV:
+            if not b:
+                self._fail(ir, i, "Division by zero")
+            if t is float:
+                return a / b
+            # Integer division truncates toward zero
+            q = abs(a) // abs(b)
+            return -q if (a < 0) != (b < 0) else q
+        return (_arithmetic.get(op) or _comparison.get(op) or _equality[op])(a, b)
+
+    @staticmethod
+    def _fail(ir, i, message):
+        raise UCyanRuntimeError(message, ir.coord(i))
@@ -0,0 +1,84 @@
+class Diagnostic:
+    """One error found in a source: its kind ("lexical", "syntax"...),
+    message, and the line and column where it was found (None when
+    there is none, as for an error at the end of the input)."""
+
+    __slots__ = ("kind", "message", "line", "column")
+
+    def __init__(self, kind, message, line=None, column=None):
+        self.kind = kind
+        self.message = message
+        self.line = line
+        self.column = column
+
+    def __str__(self):
+        if self.line is None:
+            return "%s error: %s" % (self.kind.capitalize(), self.message)
+        return "%s error: %s at %d:%d" % (self.kind.capitalize(), self.message, self.line, self.column)
+
+    def __repr__(self):
+        return "Diagnostic(%r, %r, %r, %r)" % (self.kind, self.message, self.line, self.column)
+
+    def __eq__(self, other):
+        if not isinstance(other, Diagnostic):
+            return NotImplemented
+        return (self.kind, self.message, self.line, self.column) == (
+            other.kind, other.message, other.line, other.column)
+
+
+class TooManyErrors(Exception):
+    """Raised by Diagnostics.report when max_errors errors were recorded."""
+
+
+class Diagnostics:
+    """Bounded collector of the errors found while lexing and parsing.
+
+        diagnostics = Diagnostics(max_errors=20)
+        parser = UCyanParser(diagnostics=diagnostics)
+        program = parser.parse(text)
+        for diagnostic in diagnostics:
+            print(diagnostic)
+
+    Reporting an error only appends a Diagnostic: nothing is written
+    while parsing, so a source full of errors costs no I/O. Once
+    max_errors are recorded (None for no limit) the report raises
+    TooManyErrors, which UCyanParser.parse catches to give up on the
+    source and return None. The collector is also a valid error_func
+    for UCyanLexer, recording lexical errors.
+    """
+
+    def __init__(self, max_errors=100):
+        self.max_errors = max_errors
+        self.records = []
+        # Whether the last parse stopped at max_errors
+        self.aborted = False
+
+    def report(self, kind, message, line=None, column=None):
+        records = self.records
+        records.append(Diagnostic(kind, message, line, column))
+        if self.max_errors is not None and len(records) >= self.max_errors:
+            self.aborted = True
+            raise TooManyErrors("Too many errors (%d)" % len(records))
+
+    def __call__(self, msg, line, column):
+        self.report("lexical", msg, line, column)
+
+    def clear(self):
+        self.records = []
+        self.aborted = False
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def count(self, kind):
+        return sum(1 for record in self.records if record.kind == kind)
+
+    def write(self, out):
+        """Write the diagnostics to the file-like object out, one per line."""
+        if self.records:
+            out.write("\n".join(map(str, self.records)) + "\n")
+        if self.aborted:
+            out.write("Too many errors, giving up\n")
@@ -0,0 +1,700 @@
+from array import array
+from collections import deque
+
+# Number of operands each IR opcode reads (a, then b)
+_ir_reads = [0] * len(IR_OPNAMES)
+for _opcode in range(IR_ADD, IR_OR + 1):
+    _ir_reads[_opcode] = 2
+for _opcode in (IR_COPY, IR_NEG, IR_POS, IR_NOT, IR_CHECK_TYPE, IR_PRINT, IR_JUMP_IF_FALSE, IR_JUMP_IF_TRUE):
+    _ir_reads[_opcode] = 1
+
+# Operand types with which each binary IR opcode cannot fail
+_ir_accepted = [None] * len(IR_OPNAMES)
+for _opcode in (IR_ADD, IR_SUB, IR_MUL, IR_DIV):
+    _ir_accepted[_opcode] = _numbers
+for _opcode in (IR_LT, IR_LE, IR_GT, IR_GE):
+    _ir_accepted[_opcode] = _ordered
+for _opcode in (IR_EQ, IR_NE):
+    _ir_accepted[_opcode] = _any
+for _opcode in (IR_AND, IR_OR):
+    _ir_accepted[_opcode] = frozenset((bool,))
+
+
+class ControlFlowGraph:
+    """The basic blocks of a ThreeAddressCode and the jumps between them.
+
+    Block b is the instructions code[starts[b]:ends[b]]: a block begins
+    at the start of the code, at labels and after jumps. Block 0 is the
+    entry; blocks without successors fall off the end of the program.
+    The edges are kept in arrays, not in a list per block, so graphs of
+    hundreds of thousands of blocks stay small and cheap to build:
+
+        cfg.successor_list[cfg.successor_index[b]:cfg.successor_index[b + 1]]
+
+    are the successors of block b (successors(b) gives them too), and
+    likewise for the predecessors.
+    """
+
+    def __init__(self, ir):
+        self.ir = ir
+        code = ir.code
+        starts = self.starts = array("l")
+        # Block starting at each label
+        self.label_blocks = label_blocks = {}
+        previous = IR_JUMP
+        for i, (opcode, target, a, b) in enumerate(code):
+            # Labels in a row begin a single block
+            if previous >= IR_JUMP or (opcode == IR_LABEL and previous != IR_LABEL):
+                starts.append(i)
+            if opcode == IR_LABEL:
+                label_blocks[target] = len(starts) - 1
+            previous = opcode
+        count = len(starts)
+        self.ends = ends = array("l", starts[1:])
+        ends.append(len(code))
+        self.successor_index = successor_index = array("l", [0])
+        self.successor_list = successor_list = array("l")
+        predecessor_counts = array("l", [0]) * (count + 1)
+        for block in range(count):
+            opcode, target = code[ends[block] - 1][:2]
+            falls_through = opcode != IR_JUMP and block + 1 < count
+            if falls_through:
+                successor_list.append(block + 1)
+            if opcode >= IR_JUMP and not (falls_through and label_blocks[target] == block + 1):
+                successor_list.append(label_blocks[target])
+            successor_index.append(len(successor_list))
+        for successor in successor_list:
+            predecessor_counts[successor + 1] += 1
+        # Predecessors, sorted by block, placed with a counting sort
+        self.predecessor_index = predecessor_index = array("l", predecessor_counts)
+        for block in range(count):
+            predecessor_index[block + 1] += predecessor_index[block]
+        self.predecessor_list = predecessor_list = array("l", [0]) * len(successor_list)
+        position = array("l", predecessor_index)
+        for block in range(count):
+            for k in range(successor_index[block], successor_index[block + 1]):
+                successor = successor_list[k]
+                predecessor_list[position[successor]] = block
+                position[successor] += 1
+        self._shared = None
+
+    def __len__(self):
+        return len(self.starts)
+
+    def successors(self, block):
+        return self.successor_list[self.successor_index[block]:self.successor_index[block + 1]]
+
+    def predecessors(self, block):
+        return self.predecessor_list[self.predecessor_index[block]:self.predecessor_index[block + 1]]
+
+    def reverse_postorder(self):
+        """The blocks reachable from the entry, in reverse postorder:
+        each block before its successors, but for the back edges."""
+        count = len(self.starts)
+        if not count:
+            return []
+        successor_index = self.successor_index
+        successor_list = self.successor_list
+        visited = bytearray(count)
+        visited[0] = 1
+        # Next edge to follow from each block
+        position = array("l", successor_index)
+        order = []
+        stack = [0]
+        while stack:
+            block = stack[-1]
+            k = position[block]
+            if k < successor_index[block + 1]:
+                position[block] = k + 1
+                successor = successor_list[k]
+                if not visited[successor]:
+                    visited[successor] = 1
+                    stack.append(successor)
+            else:
+                stack.pop()
+                order.append(block)
+        order.reverse()
+        return order
+
+    def shared_variables(self):
+        """The variables read in some block before being written there:
+        the only ones whose values go from a block to another. Returns
+        (variables, numbers): the variables in order of first read, and
+        a dict mapping each of them to its position. Variables used in a
+        single block, such as temporaries, are left out of the values of
+        the analyses, which keeps them small."""
+        if self._shared is None:
+            code = self.ir.code
+            variables = array("l")
+            numbers = {}
+            for start, end in zip(self.starts, self.ends):
+                written = set()
+                for i in range(start, end):
+                    opcode, target, a, b = code[i]
+                    reads = _ir_reads[opcode]
+                    if reads and a >= 0 and a not in written and a not in numbers:
+                        numbers[a] = len(variables)
+                        variables.append(a)
+                    if reads == 2 and b >= 0 and b not in written and b not in numbers:
+                        numbers[b] = len(variables)
+                        variables.append(b)
+                    if opcode <= IR_NOT:
+                        written.add(target)
+            self._shared = variables, numbers
+        return self._shared
+
+
+class DataflowAnalysis:
+    """A dataflow problem over the blocks of a ControlFlowGraph, solved
+    by solve() with a worklist.
+
+    Subclasses give the direction (forward), the lattice: top (the value
+    of a block not reached yet), boundary (the value entering the entry
+    block, or leaving the blocks without successors when the analysis
+    runs backward) and meet, and the transfer function of a block. The
+    defaults are those of an analysis of frozensets where an element is
+    in the set when it is on any path. After solve(), ins[b] and outs[b]
+    are the values at the start and at the end of block b.
+
+    The blocks are first visited in reverse postorder (postorder when
+    backward), and a block is only visited again when the value of one
+    of its sources changes, so unless loops are deeply nested each
+    block is visited a few times.
+    """
+
+    forward = True
+
+    def __init__(self, cfg):
+        self.cfg = cfg
+
+    def top(self):
+        return frozenset()
+
+    def boundary(self):
+        return self.top()
+
+    def meet(self, a, b):
+        # Reuse an operand when it holds the other, as it mostly does
+        if b <= a:
+            return a
+        if a <= b:
+            return b
+        return a | b
+
+    def transfer(self, block, value):
+        raise NotImplementedError
+
+    def solve(self):
+        cfg = self.cfg
+        count = len(cfg)
+        order = cfg.reverse_postorder()
+        forward = self.forward
+        if forward:
+            source_index, source_list = cfg.predecessor_index, cfg.predecessor_list
+            target_index, target_list = cfg.successor_index, cfg.successor_list
+        else:
+            order.reverse()
+            source_index, source_list = cfg.successor_index, cfg.successor_list
+            target_index, target_list = cfg.predecessor_index, cfg.predecessor_list
+        top = self.top()
+        boundary = self.boundary()
+        # Values entering and leaving each block, in the analysis direction
+        entering = [top] * count
+        leaving = [top] * count
+        meet = self.meet
+        transfer = self.transfer
+        queue = deque(order)
+        queued = bytearray(count)
+        for block in order:
+            queued[block] = 1
+        while queue:
+            block = queue.popleft()
+            queued[block] = 0
+            first, last = source_index[block], source_index[block + 1]
+            if (block == 0) if forward else first == last:
+                value = boundary
+            else:
+                value = top
+            for k in range(first, last):
+                value = meet(value, leaving[source_list[k]])
+            entering[block] = value
+            value = transfer(block, value)
+            if value != leaving[block]:
+                leaving[block] = value
+                for k in range(target_index[block], target_index[block + 1]):
+                    target = target_list[k]
+                    if not queued[target]:
+                        queued[target] = 1
+                        queue.append(target)
+        if forward:
+            self.ins, self.outs = entering, leaving
+        else:
+            self.ins, self.outs = leaving, entering
+        return self
+
+
+class GenKillAnalysis(DataflowAnalysis):
+    """A set analysis whose transfer function is gen | (value - kill),
+    with the gen and kill frozensets of each block."""
+
+    def __init__(self, cfg):
+        DataflowAnalysis.__init__(self, cfg)
+        self.gen = []
+        self.kill = []
+        self._values = {}
+
+    def transfer(self, block, value):
+        kill = self.kill[block]
+        if not kill.isdisjoint(value):
+            value = value - kill
+        gen = self.gen[block]
+        if gen <= value:
+            return value
+        value |= gen
+        # Equal sets are kept once: most blocks have the same few values
+        return self._values.setdefault(value, value)
+
+
+class Liveness(GenKillAnalysis):
+    """The variables live at each block: those that may be read, before
+    being written, after the start (ins[b]) or the end (outs[b]) of block
+    b. Only the variables of cfg.shared_variables() are tracked.
+
+    The values are sparse sets, not bitsets over all the variables, so
+    a block costs the number of variables live there: with short live
+    ranges the analysis stays linear however many variables the program
+    has.
+    """
+
+    forward = False
+
+    def __init__(self, cfg):
+        GenKillAnalysis.__init__(self, cfg)
+        code = cfg.ir.code
+        shared = cfg.shared_variables()[1]
+        values = self._values
+        empty = frozenset()
+        used = set()
+        defined = set()
+        for start, end in zip(cfg.starts, cfg.ends):
+            for i in range(end - 1, start - 1, -1):
+                opcode, target, a, b = code[i]
+                if opcode <= IR_NOT and target in shared:
+                    used.discard(target)
+                    defined.add(target)
+                reads = _ir_reads[opcode]
+                if reads and a in shared:
+                    used.add(a)
+                if reads == 2 and b in shared:
+                    used.add(b)
+            for sets, found in ((self.gen, used), (self.kill, defined)):
+                if found:
+                    found = frozenset(found)
+                    sets.append(values.setdefault(found, found))
+                else:
+                    sets.append(empty)
+            used.clear()
+            defined.clear()
+
+    def live_variables(self, value):
+        """A new set of the variables of a value of ins or outs."""
+        return set(value)
+
+
+class ReachingDefinitions(DataflowAnalysis):
+    """The definitions reaching each block. definitions[d] is the index
+    in the code of the d-th instruction writing one of the shared
+    variables (see ControlFlowGraph.shared_variables; the others are
+    never read out of their block).
+
+    The sets of definitions reaching the blocks of a loop grow with the
+    loop, so they are not kept as sets: ins[b] (outs[b]) maps each
+    variable with a definition reaching the start (the end) of block b
+    to an id, a definition d >= 0, or a merge -k - 1 of the ids coming
+    from the predecessors of a block, merges[k], as phi functions do in
+    SSA form. reaching() expands an id to its set of definitions, so the
+    analysis takes memory and time linear in the size of the code.
+    Given the solved Liveness of the graph, the variables that are not
+    live are left out of outs, as ConstantPropagation does.
+    """
+
+    def __init__(self, cfg, liveness=None):
+        DataflowAnalysis.__init__(self, cfg)
+        self.liveness = liveness
+        code = cfg.ir.code
+        shared = cfg.shared_variables()[1]
+        self.definitions = definitions = array("l")
+        # (target, d) of the definitions of each block, in order
+        self.block_definitions = []
+        for start, end in zip(cfg.starts, cfg.ends):
+            written = []
+            for i in range(start, end):
+                instruction = code[i]
+                if instruction[0] <= IR_NOT and instruction[1] in shared:
+                    written.append((instruction[1], len(definitions)))
+                    definitions.append(i)
+            self.block_definitions.append(written)
+        self.merges = []
+        # (block, variable) -> id of its merge
+        self._merge_ids = {}
+
+    def top(self):
+        return None
+
+    def boundary(self):
+        return {}
+
+    def meet(self, a, b):
+        # Different ids of a variable are gathered in a frozenset, which
+        # transfer makes the merge of the block
+        if a is None:
+            return b
+        if b is None:
+            return a
+        result = dict(a)
+        for variable, id in b.items():
+            other = result.get(variable)
+            if other is None:
+                result[variable] = id
+            elif other != id:
+                if type(other) is frozenset:
+                    result[variable] = other | {id}
+                else:
+                    result[variable] = frozenset((other, id))
+        return result
+
+    def solve(self):
+        DataflowAnalysis.solve(self)
+        # ins[b] is what the predecessors gave: put the merges in it
+        merge_ids = self._merge_ids
+        for block, values in enumerate(self.ins):
+            if values is not None and any(type(id) is frozenset for id in values.values()):
+                self.ins[block] = {variable: merge_ids[block, variable] if type(id) is frozenset else id
+                                   for variable, id in values.items()}
+        return self
+
+    def transfer(self, block, value):
+        if value is None:
+            return None
+        values = dict(value)
+        for variable, id in value.items():
+            if type(id) is frozenset:
+                values[variable] = self._merge(block, variable, id)
+        for variable, d in self.block_definitions[block]:
+            values[variable] = d
+        if self.liveness is not None:
+            live = self.liveness.live_variables(self.liveness.outs[block])
+            values = {variable: id for variable, id in values.items() if variable in live}
+        return values
+
+    def _merge(self, block, variable, ids):
+        """Id of the merge of variable at block, now of ids."""
+        key = (block, variable)
+        id = self._merge_ids.get(key)
+        if id is None:
+            id = self._merge_ids[key] = -len(self.merges) - 1
+            self.merges.append(())
+        self.merges[-id - 1] = tuple(ids)
+        return id
+
+    def reaching(self, block, variable, end=False):
+        """Indexes in the code of the definitions of variable reaching
+        the start of block (its end if end is true)."""
+        values = (self.outs if end else self.ins)[block]
+        id = None if values is None else values.get(variable)
+        if id is None:
+            return set()
+        stack = [id]
+        definitions = self.definitions
+        merges = self.merges
+        result = set()
+        seen = set()
+        while stack:
+            id = stack.pop()
+            if id >= 0:
+                result.add(definitions[id])
+            elif id not in seen:
+                seen.add(id)
+                stack.extend(merges[-id - 1])
+        return result
+
+
+# Value of a variable that may have several values
+NOT_CONSTANT = object()
+
+
+class ConstantPropagation(DataflowAnalysis):
+    """The variables with a constant value at each block.
+
+    ins[b] and outs[b] map a variable to its value, or to NOT_CONSTANT
+    when it may have several; a variable not written yet on any path is
+    left out (ins[b] is None for a block never reached). Operations are
+    computed as the Interpreter does; one that would fail at run time
+    is NOT_CONSTANT. Given the solved Liveness of the graph, the
+    variables that are not live are left out of outs, which keeps the
+    maps small whatever the number of blocks.
+    """
+
+    def __init__(self, cfg, liveness=None):
+        DataflowAnalysis.__init__(self, cfg)
+        self.liveness = liveness
+
+    def top(self):
+        return None
+
+    def boundary(self):
+        return {}
+
+    def meet(self, a, b):
+        if a is None:
+            return b
+        if b is None:
+            return a
+        result = dict(a)
+        for variable, value in b.items():
+            if variable not in result:
+                result[variable] = value
+            elif not _same_constant(result[variable], value):
+                result[variable] = NOT_CONSTANT
+        return result
+
+    def operand_value(self, values, operand):
+        """Value of operand: a constant, NOT_CONSTANT, or None when the
+        variable was not written yet."""
+        if operand < 0:
+            return self.cfg.ir.constants[-operand - 1]
+        return values.get(operand)
+
+    def step(self, values, instruction):
+        """Update values with the instruction."""
+        opcode, target, a, b = instruction
+        if opcode > IR_NOT:
+            return
+        value = self.evaluate(values, instruction)
+        if value is None:
+            values.pop(target, None)
+        else:
+            values[target] = value
+
+    def evaluate(self, values, instruction):
+        """Value written by instruction: a constant, NOT_CONSTANT, or
+        None when it reads a variable not written yet."""
+        opcode, target, a, b = instruction
+        x = self.operand_value(values, a)
+        if opcode == IR_COPY or x is None or x is NOT_CONSTANT:
+            return x
+        if opcode == IR_NOT:
+            return (not x) if type(x) is bool else NOT_CONSTANT
+        if opcode == IR_NEG or opcode == IR_POS:
+            if type(x) not in _numbers:
+                return NOT_CONSTANT
+            return -x if opcode == IR_NEG else x
+        y = self.operand_value(values, b)
+        if y is None or y is NOT_CONSTANT:
+            return y
+        if opcode == IR_AND or opcode == IR_OR:
+            if type(x) is not bool or type(y) is not bool:
+                return NOT_CONSTANT
+            return (x and y) if opcode == IR_AND else (x or y)
+        result = _binary_value(_ir_opcode_ops[opcode], x, y)
+        return NOT_CONSTANT if result is None else result
+
+    def transfer(self, block, value):
+        if value is None:
+            return None
+        values = dict(value)
+        cfg = self.cfg
+        code = cfg.ir.code
+        step = self.step
+        for i in range(cfg.starts[block], cfg.ends[block]):
+            step(values, code[i])
+        if self.liveness is not None:
+            live = self.liveness.live_variables(self.liveness.outs[block])
+            values = {variable: value for variable, value in values.items() if variable in live}
+        return values
+
+
+def _same_constant(a, b):
+    if a is NOT_CONSTANT or b is NOT_CONSTANT or type(a) is not type(b):
+        return False
+    # 0.0 == -0.0, but they are different constants
+    return a.hex() == b.hex() if type(a) is float else a == b
+
+
+class IROptimizer:
+    """Optimizes ThreeAddressCode with the dataflow analyses.
+
+    - Variables with a constant value are replaced by that value, and
+      operations, type checks and conditional jumps on constants are
+      computed, removed or made unconditional.
+    - Code no path reaches is removed: after a break, a continue or a
+      jump decided by a constant, and the jumps to the next instruction
+      and the labels no jump goes to.
+    - Writes to variables that are not read afterwards (a var never used,
+      a value overwritten before it is read...) are removed, unless the
+      operation could fail at run time.
+
+    The passes are repeated until none finds anything to change. The
+    code is changed in place.
+
+        optimizer = IROptimizer()
+        optimizer.optimize(IRGenerator().generate(program))
+        print(optimizer.report())
+    """
+
+    def optimize(self, ir):
+        """The optimized ir."""
+        self.propagated = 0
+        self.folded = 0
+        self.unreachable = 0
+        self.dead = 0
+        self.rounds = 0
+        while True:
+            self.rounds += 1
+            changed = self._remove_unreachable(ir)
+            changed = self._propagate_constants(ir) or changed
+            changed = self._remove_dead_definitions(ir) or changed
+            if not changed:
+                return ir
+
+    def report(self):
+        return ("%d constants propagated, %d instructions folded, %d unreachable and %d dead instructions removed"
+                " in %d rounds" % (self.propagated, self.folded, self.unreachable, self.dead, self.rounds))
+
+    def _propagate_constants(self, ir):
+        cfg = ControlFlowGraph(ir)
+        analysis = ConstantPropagation(cfg, Liveness(cfg).solve()).solve()
+        code = ir.code
+        constants = ir.constants
+        removed = bytearray(len(code))
+        propagated = folded = 0
+        for block, values in enumerate(analysis.ins):
+            if values is None:
+                continue
+            values = dict(values)
+            for i in range(cfg.starts[block], cfg.ends[block]):
+                instruction = opcode, target, a, b = code[i]
+                reads = _ir_reads[opcode]
+                if reads and a >= 0 and _is_constant(values.get(a)):
+                    a = ir.constant(values[a])
+                    propagated += 1
+                if reads == 2 and b >= 0 and _is_constant(values.get(b)):
+                    b = ir.constant(values[b])
+                    propagated += 1
+                if opcode <= IR_NOT:
+                    value = analysis.evaluate(values, instruction)
+                    if opcode != IR_COPY and _is_constant(value):
+                        opcode, a, b = IR_COPY, ir.constant(value), 0
+                        folded += 1
+                elif reads and a < 0:
+                    value = constants[-a - 1]
+                    if opcode == IR_CHECK_TYPE and type(value) is TYPES[IR_TYPE_NAMES[b]]:
+                        removed[i] = 1
+                        folded += 1
+                    elif opcode >= IR_JUMP_IF_FALSE and (type(value) is bool or b):
+                        # The jump is always or never taken (a value other
+                        # than a bool never jumps with b = 1)
+                        if value is (opcode == IR_JUMP_IF_TRUE):
+                            opcode, a = IR_JUMP, 0
+                        else:
+                            removed[i] = 1
+                        folded += 1
+                analysis.step(values, instruction)
+                code[i] = (opcode, target, a, b)
+        if any(removed):
+            _remove(ir, removed)
+        self.propagated += propagated
+        self.folded += folded
+        return bool(propagated or folded)
+
+    def _remove_unreachable(self, ir):
+        cfg = ControlFlowGraph(ir)
+        code = ir.code
+        removed = bytearray(len(code))
+        reachable = bytearray(len(cfg))
+        for block in cfg.reverse_postorder():
+            reachable[block] = 1
+        for block, start, end in zip(range(len(cfg)), cfg.starts, cfg.ends):
+            if not reachable[block]:
+                removed[start:end] = b"\1" * (end - start)
+        # Labels jumped to, and jumps to the label that follows them
+        targets = set()
+        for i, (opcode, target, a, b) in enumerate(code):
+            if opcode < IR_JUMP or removed[i]:
+                continue
+            j = i + 1
+            while j < len(code) and (removed[j] or code[j][0] == IR_LABEL and code[j][1] != target):
+                j += 1
+            if opcode == IR_JUMP and j < len(code) and code[j][:2] == (IR_LABEL, target):
+                removed[i] = 1
+            else:
+                targets.add(target)
+        for i, (opcode, target, a, b) in enumerate(code):
+            if opcode == IR_LABEL and target not in targets:
+                removed[i] = 1
+        count = sum(1 for i, instruction in enumerate(code) if removed[i] and instruction[0] != IR_LABEL)
+        if any(removed):
+            _remove(ir, removed)
+        self.unreachable += count
+        return bool(count)
+
+    def _remove_dead_definitions(self, ir):
+        cfg = ControlFlowGraph(ir)
+        liveness = Liveness(cfg).solve()
+        code = ir.code
+        removed = bytearray(len(code))
+        for block, start, end in zip(range(len(cfg)), cfg.starts, cfg.ends):
+            live = liveness.live_variables(liveness.outs[block])
+            for i in range(end - 1, start - 1, -1):
+                opcode, target, a, b = instruction = code[i]
+                if opcode <= IR_NOT:
+                    if target not in live and _cannot_fail(ir, instruction):
+                        removed[i] = 1
+                        continue
+                    live.discard(target)
+                reads = _ir_reads[opcode]
+                if reads and a >= 0:
+                    live.add(a)
+                if reads == 2 and b >= 0:
+                    live.add(b)
+        count = sum(removed)
+        if count:
+            _remove(ir, removed)
+        self.dead += count
+        return bool(count)
+
+
+def _is_constant(value):
+    return value is not None and value is not NOT_CONSTANT
+
+
+def _operand_type(ir, operand):
+    if operand < 0:
+        return type(ir.constants[-operand - 1])
+    return ir.types.get(operand)
+
+
+def _cannot_fail(ir, instruction):
+    """Whether the operation of an instruction writing a variable always
+    succeeds, given the types of its operands."""
+    opcode, target, a, b = instruction
+    if opcode == IR_COPY:
+        return True
+    a_type = _operand_type(ir, a)
+    if opcode == IR_NOT:
+        return a_type is bool
+    if opcode == IR_NEG or opcode == IR_POS:
+        return a_type in _numbers
+    if a_type is None or a_type is not _operand_type(ir, b) or a_type not in _ir_accepted[opcode]:
+        return False
+    # Unless it divides by a constant other than zero, a division may fail
+    return opcode != IR_DIV or (b < 0 and ir.constants[-b - 1] != 0)
+
+
+def _remove(ir, removed):
+    """Remove the instructions i of ir with removed[i] set."""
+    kept = [i for i in range(len(ir.code)) if not removed[i]]
+    code = ir.code
+    coords = ir.coords
+    ir.code = [code[i] for i in kept]
+    ir.coords = array("q", [coords[i] for i in kept])
@@ -0,0 +1,482 @@
+import sys
+import operator
+
+# Status returned by the statements that leave their block early
+BREAK, CONTINUE = 1, 2
+
+# Python type of the values of each uCyan type (char values are strings)
+TYPES = {"int": int, "float": float, "char": str, "bool": bool}
+
+_arithmetic = {"+": operator.add, "-": operator.sub, "*": operator.mul}
+_comparison = {"<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge}
+_equality = {"==": operator.eq, "!=": operator.ne}
+
+# Operand types accepted by arithmetic, ordering and equality operators
+_numbers = frozenset((int, float))
+_ordered = frozenset((int, float, str))
+_any = frozenset((int, float, str, bool))
+
+_escapes = {"n": "\n", "t": "\t", "0": "\0", "\\": "\\", "'": "'"}
+
+
+class UCyanRuntimeError(Exception):
+    """Error found while preparing or executing a uCyan program."""
+
+    def __init__(self, message, coord=None):
+        super().__init__(message)
+        self.message = message
+        self.coord = coord
+
+    def __str__(self):
+        if self.coord is None:
+            return self.message
+        return "%s at %d:%d" % (self.message, self.coord.line, self.coord.column)
+
+
+def _fail(node, message):
+    raise UCyanRuntimeError(message, node.coord)
+
+
+def _bad_condition(node, value):
+    _fail(node, "Condition is a %s, not a bool" % type(value).__name__)
+
+
+def _char_value(text):
+    """Value of a CHAR_CONST: the text between the quotes, with escapes."""
+    text = text[1:-1]
+    if "\\" not in text:
+        return text
+    chars = []
+    i = 0
+    while i < len(text):
+        if text[i] == "\\" and i + 1 < len(text):
+            chars.append(_escapes.get(text[i + 1], text[i + 1]))
+            i += 2
+        else:
+            chars.append(text[i])
+            i += 1
+    return "".join(chars)
+
+
+def literal_value(node):
+    """Python value of a Literal node. The parser gives int, float and
+    bool literals their value; text values are converted here."""
+    value = node.value
+    if node.type == "char":
+        return _char_value(value)
+    if not isinstance(value, str):
+        return value
+    try:
+        if node.type == "int":
+            return int(value)
+        if node.type == "float":
+            return float(value)
+        return value == "true"
+    except ValueError:
+        _fail(node, "Invalid %s literal %s" % (node.type, value))
+
+
+def _format(value):
+    """Text written by print for a value."""
+    if value is True:
+        return "true"
+    if value is False:
+        return "false"
+    return str(value)
+
+
+class Interpreter(NodeVisitor):
+    """Executes uCyan programs.
+
+    The tree is walked once before running: each node becomes a Python
+    closure, and each variable is resolved to a slot of the frame (a
+    list), so running a program neither dispatches on node classes nor
+    looks names up. Statements return None, or BREAK/CONTINUE when they
+    leave their block early. Errors (undefined names, mismatched types,
+    division by zero...) raise UCyanRuntimeError, and so does a program
+    whose blocks are nested too deeply to compile or run.
+
+        Interpreter().run(program)
+    """
+
+    def __init__(self, out=None):
+        self.out = out if out is not None else sys.stdout
+        self.frame = None
+
+    def run(self, program):
+        """Execute program (a Program node). Returns the final frame."""
+        code = self.compile(program)
+        self.frame = [None] * self.frame_size
+        try:
+            code(self.frame)
+        except RecursionError:
+            raise UCyanRuntimeError("Program is nested too deeply") from None
+        return self.frame
+
+    def compile(self, program):
+        """The closure running program; frame_size is its number of slots."""
+        # name -> (slot, const, dtype) of each open scope, innermost last
+        self.scopes = []
+        self.next_slot = 0
+        self.frame_size = 0
+        self.loops = 0
+        # Results of the operands of the expression nodes being compiled
+        self.operands = []
+        try:
+            return self.visit(program)
+        except RecursionError:
+            raise UCyanRuntimeError("Program is nested too deeply") from None
+
+    # Scopes
+
+    def _open_scope(self):
+        self.scopes.append({})
+        return self.next_slot
+
+    def _close_scope(self, first_slot):
+        # The slots of an inner block are reused by the next one
+        self.scopes.pop()
+        self.next_slot = first_slot
+
+    def _declare(self, node, const, dtype):
+        scope = self.scopes[-1]
+        if node.name in scope:
+            _fail(node, "'%s' is already defined" % node.name)
+        slot = self.next_slot
+        self.next_slot += 1
+        self.frame_size = max(self.frame_size, self.next_slot)
+        scope[node.name] = (slot, const, dtype)
+        return slot
+
+    def _lookup(self, node):
+        for scope in reversed(self.scopes):
+            if node.name in scope:
+                return scope[node.name]
+        _fail(node, "'%s' is not defined" % node.name)
+
+    def _block(self, statements):
+        first_slot = self._open_scope()
+        code = tuple(self.visit(statement) for statement in statements or ())
+        self._close_scope(first_slot)
+        if not code:
+            return lambda frame: None
+        if len(code) == 1:
+            return code[0]
+
+        def block(frame):
+            for statement in code:
+                status = statement(frame)
+                if status:
+                    return status
+        return block
+
+    def _type(self, dtype):
+        if dtype is not None and dtype.name not in TYPES:
+            _fail(dtype, "Unknown type '%s'" % dtype.name)
+        return dtype
+
+    # Statements
+
+    def visit_Program(self, node):
+        return self._block(node.statements)
+
+    def visit_VarDefinition(self, node):
+        dtype = self._type(node.dtype)
+        if node.expression is None:
+            if dtype is None:
+                _fail(node, "'%s' needs a type or an initial value" % node.name)
+            default = TYPES[dtype.name]()
+            expression = lambda frame: default
+        else:
+            expression = self._expression(node.expression)
+        return self._store(node, self._declare(node, False, dtype), dtype, expression)
+
+    def visit_ConstDefinition(self, node):
+        dtype = self._type(node.dtype)
+        expression = self._expression(node.expression)
+        return self._store(node, self._declare(node, True, dtype), dtype, expression)
+
+    def visit_AssignmentStatement(self, node):
+        slot, const, dtype = self._lookup(node.location)
+        if const:
+            _fail(node, "Cannot assign to the constant '%s'" % node.location.name)
+        return self._store(node, slot, dtype, self._expression(node.expression))
+
+    def _store(self, node, slot, dtype, expression):
+        """Store the value of expression in slot, checking it against
+        the declared dtype."""
+        if dtype is None:
+            def store(frame):
+                frame[slot] = expression(frame)
+            return store
+        expected = TYPES[dtype.name]
+
+        def checked_store(frame):
+            value = expression(frame)
+            if type(value) is not expected:
+                _fail(node, "Cannot store a %s in a %s" % (type(value).__name__, dtype.name))
+            frame[slot] = value
+        return checked_store
+
+    def visit_ExpressionAsStatement(self, node):
+        expression = self._expression(node.expression)
+
+        def evaluate(frame):
+            expression(frame)
+        return evaluate
+
+    def visit_PrintStatement(self, node):
+        expression = self._expression(node.expression)
+        write = self.out.write
+
+        def print_(frame):
+            write(_format(expression(frame)) + "\n")
+        return print_
+
+    def visit_IfStatement(self, node):
+        test = self._expression(node.test)
+        consequence = self._block(node.consequence)
+        alternative = self._block(node.alternative)
+
+        def if_(frame):
+            value = test(frame)
+            if value is True:
+                return consequence(frame)
+            if value is False:
+                return alternative(frame)
+            _bad_condition(node, value)
+        return if_
+
+    def visit_WhileStatement(self, node):
+        test = self._expression(node.test)
+        self.loops += 1
+        body = self._block(node.body)
+        self.loops -= 1
+
+        def while_(frame):
+            while True:
+                value = test(frame)
+                if value is not True:
+                    if value is False:
+                        return
+                    _bad_condition(node, value)
+                if body(frame) == BREAK:
+                    return
+        return while_
+
+    def visit_BreakStatement(self, node):
+        if not self.loops:
+            _fail(node, "break outside a loop")
+        return lambda frame: BREAK
+
+    def visit_ContinueStatement(self, node):
+        if not self.loops:
+            _fail(node, "continue outside a loop")
+        return lambda frame: CONTINUE
+
+    # Expressions
+    # Their nodes are visited in post-order by _expression; each
+    # visit_XXX takes the results of its operands from self.operands
+
+    # Expressions nested deeper than this are compiled by _flat_expression,
+    # since evaluating nested closures recurses once per level
+    max_nesting = 100
+
+    def _expression(self, node):
+        """Compile expression node. Its nodes are visited in post-order
+        from an explicit stack, so that any nesting compiles."""
+        operands = self.operands
+        base = len(operands)
+        limit = self.max_nesting
+        stack = [(node, self._operands(node))]
+        while stack:
+            current, children = stack[-1]
+            for child in children:
+                if len(stack) == limit:
+                    del operands[base:]
+                    return self._flat_expression(node)
+                stack.append((child, self._operands(child)))
+                break
+            else:
+                stack.pop()
+                operands.append(self.visit(current))
+        return operands.pop()
+
+    def _operands(self, node):
+        """Iterator over the operands of node, compiled before it."""
+        return iter(node)
+
+    def _flat_expression(self, node):
+        """Closure evaluating expression node without recursing: a flat
+        list of steps run in a loop over a stack of values. Each step
+        calls the closure of one node, whose operands read the top of
+        the stack. The left operand of && and || is followed by a step
+        that jumps past the operator when it decides the result."""
+        values = []
+        steps = []
+        targets = []
+        top = lambda frame: values[-1]
+        second = lambda frame: values[-2]
+
+        def operands_of(node):
+            if node.__class__.__name__ != "BinaryOp" or node.op not in ("&&", "||"):
+                yield from node
+                return
+            yield node.left
+            stop = node.op == "||"
+            target = [None]
+
+            def jump(frame):
+                if values[-1] is stop:
+                    return target[0]
+            steps.append(jump)
+            targets.append(target)
+            yield node.right
+
+        operands = self.operands
+        stack = [(node, operands_of(node))]
+        while stack:
+            current, children = stack[-1]
+            for child in children:
+                stack.append((child, operands_of(child)))
+                break
+            else:
+                stack.pop()
+                kind = current.__class__.__name__
+                if kind == "BinaryOp":
+                    operands.append(second)
+                    operands.append(top)
+                    steps.append(self._step(self.visit(current), values, 2))
+                    if current.op in ("&&", "||"):
+                        targets.pop()[0] = len(steps)
+                elif kind == "UnaryOp":
+                    operands.append(top)
+                    steps.append(self._step(self.visit(current), values, 1))
+                else:
+                    steps.append(self._step(self.visit(current), values, 0))
+        size = len(steps)
+
+        def evaluate(frame):
+            del values[:]
+            i = 0
+            while i < size:
+                target = steps[i](frame)
+                i = i + 1 if target is None else target
+            return values.pop()
+        return evaluate
+
+    @staticmethod
+    def _step(code, values, count):
+        """Step replacing the count operands on top of values by the
+        value of code."""
+        if count == 0:
+            def step(frame):
+                values.append(code(frame))
+        elif count == 1:
+            def step(frame):
+                values[-1] = code(frame)
+        else:
+            def step(frame):
+                values[-2] = code(frame)
+                del values[-1]
+        return step
+
+    def visit_Literal(self, node):
+        value = literal_value(node)
+        return lambda frame: value
+
+    def visit_Location(self, node):
+        slot = self._lookup(node)[0]
+        return operator.itemgetter(slot)
+
+    def visit_UnaryOp(self, node):
+        operand = self.operands.pop()
+        op = node.op
+
+        if op == "!":
+            def unary(frame):
+                value = operand(frame)
+                if value is True or value is False:
+                    return not value
+                _fail(node, "Bad operand type for !: %s" % type(value).__name__)
+        else:
+            sign = -1 if op == "-" else 1
+
+            def unary(frame):
+                value = operand(frame)
+                if type(value) in _numbers:
+                    return sign * value
+                _fail(node, "Bad operand type for %s: %s" % (op, type(value).__name__))
+        return unary
+
+    def visit_BinaryOp(self, node):
+        operands = self.operands
+        right = operands.pop()
+        left = operands.pop()
+        op = node.op
+
+        def mismatch(a, b):
+            _fail(node, "Bad operand types for %s: %s and %s" % (op, type(a).__name__, type(b).__name__))
+
+        if op == "&&" or op == "||":
+            stop = op == "||"
+
+            def logical(frame):
+                a = left(frame)
+                if a is stop:
+                    return a
+                b = right(frame)
+                if (a is True or a is False) and (b is True or b is False):
+                    return b
+                mismatch(a, b)
+            return logical
+
+        if op == "/":
+            def divide(frame):
+                a = left(frame)
+                b = right(frame)
+                t = type(a)
+                if t is not type(b) or t not in _numbers:
+                    mismatch(a, b)
+                if not b:
+                    _fail(node, "Division by zero")
+                if t is float:
+                    return a / b
+                # Integer division truncates toward zero
+                q = abs(a) // abs(b)
+                return -q if (a < 0) != (b < 0) else q
+            return divide
+
+        if op in _arithmetic:
+            func, accepted = _arithmetic[op], _numbers
+        elif op in _comparison:
+            func, accepted = _comparison[op], _ordered
+        else:
+            func, accepted = _equality[op], _any
+
+        def binary(frame):
+            a = left(frame)
+            b = right(frame)
+            t = type(a)
+            if t is not type(b) or t not in accepted:
+                mismatch(a, b)
+            return func(a, b)
+        return binary
+
+
+def run(path, out=None, backend="sly"):
+    """Parse and execute the uCyan program in the file at path.
+    Runtime errors are reported like the lexer's, on stdout.
+    Returns the Interpreter (None if the program did not parse).
+    """
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    program = UCyanParser(backend=backend).parse(text)
+    if program is None:
+        return None
+    interpreter = Interpreter(out)
+    try:
+        interpreter.run(program)
+    except UCyanRuntimeError as e:
+        print("Runtime error: %s" % e, file=sys.stdout)
+    return interpreter
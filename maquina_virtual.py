@@ -0,0 +1,437 @@
+import sys
+from array import array
+
+# Opcodes. Every instruction is an (opcode, argument) pair of the code array.
+OPNAMES = (
+    "LOAD_SLOT",          # push frame[arg]
+    "LOAD_CONST",         # push constants[arg]
+    "STORE_SLOT",         # frame[arg] = pop()
+    "BINARY_ADD",         # BINARY_ADD to COMPARE_NE: top = top op right operand,
+                          # popped (arg 0), constants[arg - 1] or frame[-arg - 1]
+    "BINARY_SUB",
+    "BINARY_MUL",
+    "BINARY_DIV",
+    "COMPARE_LT",
+    "COMPARE_LE",
+    "COMPARE_GT",
+    "COMPARE_GE",
+    "COMPARE_EQ",
+    "COMPARE_NE",
+    "CHECK_TYPE",         # fail unless the top is a TYPES[TYPE_NAMES[arg]]
+    "UNARY_NEG",
+    "UNARY_POS",
+    "UNARY_NOT",
+    "JUMP",               # pc = arg
+    "POP_JUMP_IF_FALSE",  # pc = arg if pop() is false (must be a bool)
+    "JUMP_IF_FALSE",      # &&: pc = arg if the top is false (kept)
+    "JUMP_IF_TRUE",       # ||: pc = arg if the top is true (kept)
+    "LOGICAL_RESULT",     # check the two operands of && (arg 0) or || (1), keep the right one
+    "PRINT",
+    "POP_TOP",
+    "HALT",
+)
+
+(LOAD_SLOT, LOAD_CONST, STORE_SLOT,
+ BINARY_ADD, BINARY_SUB, BINARY_MUL, BINARY_DIV,
+ COMPARE_LT, COMPARE_LE, COMPARE_GT, COMPARE_GE, COMPARE_EQ, COMPARE_NE,
+ CHECK_TYPE, UNARY_NEG, UNARY_POS, UNARY_NOT,
+ JUMP, POP_JUMP_IF_FALSE, JUMP_IF_FALSE, JUMP_IF_TRUE, LOGICAL_RESULT,
+ PRINT, POP_TOP, HALT) = range(len(OPNAMES))
+
+_binary_opcodes = {
+    "+": BINARY_ADD, "-": BINARY_SUB, "*": BINARY_MUL, "/": BINARY_DIV,
+    "<": COMPARE_LT, "<=": COMPARE_LE, ">": COMPARE_GT, ">=": COMPARE_GE,
+    "==": COMPARE_EQ, "!=": COMPARE_NE,
+}
+_unary_opcodes = {"-": UNARY_NEG, "+": UNARY_POS, "!": UNARY_NOT}
+
+# Operator of each opcode, for the error messages
+_opcode_ops = {opcode: op for op, opcode in _binary_opcodes.items()}
+_opcode_ops.update({opcode: op for op, opcode in _unary_opcodes.items()})
+
+# Operand types accepted by each binary opcode
+_accepted = [None] * len(OPNAMES)
+for _opcode in (BINARY_ADD, BINARY_SUB, BINARY_MUL, BINARY_DIV):
+    _accepted[_opcode] = _numbers
+for _opcode in (COMPARE_LT, COMPARE_LE, COMPARE_GT, COMPARE_GE):
+    _accepted[_opcode] = _ordered
+for _opcode in (COMPARE_EQ, COMPARE_NE):
+    _accepted[_opcode] = _any
+
+# Function of each binary opcode but BINARY_DIV
+_operators = [None] * len(OPNAMES)
+for _op, _opcode in _binary_opcodes.items():
+    if _opcode != BINARY_DIV:
+        _operators[_opcode] = _arithmetic.get(_op) or _comparison.get(_op) or _equality[_op]
+
+# Argument of CHECK_TYPE
+TYPE_NAMES = tuple(TYPES)
+
+# Opcodes whose argument is an instruction position
+_jumps = frozenset((JUMP, POP_JUMP_IF_FALSE, JUMP_IF_FALSE, JUMP_IF_TRUE))
+
+
+class Bytecode:
+    """A compiled uCyan program.
+
+    code is a flat array of (opcode, argument) pairs; jump arguments are
+    positions in code. constants is the constant pool of LOAD_CONST and
+    coords[i] the coord of the node that emitted the instruction at code
+    position 2 * i, for the error messages. The program runs on a frame
+    of frame_size slots.
+    """
+
+    def __init__(self):
+        self.code = array("l")
+        self.constants = []
+        self.coords = []
+        self.frame_size = 0
+        self._constant_ids = {}
+
+    def __len__(self):
+        return len(self.code) // 2
+
+    def emit(self, opcode, arg=0, coord=None):
+        """Append an instruction. Returns its position in code."""
+        position = len(self.code)
+        self.code.append(opcode)
+        self.code.append(arg)
+        self.coords.append(coord)
+        return position
+
+    def patch(self, position, target):
+        """Point the jump at position to target."""
+        self.code[position + 1] = target
+
+    def constant(self, value):
+        """Index of value in the constant pool."""
+        # 1 == 1.0 == True, so the type is part of the key
+        key = (type(value), value)
+        index = self._constant_ids.get(key)
+        if index is None:
+            index = self._constant_ids[key] = len(self.constants)
+            self.constants.append(value)
+        return index
+
+    def disassemble(self, out=None):
+        """Write one line per instruction to out (sys.stdout by default)."""
+        out = out if out is not None else sys.stdout
+        code = self.code
+        targets = {code[i + 1] for i in range(0, len(code), 2) if code[i] in _jumps}
+        for position in range(0, len(code), 2):
+            opcode, arg = code[position], code[position + 1]
+            if opcode == LOAD_CONST:
+                detail = "(%r)" % (self.constants[arg],)
+            elif opcode == CHECK_TYPE:
+                detail = "(%s)" % TYPE_NAMES[arg]
+            elif BINARY_ADD <= opcode <= COMPARE_NE and arg > 0:
+                detail = "(%r)" % (self.constants[arg - 1],)
+            elif BINARY_ADD <= opcode <= COMPARE_NE and arg < 0:
+                detail = "(slot %d)" % (-arg - 1)
+            elif opcode in _jumps:
+                detail = "(to %d)" % arg
+            else:
+                detail = ""
+            coord = self.coords[position // 2]
+            line = "" if coord is None else "%d:%d" % (coord.line, coord.column)
+            text = "%8s %2s %5d %-22s %4d %s" % (
+                line, ">>" if position in targets else "", position, OPNAMES[opcode], arg, detail)
+            out.write(text.rstrip() + "\n")
+
+
+class BytecodeCompiler(Interpreter):
+    """Compiles a Program to Bytecode.
+
+    Names are resolved to frame slots, and scopes opened, exactly as by
+    the Interpreter (whose checks and errors it shares); expressions
+    leave their value on the stack, statements leave it empty.
+
+        bytecode = BytecodeCompiler().compile(program)
+        VirtualMachine().run(bytecode)
+    """
+
+    def compile(self, program):
+        self.bytecode = Bytecode()
+        # (start, break jumps) of the enclosing loops, innermost last
+        self.loop_stack = []
+        # Jumps of the && and || operators being compiled, innermost last
+        self.logical_jumps = []
+        Interpreter.compile(self, program)
+        self.bytecode.emit(HALT)
+        self.bytecode.frame_size = self.frame_size
+        return self.bytecode
+
+    def _block(self, statements):
+        first_slot = self._open_scope()
+        for statement in statements or ():
+            self.visit(statement)
+        self._close_scope(first_slot)
+
+    def _store(self, node, slot, dtype, expression):
+        emit = self.bytecode.emit
+        if dtype is not None:
+            emit(CHECK_TYPE, TYPE_NAMES.index(dtype.name), node.coord)
+        emit(STORE_SLOT, slot, node.coord)
+
+    # Statements
+
+    def visit_VarDefinition(self, node):
+        dtype = self._type(node.dtype)
+        if node.expression is None:
+            if dtype is None:
+                _fail(node, "'%s' needs a type or an initial value" % node.name)
+            self.bytecode.emit(LOAD_CONST, self.bytecode.constant(TYPES[dtype.name]()), node.coord)
+        else:
+            self._expression(node.expression)
+        self._store(node, self._declare(node, False, dtype), dtype, None)
+
+    def visit_ConstDefinition(self, node):
+        dtype = self._type(node.dtype)
+        self._expression(node.expression)
+        self._store(node, self._declare(node, True, dtype), dtype, None)
+
+    def visit_AssignmentStatement(self, node):
+        slot, const, dtype = self._lookup(node.location)
+        if const:
+            _fail(node, "Cannot assign to the constant '%s'" % node.location.name)
+        self._expression(node.expression)
+        self._store(node, slot, dtype, None)
+
+    def visit_ExpressionAsStatement(self, node):
+        self._expression(node.expression)
+        self.bytecode.emit(POP_TOP, 0, node.coord)
+
+    def visit_PrintStatement(self, node):
+        self._expression(node.expression)
+        self.bytecode.emit(PRINT, 0, node.coord)
+
+    def visit_IfStatement(self, node):
+        bytecode = self.bytecode
+        self._expression(node.test)
+        to_alternative = bytecode.emit(POP_JUMP_IF_FALSE, 0, node.coord)
+        self._block(node.consequence)
+        if node.alternative:
+            to_end = bytecode.emit(JUMP, 0, node.coord)
+            bytecode.patch(to_alternative, len(bytecode.code))
+            self._block(node.alternative)
+            bytecode.patch(to_end, len(bytecode.code))
+        else:
+            bytecode.patch(to_alternative, len(bytecode.code))
+
+    def visit_WhileStatement(self, node):
+        bytecode = self.bytecode
+        start = len(bytecode.code)
+        self._expression(node.test)
+        breaks = [bytecode.emit(POP_JUMP_IF_FALSE, 0, node.coord)]
+        self.loop_stack.append((start, breaks))
+        self._block(node.body)
+        self.loop_stack.pop()
+        bytecode.emit(JUMP, start, node.coord)
+        for position in breaks:
+            bytecode.patch(position, len(bytecode.code))
+
+    def visit_BreakStatement(self, node):
+        if not self.loop_stack:
+            _fail(node, "break outside a loop")
+        self.loop_stack[-1][1].append(self.bytecode.emit(JUMP, 0, node.coord))
+
+    def visit_ContinueStatement(self, node):
+        if not self.loop_stack:
+            _fail(node, "continue outside a loop")
+        self.bytecode.emit(JUMP, self.loop_stack[-1][0], node.coord)
+
+    # Expressions
+    # Their nodes are visited in post-order by _expression, after the
+    # code of their operands
+
+    def _expression(self, node):
+        """Emit the code of expression node, visiting its nodes in
+        post-order from an explicit stack."""
+        stack = [(node, self._operands(node))]
+        while stack:
+            current, children = stack[-1]
+            for child in children:
+                stack.append((child, self._operands(child)))
+                break
+            else:
+                stack.pop()
+                self.visit(current)
+
+    def _operands(self, node):
+        """Iterator over the operands of node compiled before it. The
+        right operand of a binary opcode is not when it is a literal or
+        a variable (see _operand); && and || emit their jump between
+        their two operands."""
+        if node.__class__.__name__ != "BinaryOp":
+            return iter(node)
+        if node.op == "&&" or node.op == "||":
+            return self._logical_operands(node)
+        if node.right.__class__.__name__ in ("Literal", "Location"):
+            return iter((node.left,))
+        return iter(node)
+
+    def _logical_operands(self, node):
+        yield node.left
+        opcode = JUMP_IF_TRUE if node.op == "||" else JUMP_IF_FALSE
+        self.logical_jumps.append(self.bytecode.emit(opcode, 0, node.coord))
+        yield node.right
+
+    def visit_Literal(self, node):
+        self.bytecode.emit(LOAD_CONST, self.bytecode.constant(literal_value(node)), node.coord)
+
+    def visit_Location(self, node):
+        self.bytecode.emit(LOAD_SLOT, self._lookup(node)[0], node.coord)
+
+    def visit_UnaryOp(self, node):
+        self.bytecode.emit(_unary_opcodes[node.op], 0, node.coord)
+
+    def _operand(self, node):
+        """Argument of a binary opcode taking node as its right operand:
+        constants[arg - 1] for a literal, frame[-arg - 1] for a variable,
+        0 to take it from the stack (where its code left it)."""
+        kind = node.__class__.__name__
+        if kind == "Literal":
+            return self.bytecode.constant(literal_value(node)) + 1
+        if kind == "Location":
+            return -self._lookup(node)[0] - 1
+        return 0
+
+    def visit_BinaryOp(self, node):
+        bytecode = self.bytecode
+        if node.op == "&&" or node.op == "||":
+            bytecode.emit(LOGICAL_RESULT, node.op == "||", node.coord)
+            bytecode.patch(self.logical_jumps.pop(), len(bytecode.code))
+        else:
+            bytecode.emit(_binary_opcodes[node.op], self._operand(node.right), node.coord)
+
+
+class VirtualMachine:
+    """Stack machine running the Bytecode of BytecodeCompiler.
+
+        VirtualMachine().run(BytecodeCompiler().compile(program))
+
+    Raises UCyanRuntimeError (with the coord of the failing instruction)
+    on the same errors as the Interpreter.
+    """
+
+    def __init__(self, out=None):
+        self.out = out if out is not None else sys.stdout
+        self.frame = None
+
+    def run(self, bytecode):
+        """Execute bytecode. Returns the final frame."""
+        code = bytecode.code.tolist()
+        constants = bytecode.constants
+        frame = self.frame = [None] * bytecode.frame_size
+        write = self.out.write
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        numbers = _numbers
+        accepted = _accepted
+        operators = _operators
+        types = [TYPES[name] for name in TYPE_NAMES]
+        pc = 0
+        # The most frequent opcodes are tested first
+        while True:
+            opcode = code[pc]
+            arg = code[pc + 1]
+            pc += 2
+            if opcode == LOAD_SLOT:
+                push(frame[arg])
+            elif opcode == LOAD_CONST:
+                push(constants[arg])
+            elif opcode == STORE_SLOT:
+                frame[arg] = pop()
+            elif opcode == POP_JUMP_IF_FALSE:
+                value = pop()
+                if value is False:
+                    pc = arg
+                elif value is not True:
+                    self._fail(bytecode, pc, "Condition is a %s, not a bool" % type(value).__name__)
+            elif opcode == JUMP:
+                pc = arg
+            elif opcode <= COMPARE_NE:
+                # BINARY_ADD to COMPARE_NE
+                if arg == 0:
+                    b = pop()
+                elif arg > 0:
+                    b = constants[arg - 1]
+                else:
+                    b = frame[-arg - 1]
+                a = stack[-1]
+                t = type(a)
+                if t is not type(b) or t not in accepted[opcode]:
+                    self._mismatch(bytecode, pc, opcode, a, b)
+                if opcode == BINARY_DIV:
+                    if not b:
+                        self._fail(bytecode, pc, "Division by zero")
+                    if t is float:
+                        stack[-1] = a / b
+                    else:
+                        # Integer division truncates toward zero
+                        q = abs(a) // abs(b)
+                        stack[-1] = -q if (a < 0) != (b < 0) else q
+                else:
+                    stack[-1] = operators[opcode](a, b)
+            elif opcode == CHECK_TYPE:
+                value = stack[-1]
+                if type(value) is not types[arg]:
+                    self._fail(bytecode, pc, "Cannot store a %s in a %s" % (type(value).__name__, TYPE_NAMES[arg]))
+            elif opcode == UNARY_NOT:
+                value = stack[-1]
+                if value is not True and value is not False:
+                    self._fail(bytecode, pc, "Bad operand type for !: %s" % type(value).__name__)
+                stack[-1] = not value
+            elif opcode == UNARY_NEG or opcode == UNARY_POS:
+                value = stack[-1]
+                if type(value) not in numbers:
+                    self._fail(bytecode, pc, "Bad operand type for %s: %s" % (_opcode_ops[opcode], type(value).__name__))
+                if opcode == UNARY_NEG:
+                    stack[-1] = -value
+            elif opcode == JUMP_IF_FALSE:
+                if stack[-1] is False:
+                    pc = arg
+            elif opcode == JUMP_IF_TRUE:
+                if stack[-1] is True:
+                    pc = arg
+            elif opcode == LOGICAL_RESULT:
+                b = pop()
+                a = stack[-1]
+                if (a is not True and a is not False) or (b is not True and b is not False):
+                    self._fail(bytecode, pc, "Bad operand types for %s: %s and %s" % (
+                        "||" if arg else "&&", type(a).__name__, type(b).__name__))
+                stack[-1] = b
+            elif opcode == PRINT:
+                write(_format(pop()) + "\n")
+            elif opcode == POP_TOP:
+                pop()
+            else:
+                return frame
+
+    @staticmethod
+    def _fail(bytecode, pc, message):
+        raise UCyanRuntimeError(message, bytecode.coords[pc // 2 - 1])
+
+    @classmethod
+    def _mismatch(cls, bytecode, pc, opcode, a, b):
+        cls._fail(bytecode, pc, "Bad operand types for %s: %s and %s" % (
+            _opcode_ops[opcode], type(a).__name__, type(b).__name__))
+
+
+def run_bytecode(path, out=None, backend="sly"):
+    """Parse, compile and execute the uCyan program in the file at path
+    on the VirtualMachine; errors are reported as by run().
+    Returns the VirtualMachine (None if the program did not parse).
+    """
+    with open(path) as f:
+        text = f.read()
+    program = UCyanParser(backend=backend).parse(text)
+    if program is None:
+        return None
+    machine = VirtualMachine(out)
+    try:
+        machine.run(BytecodeCompiler().compile(program))
+    except UCyanRuntimeError as e:
+        print("Runtime error: %s" % e, file=sys.stdout)
+    return machine
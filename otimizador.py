@@ -0,0 +1,298 @@
+# uCyan type name of the Python type of a value (see TYPES)
+_type_names = {python_type: name for name, python_type in TYPES.items()}
+
+
+class Optimizer(NodeVisitor):
+    """Simplifies uCyan programs before they are run or compiled.
+
+    - Operators whose operands are literals are folded into a Literal,
+      as the Interpreter would compute them. Operations that would fail
+      at run time (division by zero, mismatched types...) are kept, so
+      they still fail there.
+    - Uses of a `let` constant whose value is a literal are replaced by
+      that literal.
+    - Identities are removed (x + 0, x - 0, x * 1, 1 * x, x / 1, true && x,
+      false || x...) when the type of x is known to match the literal,
+      and short-circuits with a literal left operand are folded.
+    - if and while statements with a literal test lose their dead branch
+      or body; the live branch is put in place of the if when it does
+      not declare names of its own.
+
+    The tree is changed in place. Like the Interpreter, it assumes the
+    program is free of the errors found before running (undefined names,
+    break outside a loop...): a dead branch is dropped with whatever it
+    contains.
+
+        optimizer = Optimizer()
+        program = optimizer.optimize(program)
+        print(optimizer.report())
+    """
+
+    def optimize(self, program):
+        """The optimized program; eliminated is the number of nodes removed."""
+        # name -> (literal or None, Python type or None) of each open scope
+        self.scopes = []
+        self.folded = 0
+        self.propagated = 0
+        self.branches = 0
+        # (expression, Python type or None) of the operands being optimized
+        self.operands = []
+        before = _count(program)
+        program = self.visit(program)
+        self.eliminated = before - _count(program)
+        return program
+
+    def report(self):
+        return "%d nodes eliminated: %d operations folded, %d constants propagated, %d branches removed" % (
+            self.eliminated, self.folded, self.propagated, self.branches)
+
+    # Scopes
+
+    def _declare(self, name, literal, python_type):
+        self.scopes[-1][name] = (literal, python_type)
+
+    def _lookup(self, name):
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return scope[name]
+        return None, None
+
+    def _block(self, statements):
+        """The optimized statements of a block (None stays None)."""
+        if statements is None:
+            return None
+        self.scopes.append({})
+        result = []
+        for statement in statements:
+            statement = self.visit(statement)
+            if isinstance(statement, list):
+                result.extend(statement)
+            elif statement is not None:
+                result.append(statement)
+        self.scopes.pop()
+        return result
+
+    def _expression(self, node):
+        """The optimized expression node and the Python type of its
+        values (None if unknown). Its nodes are visited in post-order
+        from an explicit stack, each taking its optimized operands and
+        their types from self.operands."""
+        operands = self.operands
+        stack = [(node, iter(node))]
+        while stack:
+            current, children = stack[-1]
+            for child in children:
+                stack.append((child, iter(child)))
+                break
+            else:
+                stack.pop()
+                operands.append(self.visit(current))
+        return operands.pop()
+
+    # Statements
+    # Each returns the statement, a list of statements to put in its
+    # place, or None to remove it
+
+    def visit_Program(self, node):
+        node.statements = self._block(node.statements)
+        return node
+
+    def visit_VarDefinition(self, node):
+        if node.expression is not None:
+            node.expression = self._expression(node.expression)[0]
+        # Stores to typed variables are checked, so only those keep their type
+        self._declare(node.name, None, _dtype(node.dtype))
+        return node
+
+    def visit_ConstDefinition(self, node):
+        node.expression, expression_type = self._expression(node.expression)
+        expression = node.expression
+        dtype = _dtype(node.dtype)
+        literal = None
+        python_type = dtype or expression_type
+        if isinstance(expression, Literal) and (dtype is None or TYPES.get(expression.type) is dtype):
+            literal = expression
+        self._declare(node.name, literal, python_type)
+        return node
+
+    def visit_AssignmentStatement(self, node):
+        node.expression = self._expression(node.expression)[0]
+        return node
+
+    def visit_ExpressionAsStatement(self, node):
+        node.expression = self._expression(node.expression)[0]
+        return node
+
+    def visit_PrintStatement(self, node):
+        node.expression = self._expression(node.expression)[0]
+        return node
+
+    def visit_IfStatement(self, node):
+        node.test = test = self._expression(node.test)[0]
+        value = _bool_literal(test)
+        if value is None:
+            node.consequence = self._block(node.consequence)
+            node.alternative = self._block(node.alternative)
+            return node
+        self.branches += 1
+        live = self._block(node.consequence if value else node.alternative)
+        if not live:
+            return None
+        if not any(isinstance(s, (VarDefinition, ConstDefinition)) for s in live):
+            return live
+        # The branch needs a scope of its own: keep it under "if true"
+        node.test = Literal("bool", True, coord=test.coord)
+        node.consequence = live
+        node.alternative = None
+        return node
+
+    def visit_WhileStatement(self, node):
+        node.test = test = self._expression(node.test)[0]
+        if _bool_literal(test) is False:
+            self.branches += 1
+            return None
+        node.body = self._block(node.body)
+        return node
+
+    def visit_BreakStatement(self, node):
+        return node
+
+    def visit_ContinueStatement(self, node):
+        return node
+
+    # Expressions
+    # Called in post-order by _expression; each returns the expression,
+    # or a simpler one to put in its place, and the Python type of its
+    # values (None if unknown)
+
+    def visit_Literal(self, node):
+        return node, TYPES.get(node.type)
+
+    def visit_Location(self, node):
+        literal, python_type = self._lookup(node.name)
+        if literal is None:
+            return node, python_type
+        self.propagated += 1
+        return Literal(literal.type, literal.value, coord=node.coord), python_type
+
+    def visit_UnaryOp(self, node):
+        node.operand, operand_type = self.operands.pop()
+        operand = node.operand
+        python_type = bool if node.op == "!" else operand_type
+        if not isinstance(operand, Literal):
+            return node, python_type
+        value = _value(operand)
+        if node.op == "!":
+            if type(value) is not bool:
+                return node, python_type
+            result = not value
+        else:
+            if type(value) not in _numbers:
+                return node, python_type
+            result = -value if node.op == "-" else value
+        return self._fold(node, result)
+
+    def visit_BinaryOp(self, node):
+        operands = self.operands
+        node.right, right_type = operands.pop()
+        node.left, left_type = operands.pop()
+        left, right = node.left, node.right
+        op = node.op
+        if op == "&&" or op == "||":
+            return self._logical(node, left, left_type, right, right_type)
+        if op in _arithmetic or op == "/":
+            python_type = left_type if left_type is right_type else None
+        else:
+            python_type = bool
+        if isinstance(left, Literal) and isinstance(right, Literal):
+            result = _binary_value(op, _value(left), _value(right))
+            return (node, python_type) if result is None else self._fold(node, result)
+        if isinstance(right, Literal):
+            operand, operand_type, literal = left, left_type, right
+        elif isinstance(left, Literal) and op in ("+", "*"):
+            operand, operand_type, literal = right, right_type, left
+        else:
+            return node, python_type
+        value = _value(literal)
+        if type(value) is not operand_type:
+            return node, python_type
+        # Only exact identities: -0.0 + 0.0 is 0.0, so + and - keep floats
+        if (op == "+" or op == "-") and value == 0 and type(value) is int:
+            self.folded += 1
+            return operand, operand_type
+        if (op == "*" or op == "/") and value == 1 and type(value) in _numbers:
+            self.folded += 1
+            return operand, operand_type
+        return node, python_type
+
+    def _logical(self, node, left, left_type, right, right_type):
+        # At run time a && b is a when a is false, else b once it is
+        # checked to be a bool (a || b likewise, stopping when a is true)
+        stop = node.op == "||"
+        value = _bool_literal(left)
+        if value is stop:
+            result = left
+        elif value is not None and right_type is bool:
+            result = right
+        elif value is None and _bool_literal(right) is (not stop) and left_type is bool:
+            result = left
+        else:
+            return node, bool
+        self.folded += 1
+        return result, bool
+
+    def _fold(self, node, value):
+        self.folded += 1
+        return Literal(_type_names[type(value)], value, coord=node.coord), type(value)
+
+
+def _count(node):
+    """Number of nodes in the tree rooted at node."""
+    count = 0
+    stack = [node]
+    while stack:
+        count += 1
+        stack.extend(stack.pop())
+    return count
+
+
+def _dtype(dtype):
+    return None if dtype is None else TYPES.get(dtype.name)
+
+
+def _value(literal):
+    """Python value of a Literal, or None when it is not a valid one."""
+    try:
+        return literal_value(literal)
+    except UCyanRuntimeError:
+        return None
+
+
+def _bool_literal(node):
+    """True or False for a bool Literal, None for any other node."""
+    if isinstance(node, Literal) and node.type == "bool":
+        return _value(node)
+    return None
+
+
+def _binary_value(op, a, b):
+    """a op b as the Interpreter computes it, or None when that fails."""
+    t = type(a)
+    if t is not type(b) or a is None:
+        return None
+    if op == "/":
+        if t not in _numbers or not b:
+            return None
+        if t is float:
+            return a / b
+        q = abs(a) // abs(b)
+        return -q if (a < 0) != (b < 0) else q
+    if op in _arithmetic:
+        func, accepted = _arithmetic[op], _numbers
+    elif op in _comparison:
+        func, accepted = _comparison[op], _ordered
+    else:
+        func, accepted = _equality[op], _any
+    if t not in accepted:
+        return None
+    return func(a, b)
@@ -0,0 +1,225 @@
+import struct
+
+# Tags of the entries of the value table
+_STR, _INT, _FLOAT, _FALSE, _TRUE = range(5)
+
+_double = struct.Struct("<d")
+
+
+class SerializationError(ValueError):
+    """Data that is not a serialized AST of this version."""
+
+
+class BinaryAST:
+    """Versioned binary format of the ucyan_ast trees.
+
+    Layout (integers are unsigned LEB128 varints):
+
+        MAGIC, VERSION (one byte)
+        value count, then each value: a tag byte and
+            _STR: byte length, UTF-8 bytes
+            _INT: the integer, zigzag encoded
+            _FLOAT: 8 bytes, little-endian IEEE 754 double
+            _FALSE, _TRUE: nothing
+        node count, then the nodes in post-order:
+            kind (index into NODE_CLASSES)
+            coord: line + 1 (0 for no coord), and column if present
+            each field of LAYOUTS[kind]:
+                attribute: value id + 1 (0 for None)
+                node: 1 if present (taken from the already decoded nodes), else 0
+                list: length + 1 (0 for None)
+
+    Names, types, operators and literal values all go through the value
+    table, so repeated identifiers cost one or two bytes. Decoding reads
+    a memoryview of the data and keeps the decoded children on a stack,
+    so it needs neither recursion nor copies of the input.
+
+        data = BinaryAST.dumps(program)
+        program = BinaryAST.loads(data)
+
+    It has dumps/loads like pickle, so it can be the serializer of a
+    CompilationCache.
+    """
+
+    MAGIC = b"UCYAST"
+    VERSION = 2
+
+    @staticmethod
+    def dumps(node):
+        # value key -> id + 1, and the values in the order of their ids
+        ids = {}
+        table = []
+        body = bytearray()
+        count = 0
+        stack = [(node, iter(node))]
+        while stack:
+            current, children = stack[-1]
+            for child in children:
+                stack.append((child, iter(child)))
+                break
+            else:
+                stack.pop()
+                _encode_node(body, current, ids, table)
+                count += 1
+        out = bytearray(BinaryAST.MAGIC)
+        out.append(BinaryAST.VERSION)
+        _varint(out, len(table))
+        for value in table:
+            _encode_value(out, value)
+        _varint(out, count)
+        out += body
+        return bytes(out)
+
+    @staticmethod
+    def loads(data):
+        view = memoryview(data)
+        magic = BinaryAST.MAGIC
+        if bytes(view[:len(magic)]) != magic:
+            raise SerializationError("Not a serialized uCyan AST")
+        pos = len(magic)
+        if pos >= len(view) or view[pos] != BinaryAST.VERSION:
+            raise SerializationError("Unsupported serialized AST version")
+        pos += 1
+        try:
+            count, pos = _read_varint(view, pos)
+            table = [None]
+            for _ in range(count):
+                tag = view[pos]
+                pos += 1
+                if tag == _STR:
+                    size, pos = _read_varint(view, pos)
+                    if pos + size > len(view):
+                        raise SerializationError("Truncated value table")
+                    table.append(str(view[pos:pos + size], "utf-8"))
+                    pos += size
+                elif tag == _INT:
+                    n, pos = _read_varint(view, pos)
+                    table.append(-(n >> 1) - 1 if n & 1 else n >> 1)
+                elif tag == _FLOAT:
+                    table.append(_double.unpack_from(view, pos)[0])
+                    pos += 8
+                elif tag == _FALSE or tag == _TRUE:
+                    table.append(tag == _TRUE)
+                else:
+                    raise SerializationError("Corrupted serialized AST")
+            count, pos = _read_varint(view, pos)
+            stack = []
+            layouts = LAYOUTS
+            classes = NODE_CLASSES
+            for _ in range(count):
+                kind = view[pos]
+                pos += 1
+                # Single-byte varints are by far the most common: read inline
+                line = view[pos]
+                if line < 0x80:
+                    pos += 1
+                else:
+                    line, pos = _read_varint(view, pos)
+                if line:
+                    column = view[pos]
+                    if column < 0x80:
+                        pos += 1
+                    else:
+                        column, pos = _read_varint(view, pos)
+                    coord = ((line - 1) << 32) | column
+                else:
+                    coord = None
+                values = []
+                # Children, as (position in values, list length or -1)
+                children = []
+                for name, role in layouts[kind]:
+                    n = view[pos]
+                    if n < 0x80:
+                        pos += 1
+                    else:
+                        n, pos = _read_varint(view, pos)
+                    if role == ATTR:
+                        values.append(table[n])
+                    elif n == 0:
+                        values.append(None)
+                    else:
+                        children.append((len(values), -1 if role == NODE else n - 1))
+                        values.append(None)
+                for index, size in reversed(children):
+                    if size < 0:
+                        values[index] = stack.pop()
+                    elif size:
+                        values[index] = stack[-size:]
+                        del stack[-size:]
+                    else:
+                        values[index] = []
+                stack.append(classes[kind](*values, coord=coord))
+        except (IndexError, KeyError, UnicodeDecodeError, struct.error):
+            raise SerializationError("Corrupted serialized AST") from None
+        if len(stack) != 1 or pos != len(view):
+            raise SerializationError("Corrupted serialized AST")
+        return stack[0]
+
+
+def _varint(out, n):
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _read_varint(view, pos):
+    result = 0
+    shift = 0
+    while True:
+        b = view[pos]
+        pos += 1
+        result |= (b & 0x7F) << shift
+        if b < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _value_id(ids, table, value):
+    """Id + 1 of value in the value table (0 for None)."""
+    if value is None:
+        return 0
+    key = value if value.__class__ is str else _value_key(value)
+    sid = ids.get(key)
+    if sid is None:
+        sid = ids[key] = len(table) + 1
+        table.append(value)
+    return sid
+
+
+def _encode_value(out, value):
+    if value.__class__ is str:
+        data = value.encode()
+        out.append(_STR)
+        _varint(out, len(data))
+        out += data
+    elif value is True or value is False:
+        out.append(_TRUE if value else _FALSE)
+    elif value.__class__ is int:
+        out.append(_INT)
+        _varint(out, value * 2 if value >= 0 else -value * 2 - 1)
+    else:
+        out.append(_FLOAT)
+        out += _double.pack(value)
+
+
+def _encode_node(out, node, ids, table):
+    kind = KIND_IDS[type(node)]
+    out.append(kind)
+    # The packed Coord, as the node keeps it
+    coord = node._coord
+    if coord is None:
+        out.append(0)
+    else:
+        _varint(out, (coord >> 32) + 1)
+        _varint(out, coord & 0xFFFFFFFF)
+    for name, role in LAYOUTS[kind]:
+        value = getattr(node, name)
+        if role == ATTR:
+            _varint(out, _value_id(ids, table, value))
+        elif value is None:
+            out.append(0)
+        elif role == NODE:
+            out.append(1)
+        else:
+            _varint(out, len(value) + 1)
@@ -0,0 +1,50 @@
+"""Loads the cells of the repository (its top-level .py files, which
+share one namespace as the cells of a notebook do) into one module, for
+the tests and the benchmarks:
+
+    cells = load()
+    program = cells.UCyanParser().parse(text)
+
+The module is registered in sys.modules, so its objects can be pickled
+and its functions sent to worker processes.
+"""
+import os
+import sys
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Each cell after the ones it uses
+CELLS = (
+    "analisador_lexico.py",
+    "analisador_lexico_dfa.py",
+    "diagnosticos.py",
+    "ucyan_ast.py",
+    "arvore_sintaxe_abstrata.py",
+    "ucyan_flat_ast.py",
+    "serializacao_ast.py",
+    "cache_compilacao.py",
+    "analise_paralela.py",
+    "analise_incremental.py",
+    "interpretador.py",
+    "maquina_virtual.py",
+    "otimizador.py",
+    "analisador_semantico.py",
+    "codigo_intermediario.py",
+    "fluxo_de_controle.py",
+)
+
+
+def load(name="ucyan_cells"):
+    """The module with every cell executed in it (loaded once)."""
+    module = sys.modules.get(name)
+    if module is None:
+        module = types.ModuleType(name)
+        module.__file__ = __file__
+        exec("import sys\nfrom sly import Lexer, Parser", module.__dict__)
+        sys.modules[name] = module
+        for cell in CELLS:
+            path = os.path.join(ROOT, cell)
+            with open(path, encoding="utf-8") as f:
+                exec(compile(f.read(), path, "exec"), module.__dict__)
+    return module
@@ -0,0 +1,66 @@
+"""Random uCyan programs for the differential tests, and a runner
+giving the output of a program followed by its runtime error."""
+import io
+
+# Names declared by PRELUDE: variables a, b, c and constants p, q, r
+PRELUDE = "var int a = 3; var b = 4; var c = true; let p = 2; let bool q = true; let r = 1.5;\n"
+
+_leaves = ("a", "b", "c", "p", "q", "r", "0", "1", "7", "2.5", "true", "false", "'x'", "'y'")
+_unary = ("-", "!", "+")
+_binary = ("+", "-", "*", "/", "<", "<=", ">", ">=", "==", "!=", "&&", "||")
+
+
+def expression(rng, depth=0):
+    r = rng.random()
+    if depth > 3 or r < 0.3:
+        return rng.choice(_leaves)
+    if r < 0.4:
+        return rng.choice(_unary) + " " + expression(rng, depth + 1)
+    return "(%s %s %s)" % (expression(rng, depth + 1), rng.choice(_binary), expression(rng, depth + 1))
+
+
+def statements(rng, depth=0, loop=False):
+    lines = []
+    for _ in range(rng.randint(0, 4)):
+        r = rng.random()
+        if r < 0.2:
+            lines.append("%s = %s;" % (rng.choice("abc"), expression(rng)))
+        elif r < 0.4:
+            lines.append("print %s;" % expression(rng))
+        elif r < 0.5 and depth < 3:
+            lines.append("if %s { %s } else { %s }" % (
+                expression(rng), statements(rng, depth + 1, loop), statements(rng, depth + 1, loop)))
+        elif r < 0.57 and depth < 3:
+            lines.append("if %s { %s }" % (expression(rng), statements(rng, depth + 1, loop)))
+        elif r < 0.65 and depth < 3:
+            lines.append("var int k = 0; while k < 4 { k = k + 1; %s }" % statements(rng, depth + 1, True))
+        elif r < 0.7 and loop:
+            lines.append(rng.choice(("break;", "continue;")))
+        elif r < 0.75:
+            lines.append("var %s = %s;" % (rng.choice("abcz"), expression(rng)))
+        elif r < 0.85:
+            lines.append("let %s%s = %s;" % (rng.choice(("", "int ", "bool ")), rng.choice("qr"), expression(rng)))
+        else:
+            lines.append("%s;" % expression(rng))
+    return "\n".join(lines)
+
+
+def program(rng):
+    return PRELUDE + statements(rng)
+
+
+def parse(cells, text):
+    """The Program of text, without the statements that have syntax
+    errors (the generator makes a few), or None when the parser cannot
+    recover from one."""
+    return cells.UCyanParser(backend="dfa", diagnostics=cells.Diagnostics()).parse(text)
+
+
+def output(cells, execute):
+    """Output of execute(out), then "ERR <message>" if it failed."""
+    out = io.StringIO()
+    try:
+        execute(out)
+    except cells.UCyanRuntimeError as e:
+        return out.getvalue() + "ERR " + str(e)
+    return out.getvalue()
@@ -0,0 +1,56 @@
+"""Tests of the compact token mode of UCyanLexer."""
+import io
+import random
+import sys
+
+import pytest
+
+from celulas import load
+from programas import program
+
+cells = load()
+
+TEXT = "var x = 1;\n/* a\nb */ print x + 2.5;\nif x < 3 { print 'a'; }\n"
+
+
+def tokens(stream):
+    return [(t.type, t.value, t.lineno, t.index, t.end) for t in stream]
+
+
+@pytest.mark.parametrize("backend", ["sly", "dfa"])
+def test_same_tokens(backend):
+    lexer = cells.UCyanLexer(print, backend)
+    rng = random.Random(0)
+    for text in [TEXT, ""] + [program(rng) for _ in range(50)]:
+        compact = lexer.tokenize_compact(text, 3)
+        expected = tokens(lexer.tokenize(text, 3))
+        assert tokens(compact) == expected
+        assert len(compact) == len(expected)
+        assert [(compact.type(i), compact.value(i)) for i in range(len(compact))] == [t[:2] for t in expected]
+
+
+def test_sizes():
+    compact = cells.UCyanLexer(print, "dfa").tokenize_compact(TEXT)
+    assert (compact.types.itemsize, compact.starts.itemsize, compact.lengths.itemsize) == (1, 8, 4)
+
+
+def test_parse_compact():
+    parser = cells.UCyanParser(backend="dfa")
+    shown = []
+    for program in (parser.parse(TEXT), parser.parse_compact(parser.lexer.tokenize_compact(TEXT))):
+        out = io.StringIO()
+        program.show(buf=out, attrnames=True, showcoord=True)
+        shown.append(out.getvalue())
+    assert shown[0] == shown[1]
+
+
+def test_identifiers_are_interned():
+    text = "var " + "".join(["lo", "ng_name"]) + " = 1; print long_name + long_name;"
+    compact = cells.UCyanLexer(print, "dfa").tokenize_compact(text)
+    names = [t.value for t in compact if t.type == "ID"]
+    assert len(names) == 3
+    assert all(name is sys.intern("long_name") for name in names)
+    parser = cells.UCyanParser(backend="dfa")
+    program = parser.parse_compact(parser.lexer.tokenize_compact(text))
+    definition, statement = program.statements
+    assert statement.expression.left.name is definition.name
@@ -0,0 +1,82 @@
+"""Tests of the SemanticAnalyzer."""
+import io
+
+from celulas import load
+
+cells = load()
+
+
+def errors(program):
+    analyzer = cells.SemanticAnalyzer()
+    ok = analyzer.analyze(program)
+    return ok, [(d.kind, d.message) for d in analyzer.diagnostics]
+
+
+def print_literal(type, value):
+    return cells.Program([cells.PrintStatement(cells.BinaryOp(
+        "+", cells.Literal(type, value), cells.Literal(type, value)))])
+
+
+def test_text_literals():
+    assert errors(print_literal("int", "12")) == (True, [])
+    assert errors(print_literal("float", "1.5")) == (True, [])
+    # Reported once each, without a cascade to the +
+    assert errors(print_literal("int", "1.5")) == (False, [
+        ("semantic", "Invalid int literal 1.5")] * 2)
+    assert errors(print_literal("float", "1x5")) == (False, [
+        ("semantic", "Invalid float literal 1x5")] * 2)
+
+
+def test_parsed_literals():
+    program = cells.UCyanParser(backend="dfa").parse("var x = 1; var y = 2.5; print x + 1;")
+    assert errors(program) == (True, [])
+
+
+def check(text):
+    """(ok, [(line, message)]) of the analysis of text."""
+    program = cells.UCyanParser(backend="dfa").parse(text)
+    analyzer = cells.SemanticAnalyzer()
+    ok = analyzer.analyze(program)
+    return ok, [(d.line, d.message) for d in analyzer.diagnostics]
+
+
+def run(text):
+    out = io.StringIO()
+    cells.Interpreter(out).run(cells.UCyanParser(backend="dfa").parse(text))
+    return out.getvalue()
+
+
+def test_untyped_vars_take_any_type():
+    text = "var b = 4; b = 2.5; print b; b = true; print !b;"
+    assert check(text) == (True, [])
+    assert run(text) == "2.5\nfalse\n"
+    # Typed vars and untyped lets keep their type
+    assert check("var int b = 4;\nb = 2.5;") == (False, [(2, "Cannot store a float in a int")])
+    assert check("let b = 4;\nprint b + true;") == (False, [(2, "Bad operand types for +: int and bool")])
+
+
+def test_names():
+    assert check("print x;\nx = 1;") == (False, [(1, "'x' is not defined"), (2, "'x' is not defined")])
+    assert check("var x = 1;\nvar x = 2;") == (False, [(2, "'x' is already defined")])
+    assert check("let x = 1;\nx = 2;") == (False, [(2, "Cannot assign to the constant 'x'")])
+    # Inner blocks may shadow a name, which is visible again after them
+    assert check("var int x = 1; if true { var bool x = true; print !x; }\nprint x + 1;") == (True, [])
+    assert check("if true { var x = 1; }\nprint x;") == (False, [(2, "'x' is not defined")])
+
+
+def test_loops():
+    assert check("break;\nwhile true { if true { continue; } break; }\ncontinue;") == (
+        False, [(1, "break outside a loop"), (3, "continue outside a loop")])
+
+
+def test_binds():
+    program = cells.UCyanParser(backend="dfa").parse(
+        "var int x = 1; if true { var x = 2.5; print x; } print x;")
+    assert cells.SemanticAnalyzer().analyze(program)
+    outer, if_statement, print_outer = program.statements
+    inner, print_inner = if_statement.consequence
+    assert print_outer.expression.bind is outer.bind
+    assert print_inner.expression.bind is inner.bind
+    assert (outer.bind.type, outer.bind.hint, outer.bind.depth) == ("int", None, 1)
+    assert (inner.bind.type, inner.bind.hint, inner.bind.depth) == (None, "float", 2)
+    assert inner.bind.slot == outer.bind.slot + 1
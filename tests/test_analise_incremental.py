@@ -0,0 +1,47 @@
+"""Differential tests of IncrementalParser.edit against a full parse."""
+import contextlib
+import io
+import random
+
+import pytest
+
+from celulas import load
+
+cells = load()
+
+CHUNKS = ("var int x = 1;", "x = x + 2;", "print x;", "if x < 3 { print 'a'; } else { x = 4; }",
+          "// note\n", "/* block\n c */", "while x { break; }", "let y = 2.5;", "\n", "  ", "x;",
+          "var z = true;")
+SNIPPETS = ("x", "1", " ", "\n", "print 3;", "var q = 1;", "+ 1", "\n\n", "y = 7;\n", "/* c */",
+            "// d\n", "}", "{", "/*", "'")
+
+
+def show(program):
+    if program is None:
+        return None
+    out = io.StringIO()
+    program.show(buf=out, attrnames=True, nodenames=True, showcoord=True)
+    return out.getvalue()
+
+
+@pytest.mark.parametrize("seed", range(2))
+@pytest.mark.parametrize("backend", ["sly", "dfa"])
+def test_random_edits(seed, backend):
+    rng = random.Random(seed)
+    incremental = cells.IncrementalParser(cells.UCyanParser(backend=backend))
+    full = cells.UCyanParser(backend=backend)
+    with contextlib.redirect_stdout(io.StringIO()):
+        program = incremental.parse("\n".join(rng.choice(CHUNKS) for _ in range(40)))
+        for _ in range(150):
+            old_text = incremental.text
+            old_program, old_shown = program, show(program)
+            start = rng.randrange(len(old_text) + 1)
+            end = min(len(old_text), start + rng.choice((0, 0, 0, 1, 2, 5)))
+            program = incremental.edit(program, start, end, rng.choice(SNIPPETS) if rng.random() < 0.7 else "")
+            if incremental.starts is None:
+                # Undo the edit that broke the text, as a user fixing a typo
+                program = incremental.parse(old_text)
+            assert show(program) == show(full.parse(incremental.text))
+            # The previous tree is left as it was
+            assert show(old_program) == old_shown
+    assert incremental.incremental_parses > 50
@@ -0,0 +1,62 @@
+"""Tests of parse_files against parsing the files one by one."""
+import io
+import multiprocessing
+import os
+import random
+
+import pytest
+
+from celulas import load
+from programas import program
+
+cells = load()
+
+
+def show(node):
+    out = io.StringIO()
+    node.show(buf=out, attrnames=True, nodenames=True, showcoord=True)
+    return out.getvalue()
+
+
+@pytest.fixture
+def sources(tmp_path):
+    rng = random.Random(0)
+    for i in range(30):
+        directory = tmp_path / ("sub%d" % (i % 3)) if i % 2 else tmp_path
+        directory.mkdir(exist_ok=True)
+        (directory / ("f%02d.ucyan" % i)).write_text(program(rng), encoding="utf-8")
+    (tmp_path / "broken.ucyan").write_text("print +;" * 10 + "print 1", encoding="utf-8")
+    (tmp_path / "notes.txt").write_text("not a source", encoding="utf-8")
+    return str(tmp_path)
+
+
+def serial(path):
+    diagnostics = cells.Diagnostics(5)
+    with open(path, encoding="utf-8") as f:
+        program = cells.UCyanParser(backend="dfa", diagnostics=diagnostics).parse(f.read())
+    return (path, None if program is None else show(program), list(diagnostics))
+
+
+def results(sources, **options):
+    return [(r.path, None if r.program is None else show(r.program), r.diagnostics)
+            for r in cells.parse_files(sources, backend="dfa", max_errors=5, chunksize=4, **options)]
+
+
+def test_same_as_serial(sources):
+    paths = cells.source_files(sources)
+    assert len(paths) == 31 and not any(path.endswith(".txt") for path in paths)
+    expected = [serial(path) for path in paths]
+    assert any(program is None for path, program, diagnostics in expected)
+    assert results(sources, workers=1) == expected
+    assert results(sources, workers=3) == expected
+    data = cells.parse_files(paths, workers=2, serialized=True, backend="dfa", max_errors=5)
+    assert [r.program and show(cells.BinaryAST.loads(r.program)) for r in data] == [e[1] for e in expected]
+
+
+def test_spawn_as_default_start_method(sources):
+    method = multiprocessing.get_start_method()
+    multiprocessing.set_start_method("spawn", force=True)
+    try:
+        assert results(sources, workers=2) == [serial(path) for path in cells.source_files(sources)]
+    finally:
+        multiprocessing.set_start_method(method, force=True)
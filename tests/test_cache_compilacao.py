@@ -0,0 +1,93 @@
+"""Tests of the CompilationCache keys and directory checks."""
+import os
+
+import pytest
+
+from celulas import load
+
+cells = load()
+
+TEXT = "var x = 1; print x + 2;"
+
+
+def test_builders_have_their_own_entries(tmp_path):
+    cache = cells.CompilationCache(str(tmp_path))
+    nodes = cells.UCyanParser(backend="dfa")
+    flat = cells.UCyanParser(backend="dfa", builder=cells.FlatBuilder())
+    assert type(cache.parse(flat, TEXT)) is cells.FlatAST
+    assert isinstance(cache.parse(nodes, TEXT), cells.Program)
+    assert isinstance(cache.parse(nodes, TEXT), cells.Program)
+    assert type(cache.parse(flat, TEXT)) is cells.FlatAST
+    assert (cache.hits, cache.misses) == (2, 2)
+
+
+def test_values_the_serializer_cannot_write(tmp_path):
+    cache = cells.CompilationCache(str(tmp_path), serializer=cells.BinaryAST)
+    flat = cells.UCyanParser(backend="dfa", builder=cells.FlatBuilder())
+    for _ in range(2):
+        assert type(cache.parse(flat, TEXT)) is cells.FlatAST
+    assert (cache.hits, cache.misses) == (0, 2)
+
+
+def test_pickle_needs_a_private_directory(tmp_path):
+    directory = tmp_path / "new"
+    cells.CompilationCache(str(directory))
+    assert os.stat(directory).st_mode & 0o777 == 0o700
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    os.chmod(shared, 0o777)
+    with pytest.raises(PermissionError):
+        cells.CompilationCache(str(shared))
+    cache = cells.CompilationCache(str(shared), serializer=cells.BinaryAST)
+    cache.parse(cells.UCyanParser(backend="dfa"), TEXT)
+    assert isinstance(cache.parse(cells.UCyanParser(backend="dfa"), TEXT), cells.Program)
+    assert cache.hits == 1
+
+
+def test_lr_tables_key_has_the_sly_version(monkeypatch):
+    import sly
+    grammar = cells.UCyanParser._grammar
+    key = cells.CachedLRTables.grammar_key(grammar)
+    monkeypatch.setattr(sly, "__version__", sly.__version__ + ".1")
+    assert cells.CachedLRTables.grammar_key(grammar) != key
+
+
+def test_lr_tables_load_from_the_cache(tmp_path, monkeypatch):
+    parser_class = cells.UCyanParser
+    built = parser_class._lrtable
+    key = cells.CachedLRTables.grammar_key(parser_class._grammar)
+    path = tmp_path / ("ucyan_parsetab_%s.bin" % key[:16])
+    cells.CachedLRTables.save(str(path), key, built)
+    monkeypatch.setattr(parser_class, "tables_cache", str(tmp_path))
+    monkeypatch.setattr(parser_class, "_lrtable", built)
+    parser_class._Parser__build_lrtables()
+    cached = parser_class._lrtable
+    assert type(cached) is cells.CachedLRTables
+    assert cached.lr_action == built.lr_action
+    assert cached.lr_goto == built.lr_goto
+    program = cells.UCyanParser(backend="dfa").parse(TEXT)
+    assert [type(s).__name__ for s in program.statements] == ["VarDefinition", "PrintStatement"]
+
+
+def test_values_pickle_cannot_write(tmp_path):
+    cache = cells.CompilationCache(str(tmp_path))
+
+    class Local:
+        pass
+
+    for value in (lambda: 0, Local()):
+        assert cache.build(TEXT, "thunk", lambda: value) is value
+    assert cache.misses == 2
+    assert os.listdir(tmp_path) == []
+
+
+def test_hits_clear_the_diagnostics(tmp_path):
+    cache = cells.CompilationCache(str(tmp_path))
+    diagnostics = cells.Diagnostics()
+    parser = cells.UCyanParser(backend="dfa", diagnostics=diagnostics)
+    cache.parse(parser, TEXT)
+    cache.parse(parser, "print ;")
+    assert diagnostics.records
+    assert isinstance(cache.parse(parser, TEXT), cells.Program)
+    assert cache.hits == 1
+    assert diagnostics.records == []
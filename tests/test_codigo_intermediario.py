@@ -0,0 +1,64 @@
+"""Differential tests of the three-address code against the Interpreter."""
+import io
+import random
+
+import pytest
+
+from celulas import load
+from programas import output, parse, program
+
+cells = load()
+
+
+def run_both(tree):
+    interpreted = output(cells, lambda out: cells.Interpreter(out).run(tree))
+    lowered = output(cells, lambda out: cells.IRInterpreter(out).run(
+        cells.IRGenerator().generate(tree)))
+    return interpreted, lowered
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_random_programs(seed):
+    rng = random.Random(seed)
+    for _ in range(300):
+        text = program(rng)
+        tree = parse(cells, text)
+        if tree is None:
+            continue
+        interpreted, lowered = run_both(tree)
+        assert lowered == interpreted, text
+
+
+@pytest.mark.parametrize("text", [
+    "print 1 && true;",
+    "print true && 1;",
+    "print 1 || (1 / 0 == 1);",
+    "print false || 'x';",
+    "var c = 2; print c && c;",
+    "if 1 { print 1; }",
+    "var x = 1; while x { x = 0; }",
+    "var int i = 0; while i < 3 { i = i + 1; if i == 2 { continue; } print i; }",
+    "var bool b = 1 < 2 && 'a' < 'b'; print b || !b;",
+    "var x = 1; print " + " + ".join(["x"] * 5000) + ";",
+    "print " + "(false || " * 3000 + "true" + ")" * 3000 + ";",
+    "print " + "-" * 3000 + "1;",
+])
+def test_programs(text):
+    interpreted, lowered = run_both(parse(cells, text))
+    assert lowered == interpreted
+
+
+def test_logical_operands_are_checked():
+    ir = cells.IRGenerator().generate(parse(cells, "print 1 && true;"))
+    out = io.StringIO()
+    ir.dump(out)
+    assert out.getvalue() == "    %0 = 1\n    if %0 is false goto L0\n    %0 = %0 && true\nL0:\n    print %0\n"
+
+
+def test_checked_and_unchecked_jumps_dump_differently():
+    ir = cells.IRGenerator().generate(parse(cells, "var bool b = true; if b || b { print 1; }"))
+    out = io.StringIO()
+    ir.dump(out)
+    lines = out.getvalue().split("\n")
+    assert "    if %0 is true goto L0" in lines
+    assert "    ifnot %0 goto L1" in lines
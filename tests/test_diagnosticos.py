@@ -0,0 +1,54 @@
+"""Tests of syntax error recovery and of the Diagnostics collector."""
+import io
+
+from celulas import load
+
+cells = load()
+
+
+def parse(text, max_errors=100):
+    diagnostics = cells.Diagnostics(max_errors)
+    program = cells.UCyanParser(backend="dfa", diagnostics=diagnostics).parse(text)
+    return program, diagnostics
+
+
+def kinds(statements):
+    return [statement.__class__.__name__ for statement in statements]
+
+
+def test_statements_with_errors_are_left_out():
+    program, diagnostics = parse(
+        "print 1;\nprint + ;\nvar x = 2;\nif x < 3 { print 1; x = = 2 }\nprint x @ 1;\nprint x;")
+    assert list(diagnostics) == [
+        cells.Diagnostic("syntax", "Unexpected symbol ;", 2, 9),
+        cells.Diagnostic("syntax", "Unexpected symbol =", 4, 25),
+        cells.Diagnostic("lexical", "Illegal character '@'", 5, 9),
+        cells.Diagnostic("syntax", "Unexpected symbol 1", 5, 11),
+    ]
+    assert (diagnostics.count("syntax"), diagnostics.count("lexical")) == (3, 1)
+    assert kinds(program.statements) == ["PrintStatement", "VarDefinition", "IfStatement", "PrintStatement"]
+    # The block is closed at its "}", keeping the statements before the error
+    assert kinds(program.statements[2].consequence) == ["PrintStatement"]
+
+
+def test_too_many_errors():
+    program, diagnostics = parse("print +;" * 5, max_errors=2)
+    assert program is None
+    assert diagnostics.aborted and len(diagnostics) == 2
+    out = io.StringIO()
+    diagnostics.write(out)
+    assert out.getvalue() == ("Syntax error: Unexpected symbol ; at 1:8\n"
+                              "Syntax error: Unexpected symbol ; at 1:16\n"
+                              "Too many errors, giving up\n")
+
+
+def test_each_parse_starts_clean():
+    diagnostics = cells.Diagnostics(max_errors=2)
+    parser = cells.UCyanParser(backend="dfa", diagnostics=diagnostics)
+    assert parser.parse("print +;" * 5) is None
+    assert kinds(parser.parse("print 1;").statements) == ["PrintStatement"]
+    assert list(diagnostics) == [] and not diagnostics.aborted
+    # An error at the end of the input cannot be recovered from
+    assert parser.parse("print 1") is None
+    assert list(diagnostics) == [cells.Diagnostic("syntax", "Unexpected end of input")]
+    assert str(diagnostics.records[0]) == "Syntax error: Unexpected end of input"
@@ -0,0 +1,142 @@
+"""Tests of the dataflow analyses and of the IROptimizer."""
+import random
+
+import pytest
+
+from celulas import load
+from programas import output, parse, program
+
+cells = load()
+
+
+def random_code(seed, count):
+    """ThreeAddressCode of count random programs that compile."""
+    rng = random.Random(seed)
+    for _ in range(count):
+        tree = parse(cells, program(rng))
+        if tree is None:
+            continue
+        try:
+            ir = cells.IRGenerator().generate(tree)
+        except cells.UCyanRuntimeError:
+            continue
+        yield tree, ir
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_optimized_code_runs_as_the_program(seed):
+    for tree, ir in random_code(seed, 300):
+        expected = output(cells, lambda out: cells.Interpreter(out).run(tree))
+        cells.IROptimizer().optimize(ir)
+        assert output(cells, lambda out: cells.IRInterpreter(out).run(ir)) == expected
+
+
+def instruction_analyses(ir):
+    """Live variables before and definitions reaching each instruction,
+    solved instruction by instruction."""
+    code = ir.code
+    size = len(code)
+    labels = {target: i for i, (opcode, target, a, b) in enumerate(code) if opcode == cells.IR_LABEL}
+    successors = []
+    for i, (opcode, target, a, b) in enumerate(code):
+        if opcode == cells.IR_JUMP:
+            successors.append([labels[target]])
+        elif opcode >= cells.IR_JUMP_IF_FALSE:
+            successors.append(sorted({i + 1, labels[target]} - {size}))
+        else:
+            successors.append([i + 1] if i + 1 < size else [])
+    reads = cells._ir_reads
+    live = [set() for _ in range(size)]
+    changed = True
+    while changed:
+        changed = False
+        for i in range(size - 1, -1, -1):
+            opcode, target, a, b = code[i]
+            value = set().union(*(live[j] for j in successors[i]))
+            if opcode <= cells.IR_NOT:
+                value.discard(target)
+            if reads[opcode] and a >= 0:
+                value.add(a)
+            if reads[opcode] == 2 and b >= 0:
+                value.add(b)
+            if value != live[i]:
+                live[i] = value
+                changed = True
+    reached = {0} if size else set()
+    stack = list(reached)
+    while stack:
+        for j in successors[stack.pop()]:
+            if j not in reached:
+                reached.add(j)
+                stack.append(j)
+    predecessors = [[] for _ in range(size)]
+    for i in reached:
+        for j in successors[i]:
+            predecessors[j].append(i)
+    reaching = [set() for _ in range(size)]
+    leaving = [set() for _ in range(size)]
+    changed = True
+    while changed:
+        changed = False
+        for i in range(size):
+            value = set().union(*(leaving[j] for j in predecessors[i]))
+            out = value
+            if code[i][0] <= cells.IR_NOT:
+                out = {d for d in value if code[d][1] != code[i][1]} | {i}
+            if value != reaching[i] or out != leaving[i]:
+                reaching[i], leaving[i] = value, out
+                changed = True
+    return live, reaching
+
+
+@pytest.mark.parametrize("seed", range(2))
+def test_analyses_match_instruction_level(seed):
+    for tree, ir in random_code(seed, 150):
+        cfg = cells.ControlFlowGraph(ir)
+        liveness = cells.Liveness(cfg).solve()
+        definitions = cells.ReachingDefinitions(cfg).solve()
+        live_definitions = cells.ReachingDefinitions(cfg, liveness).solve()
+        live, reaching = instruction_analyses(ir)
+        variables = cfg.shared_variables()[0]
+        for block in cfg.reverse_postorder():
+            start = cfg.starts[block]
+            assert liveness.live_variables(liveness.ins[block]) == live[start]
+            # Consecutive labels share a block: compare after them
+            while start < cfg.ends[block] - 1 and ir.code[start][0] == cells.IR_LABEL:
+                start += 1
+            for variable in variables:
+                expected = {d for d in reaching[start] if ir.code[d][1] == variable}
+                assert definitions.reaching(block, variable) == expected
+                if variable in live[cfg.starts[block]]:
+                    assert live_definitions.reaching(block, variable) == expected
+
+
+def loop_of_blocks(count):
+    """The code of a loop of about 3 * count blocks."""
+    body = "if x < 5 { x = x + 1; } else { y = y + 2; }\nif y > 3 { var int z = x * 2; print z; }\n"
+    text = "var int x = 0; var int y = 1;\nwhile x < 100 {\n" + body * (count // 3) + "}\nprint y;\n"
+    return cells.IRGenerator().generate(parse(cells, text))
+
+
+def test_reaching_definitions_are_linear():
+    ir = loop_of_blocks(3000)
+    cfg = cells.ControlFlowGraph(ir)
+    definitions = cells.ReachingDefinitions(cfg).solve()
+    # Every definition of x in the loop reaches its start, through merges
+    x = ir.code[0][1]
+    head = cfg.label_blocks[ir.code[2][1]]
+    assert len(definitions.reaching(head, x)) == 1001
+    assert len(definitions.merges) < 4 * len(cfg)
+    assert all(len(values) <= 2 for values in definitions.ins if values is not None)
+
+
+def test_liveness_is_linear_in_the_variables():
+    # One variable per pair of blocks, each live only in its own
+    count = 5000
+    text = "".join("var int x%d = %d; if x%d > 0 { print x%d; }\n" % (i, i, i, i) for i in range(count))
+    ir = cells.IRGenerator().generate(parse(cells, text))
+    cfg = cells.ControlFlowGraph(ir)
+    assert len(cfg.shared_variables()[0]) >= count
+    liveness = cells.Liveness(cfg).solve()
+    assert sum(len(value) for value in liveness.ins + liveness.outs) <= 2 * len(cfg)
+    assert max(len(value) for value in liveness.ins + liveness.outs) == 1
@@ -0,0 +1,66 @@
+"""Tests of the Interpreter on deeply nested programs."""
+import io
+import random
+
+import pytest
+
+from celulas import load
+
+cells = load()
+
+
+def run(text, interpreter=None):
+    """Output of the program in text, then "ERR <message>" if it failed."""
+    out = io.StringIO()
+    program = cells.UCyanParser(backend="dfa").parse(text)
+    try:
+        (interpreter or cells.Interpreter)(out).run(program)
+    except cells.UCyanRuntimeError as e:
+        return out.getvalue() + "ERR " + str(e)
+    return out.getvalue()
+
+
+@pytest.mark.parametrize("terms", [600, 5000])
+def test_deep_expressions(terms):
+    assert run("var x = 1; print " + " + ".join(["x"] * terms) + ";") == "%d\n" % terms
+    assert run("var x = 1; print " + "(x - " * terms + "x" + ")" * terms + ";") == "%d\n" % ((terms + 1) % 2)
+    assert run("print " + "!" * terms + "true;") == "%s\n" % ("false" if terms % 2 else "true")
+    assert run("print " + " && ".join(["true"] * terms) + " || 1;") == "true\n"
+    assert run("print " + "(false && " * terms + "1" + ")" * terms + ";") == "false\n"
+
+
+def test_deep_expression_errors():
+    assert run("var x = 1; print " + " + ".join(["x"] * 1000) + " + true;") == (
+        "ERR Bad operand types for +: int and bool at 1:18")
+    assert run("print " + " || ".join(["false"] * 1000) + " || 1;") == (
+        "ERR Bad operand types for ||: bool and int at 1:7")
+
+
+def test_deep_blocks_are_reported():
+    text = "var x = 1;" + " if x == 1 {" * 2000 + " print x;" + " }" * 2000
+    assert run(text) == "ERR Program is nested too deeply"
+
+
+class FlatInterpreter(cells.Interpreter):
+    """Compiles every expression with _flat_expression."""
+    max_nesting = 1
+
+
+def random_expression(rng, depth=0):
+    if depth > 4 or rng.random() < 0.3:
+        return rng.choice(["a", "b", "c", "0", "7", "2.5", "true", "false", "'x'"])
+    if rng.random() < 0.15:
+        return rng.choice(["-", "!", "+"]) + " " + random_expression(rng, depth + 1)
+    return "(%s %s %s)" % (
+        random_expression(rng, depth + 1),
+        rng.choice(["+", "-", "*", "/", "<", "<=", "==", "!=", "&&", "||"]),
+        random_expression(rng, depth + 1))
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_flat_expressions_match_closures(seed):
+    rng = random.Random(seed)
+    for _ in range(500):
+        text = "var int a = 3; var b = 4; var c = true; print %s; print %s;" % (
+            random_expression(rng), random_expression(rng))
+        assert run(text, FlatInterpreter) == run(text), text
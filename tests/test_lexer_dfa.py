@@ -0,0 +1,106 @@
+"""Differential tests of the DFA lexer backend against SLY's."""
+import io
+import random
+
+import pytest
+
+from celulas import load
+
+cells = load()
+
+# Pieces of the random sources: every token, keyword and lexical error
+PIECES = (
+    "x", "abc", "_a1", "print", "if", "else", "var", "while", "true",
+    "false", "let", "break", "continue", "printx", "0", "7", "100",
+    "12345", "1.5", "3.25", "1.", ".5", "1.2.3", "1+2", "'a'", "'\\n'",
+    "'a' + 'b'", "'", "==", "=", "!=", "!", ">=", ">", "<=", "<", "||",
+    "|", "&&", "&", ";", "{", "}", "(", ")", "*", "+", "-", "/", "//x\n",
+    "/* c */", "/* a\nb */", "/* open", "@", "$", "#", "?", " ", "  ",
+    "\t", "\n", "\n\n",
+)
+
+
+def random_source(rng, size):
+    return "".join(rng.choice(PIECES) for _ in range(size))
+
+
+def lex(text, backend):
+    """The tokens of text and the errors reported while lexing it."""
+    errors = []
+    lexer = cells.UCyanLexer(lambda *error: errors.append(error), backend)
+    tokens = [(t.type, t.value, t.lineno, t.index, t.end, repr(t))
+              for t in lexer.tokenize(text)]
+    return tokens, errors
+
+
+def lex_stream(text, backend, chunk_size):
+    errors = []
+    lexer = cells.UCyanLexer(lambda *error: errors.append(error), backend)
+    source = io.BytesIO(text.encode("utf-8"))
+    tokens = [(t.type, t.value, t.lineno, t.index, t.end)
+              for t in lexer.tokenize_stream(source, chunk_size=chunk_size)]
+    return tokens, errors
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_random_sources(seed):
+    rng = random.Random(seed)
+    for _ in range(200):
+        text = random_source(rng, rng.randint(0, 40))
+        assert lex(text, "dfa") == lex(text, "sly"), text
+
+
+@pytest.mark.parametrize("text", [
+    "print 100;", "var int n = 100;", "print 7/2;", "print 1+2;",
+    "print 1.5;", "print 1.;", "x = 1.2.3;", "/* never closed\nx",
+    "'a' 'b'\n'c", "a\n\n  @b", "",
+])
+def test_edge_cases(text):
+    assert lex(text, "dfa") == lex(text, "sly")
+
+
+def test_integers_are_not_floats():
+    tokens, errors = lex("100 7/2 1+2 3.5", "dfa")
+    assert [(t[0], t[1]) for t in tokens] == [
+        ("INT_CONST", "100"),
+        ("INT_CONST", "7"), ("DIVIDE", "/"), ("INT_CONST", "2"),
+        ("INT_CONST", "1"), ("PLUS", "+"), ("INT_CONST", "2"),
+        ("FLOAT_CONST", "3.5"),
+    ]
+    assert errors == []
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 1 << 20])
+def test_streamed_input(chunk_size):
+    rng = random.Random(chunk_size)
+    text = random_source(rng, 5000)
+    expected = lex_stream(text, "sly", chunk_size)
+    assert lex_stream(text, "dfa", chunk_size) == expected
+    # Streaming gives the same tokens as lexing the whole text
+    tokens, errors = lex(text, "sly")
+    assert expected == ([t[:5] for t in tokens], errors)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_same_ast(seed):
+    rng = random.Random(seed)
+    program = "".join(
+        rng.choice(("var x = 1;", "print x + 2 * 3;", "x = x / 2.5;",
+                    "if x < 10 { print 'a'; } else { x = 0; }",
+                    "while x > 0 { x = x - 1; }", "print !true || false;\n"))
+        for _ in range(200))
+    trees = []
+    for backend in ("sly", "dfa"):
+        out = io.StringIO()
+        cells.UCyanParser(backend=backend).parse(program).show(buf=out, showcoord=True)
+        trees.append(out.getvalue())
+    assert trees[0] == trees[1]
+
+
+def test_constants_are_kept_per_parse():
+    parser = cells.UCyanParser(backend="dfa")
+    for n in range(100):
+        program = parser.parse("print %d + 2.5 + %d;" % (n, n))
+    assert sorted(parser.constants) == ["2.5", "99"]
+    left = program.statements[0].expression.left
+    assert left.left.value == 99 and left.right.value == 2.5
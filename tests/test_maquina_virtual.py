@@ -0,0 +1,40 @@
+"""Differential tests of the VirtualMachine against the Interpreter."""
+import random
+
+import pytest
+
+from celulas import load
+from programas import output, parse, program
+
+cells = load()
+
+
+def run_both(text):
+    tree = parse(cells, text)
+    interpreted = output(cells, lambda out: cells.Interpreter(out).run(tree))
+    compiled = output(cells, lambda out: cells.VirtualMachine(out).run(
+        cells.BytecodeCompiler().compile(tree)))
+    return interpreted, compiled
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_random_programs(seed):
+    rng = random.Random(seed)
+    for _ in range(300):
+        text = program(rng)
+        if parse(cells, text) is None:
+            continue
+        interpreted, compiled = run_both(text)
+        assert compiled == interpreted, text
+
+
+@pytest.mark.parametrize("text", [
+    "var x = 1; print " + " + ".join(["x"] * 5000) + ";",
+    "var x = 1; print " + "(x - " * 5000 + "x" + ")" * 5000 + ";",
+    "print " + "(false || " * 3000 + "true" + ")" * 3000 + ";",
+    "print " + "-" * 3000 + "1;",
+    "var x = 1; print " + " + ".join(["x"] * 1000) + " + true;",
+])
+def test_deep_expressions(text):
+    interpreted, compiled = run_both(text)
+    assert compiled == interpreted
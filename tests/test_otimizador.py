@@ -0,0 +1,41 @@
+"""Tests of the Optimizer: optimized programs behave as the originals."""
+import random
+
+import pytest
+
+from celulas import load
+from programas import output, parse, program
+
+cells = load()
+
+
+def interpret(tree):
+    return output(cells, lambda out: cells.Interpreter(out).run(tree))
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_random_programs(seed):
+    rng = random.Random(seed)
+    for _ in range(300):
+        text = program(rng)
+        original = parse(cells, text)
+        if original is None:
+            continue
+        try:
+            cells.Interpreter().compile(original)
+        except cells.UCyanRuntimeError:
+            continue
+        optimized = cells.Optimizer().optimize(parse(cells, text))
+        assert interpret(optimized) == interpret(original), text
+
+
+def test_deep_expressions():
+    optimizer = cells.Optimizer()
+    tree = optimizer.optimize(parse(cells, "print " + " + ".join(["1"] * 5000) + ";"))
+    assert optimizer.folded == 4999
+    assert interpret(tree) == "5000\n"
+    text = "var int x = 1; print " + "(x * " * 5000 + "1" + ")" * 5000 + " + 0;"
+    optimizer = cells.Optimizer()
+    tree = optimizer.optimize(parse(cells, text))
+    assert optimizer.folded == 2
+    assert interpret(tree) == "1\n"
@@ -0,0 +1,84 @@
+"""Tests of the BinaryAST format."""
+import io
+import random
+
+import pytest
+
+from celulas import load
+from programas import parse, program
+
+cells = load()
+
+# Every node kind, and int, float, bool and str values of every size
+EVERY_KIND = """
+var int a = 0; var b = -7; var int c; let float d = 2.5; let e = true;
+var f = false; var g = 'x'; var h = 12345678901234567890; var i = 123456.789;
+a = -a + +b * 3 / 1 - 2;
+if a < b && !e || b >= 2 { print a; } else { print 'y'; }
+if f { a; }
+while a != 100 { a = a + 1; if a == 5 { continue; } if a > 50 { break; } }
+var %s = 1;
+""" % ("long_" * 40)
+
+
+def show(node):
+    out = io.StringIO()
+    node.show(buf=out, attrnames=True, nodenames=True, showcoord=True)
+    return out.getvalue()
+
+
+def test_every_kind():
+    diagnostics = cells.Diagnostics()
+    tree = cells.UCyanParser(backend="dfa", diagnostics=diagnostics).parse(EVERY_KIND)
+    assert not len(diagnostics)
+    kinds = set()
+    cells.walk(tree, lambda node, name, depth: kinds.add(node.__class__))
+    assert kinds == set(cells.NODE_CLASSES)
+    back = cells.BinaryAST.loads(cells.BinaryAST.dumps(tree))
+    assert show(back) == show(tree)
+    values = {}
+    for node in (tree, back):
+        literals = []
+        cells.walk(node, lambda n, name, depth: literals.append(n.value) if n.__class__ is cells.Literal else None)
+        values[node] = literals
+    # The values keep their types: 1 stays an int, 1.0 a float and true a bool
+    assert [(type(v), v) for v in values[tree]] == [(type(v), v) for v in values[back]]
+    assert {type(v) for v in values[back]} == {int, float, bool, str}
+
+
+def test_nodes_built_by_hand():
+    literal = cells.Literal("float", -0.0)
+    tree = cells.Program([cells.PrintStatement(cells.BinaryOp("+", literal, cells.Literal("int", -1)))])
+    back = cells.BinaryAST.loads(cells.BinaryAST.dumps(tree))
+    assert repr(back) == repr(tree)
+    value = back.statements[0].expression.left.value
+    assert str(value) == "-0.0" and back.statements[0].coord is None
+
+
+@pytest.mark.parametrize("seed", range(2))
+def test_random_programs(seed):
+    rng = random.Random(seed)
+    for _ in range(100):
+        tree = parse(cells, program(rng))
+        if tree is not None:
+            assert show(cells.BinaryAST.loads(cells.BinaryAST.dumps(tree))) == show(tree)
+
+
+def test_corrupted_data():
+    data = cells.BinaryAST.dumps(cells.UCyanParser(backend="dfa").parse(EVERY_KIND))
+    for bad in (b"", b"UCYAST", b"XXXXXX\x02", data[:6] + b"\x09" + data[7:], data + b"\x00"):
+        with pytest.raises(cells.SerializationError):
+            cells.BinaryAST.loads(bad)
+    for size in range(len(data)):
+        with pytest.raises(cells.SerializationError):
+            cells.BinaryAST.loads(data[:size])
+    # A flipped bit gives an error or some tree, never another exception
+    rng = random.Random(0)
+    for _ in range(2000):
+        flipped = bytearray(data)
+        flipped[rng.randrange(7, len(data))] ^= 1 << rng.randrange(8)
+        try:
+            tree = cells.BinaryAST.loads(bytes(flipped))
+        except cells.SerializationError:
+            continue
+        assert isinstance(tree, cells.Node)
@@ -0,0 +1,81 @@
+"""Tests of repr, show and the visitors on deep trees."""
+import io
+
+import pytest
+
+from celulas import load
+
+cells = load()
+
+
+def chain(depth):
+    """The Program of print x + x + ... with depth additions."""
+    return cells.UCyanParser(backend="dfa").parse("var x = 1; print " + " + ".join(["x"] * (depth + 1)) + ";")
+
+
+def test_repr_of_lists_and_values():
+    assert cells.represent_node([1, [2.5, True], "a"], 0) == "[1,\n [2.5,\n  true,\n ],\n a,\n]"
+    literal = cells.Literal("int", 1)
+    assert repr(literal) == "Literal(type=int,\n        value=1)"
+    # A node shared in the tree is written once
+    assert repr(cells.BinaryOp("+", literal, literal)) == (
+        "BinaryOp(op=+,\n         left=Literal(type=int,\n                      value=1),\n         right=)")
+
+
+@pytest.mark.parametrize("depth", [3000])
+def test_deep_repr_and_show(depth):
+    program = chain(depth)
+    text = repr(program)
+    assert text.count("BinaryOp(") == depth
+    assert text.count("Location(") == depth + 1
+    out = io.StringIO()
+    program.show(buf=out)
+    lines = out.getvalue().splitlines()
+    assert len(lines) == 2 * depth + 5
+    # The innermost operands are indented one level per addition
+    assert max(len(line) - len(line.lstrip()) for line in lines) == 4 * (depth + 2)
+
+
+class Counter(cells.NodeVisitor):
+    def __init__(self):
+        self.locations = 0
+        self.entered = []
+        self.left = 0
+
+    def visit_Location(self, node):
+        self.locations += 1
+
+    def enter_BinaryOp(self, node):
+        self.entered.append(node.op)
+
+    def leave_BinaryOp(self, node):
+        self.left += 1
+
+
+def test_deep_visit_and_traverse():
+    depth = 100000
+    program = chain(depth)
+    visitor = Counter()
+    visitor.visit(program)
+    assert visitor.locations == depth + 1
+    visitor = Counter()
+    visitor.traverse(program)
+    assert visitor.entered == ["+"] * depth and visitor.left == depth
+
+
+class Tracing(cells.NodeVisitor):
+    """Overrides visit: generic_visit must go through it."""
+
+    def __init__(self):
+        self.seen = []
+
+    def visit(self, node):
+        self.seen.append(node.__class__.__name__)
+        return cells.NodeVisitor.visit(self, node)
+
+
+def test_generic_visit_uses_an_overridden_visit():
+    visitor = Tracing()
+    visitor.visit(chain(1))
+    assert visitor.seen == ["Program", "VarDefinition", "Literal", "PrintStatement",
+                            "BinaryOp", "Location", "Location"]
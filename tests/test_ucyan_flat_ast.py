@@ -0,0 +1,54 @@
+"""Tests of FlatAST against the object AST."""
+import io
+import random
+
+import pytest
+
+from celulas import load
+from programas import program
+
+cells = load()
+
+
+def show(node):
+    out = io.StringIO()
+    node.show(buf=out, attrnames=True, nodenames=True, showcoord=True)
+    return out.getvalue()
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_round_trips(seed):
+    rng = random.Random(seed)
+    nodes = cells.UCyanParser(backend="dfa", diagnostics=cells.Diagnostics())
+    flat = cells.UCyanParser(backend="dfa", diagnostics=cells.Diagnostics(), builder=cells.FlatBuilder())
+    for _ in range(100):
+        text = program(rng)
+        tree = nodes.parse(text)
+        built = flat.parse(text)
+        if tree is None:
+            assert built is None
+            continue
+        expected = show(tree)
+        flattened = cells.FlatAST.from_node(tree)
+        if not len(flat.diagnostics):
+            # Statements dropped by error recovery stay in built
+            assert len(flattened) == len(built)
+        assert show(flattened.to_node()) == expected
+        assert show(built.to_node()) == expected
+        # The views show as the nodes they stand for
+        assert show(built.node()) == expected
+
+
+def test_parser_reuse():
+    parser = cells.UCyanParser(backend="dfa", builder=cells.FlatBuilder())
+    first = parser.parse("print 1;")
+    size, root = len(first), first.root
+    second = parser.parse("var x = 1; print x + 2;")
+    assert second is not first
+    assert (len(first), first.root) == (size, root)
+    assert show(first.to_node()) == show(cells.UCyanParser(backend="dfa").parse("print 1;"))
+    # A parse that gives up leaves nothing in the next tree
+    parser = cells.UCyanParser(backend="dfa", builder=cells.FlatBuilder(),
+                               diagnostics=cells.Diagnostics(max_errors=1))
+    assert parser.parse("print 1; print 2; print ;") is None
+    assert len(parser.parse("print 1;")) == size
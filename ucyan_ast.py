@@ -1,61 +1,164 @@
 import sys
 
 def represent_node(obj, indent):
-    def _repr(obj, indent, printed_set):
-        """
-        Get the representation of an object, with dedicated pprint-like format for lists.
-        """
+    """
+    Get the representation of an object, with dedicated pprint-like format for lists.
+    Uses an explicit stack instead of recursion, so arbitrarily deep trees
+    can be represented, and writes each piece of the text once, joining
+    them at the end.
+    """
+    # avoid infinite recursion with printed_set
+    printed_set = set()
+    pieces = []
+    # Text to write (a str) or an (obj, indent) value to represent
+    tasks = [(obj, indent)]
+    while tasks:
+        task = tasks.pop()
+        if task.__class__ is str:
+            pieces.append(task)
+            continue
+        obj, indent = task
         if isinstance(obj, list):
             indent += 1
             sep = ",\n" + (" " * indent)
-            final_sep = ",\n" + (" " * (indent - 1))
-            return (
-                "["
-                + (sep.join((_repr(e, indent, printed_set) for e in obj)))
-                + final_sep
-                + "]"
-            )
+            parts = ["["]
+            for i, e in enumerate(obj):
+                if i:
+                    parts.append(sep)
+                parts.append((e, indent))
+            parts.append(",\n" + (" " * (indent - 1)) + "]")
+            tasks.extend(reversed(parts))
         elif isinstance(obj, Node):
             if obj in printed_set:
-                return ""
-            else:
-                printed_set.add(obj)
-            result = obj.__class__.__name__ + "("
+                continue
+            printed_set.add(obj)
             indent += len(obj.__class__.__name__) + 1
-            attrs = []
+            sep = ",\n" + (" " * indent)
+            parts = [obj.__class__.__name__ + "("]
             for name in obj.__slots__:
                 if name == "bind":
                     continue
-                value = getattr(obj, name)
-                value_str = _repr(value, indent + len(name) + 1, printed_set)
-                attrs.append(name + "=" + value_str)
-            sep = ",\n" + (" " * indent)
-            final_sep = ",\n" + (" " * (indent - 1))
-            result += sep.join(attrs)
-            result += ")"
-            return result
+                parts.append((sep if len(parts) > 1 else "") + name + "=")
+                parts.append((getattr(obj, name), indent + len(name) + 1))
+            parts.append(")")
+            tasks.extend(reversed(parts))
         elif isinstance(obj, str):
-            return obj
+            pieces.append(obj)
+        elif isinstance(obj, bool):
+            pieces.append("true" if obj else "false")
+        elif isinstance(obj, (int, float)):
+            pieces.append(repr(obj))
+    return "".join(pieces)
+
+
+def walk(node, enter=None, leave=None, name=None, names=False):
+    """Traverse the tree rooted at node with an explicit stack.
+    enter(node, name, depth) is called before the children of a node
+    (returning False skips them) and leave(node, name, depth) after
+    them. Children come from iterating the nodes; only with names=True
+    are they taken from children(), so that name is the node's name
+    within its parent (name for the root; None otherwise).
+    """
+    if enter is not None and enter(node, name, 0) is False:
+        return
+    stack = [(node, name, iter(node.children()) if names else iter(node))]
+    while stack:
+        children = stack[-1][2]
+        for child in children:
+            if names:
+                child_name, child = child
+            else:
+                child_name = None
+            if enter is None or enter(child, child_name, len(stack)) is not False:
+                stack.append((child, child_name, iter(child.children()) if names else iter(child)))
+                break
         else:
-            return ""
+            node, name, _ = stack.pop()
+            if leave is not None:
+                leave(node, name, len(stack))
+
+
+class Coord(int):
+    """Line and column of a node in the source, packed into one int
+    ((line << 32) | column) and decoded only when they are asked for.
+    It is as small as an int and, like one, immutable, hashable and
+    compared by value. Nodes keep just the packed int (see Node.coord).
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, line, column):
+        return int.__new__(cls, (line << 32) | column)
+
+    @property
+    def line(self):
+        return self >> 32
+
+    @property
+    def column(self):
+        return self & 0xFFFFFFFF
+
+    @classmethod
+    def unpack(cls, packed):
+        """The Coord of the int (line << 32) | column."""
+        return int.__new__(cls, packed)
+
+    def __getnewargs__(self):
+        return self >> 32, self & 0xFFFFFFFF
+
+    def __str__(self):
+        return "@ %d:%d" % (self >> 32, self & 0xFFFFFFFF)
+
+    def __repr__(self):
+        return "Coord(%d, %d)" % (self >> 32, self & 0xFFFFFFFF)
 
-    # avoid infinite recursion with printed_set
-    printed_set = set()
-    return _repr(obj, indent, printed_set)
 
 class Node:
     """Abstract base class for AST nodes."""
 
-    __slots__ = ("coord", "attrs",)
+    __slots__ = ("_coord", "_attrs",)
 
     def __init__(self, coord=None):
-        self.coord = coord
-        self.attrs = {}
+        # A Coord, or the packed int of one: both are kept as they are
+        self._coord = coord
+
+    @property
+    def coord(self):
+        """The Coord of the node (None if it has none), decoded from
+        the packed int the node keeps."""
+        packed = self._coord
+        if packed is None:
+            return None
+        return Coord.unpack(packed)
+
+    @coord.setter
+    def coord(self, value):
+        self._coord = value
+
+    @property
+    def attrs(self):
+        """Attributes set by later passes. The dict is only allocated
+        the first time a node's attrs are used."""
+        try:
+            return self._attrs
+        except AttributeError:
+            self._attrs = {}
+            return self._attrs
+
+    @attrs.setter
+    def attrs(self, value):
+        self._attrs = value
 
     def children(self):
         """A sequence of all children that are Nodes"""
         pass
 
+    def __iter__(self):
+        """Iterate over the children that are Nodes, without naming them
+        (use children() for the (name, node) pairs)."""
+        return
+        yield
+
     attr_names = ()
 
     def __repr__(self):
@@ -83,6 +186,13 @@ class Node:
         showcoord:
             Do you want the coordinates of each Node to be displayed.
         """
+        def enter(node, name, depth):
+            node._show_node(buf, offset + 4 * depth, attrnames, nodenames, showcoord, name)
+
+        walk(self, enter, name=_my_node_name, names=nodenames)
+
+    def _show_node(self, buf, offset, attrnames, nodenames, showcoord, _my_node_name):
+        """Print the line of this node only (see show)."""
         lead = " " * offset
         if nodenames and _my_node_name is not None:
             buf.write(lead + self.__class__.__name__ + " <" + _my_node_name + ">: ")
@@ -111,9 +221,6 @@ class Node:
                 buf.write(" %s" % self.coord)
         buf.write("\n")
 
-        for (child_name, child) in self.children():
-            child.show(buf, offset + 4, attrnames, nodenames, showcoord, child_name)
-
 class NodeVisitor:
     """ A base NodeVisitor class for visiting uc_ast nodes.
         Subclass it and define your own visit_XXX methods, where
@@ -121,29 +228,86 @@ class NodeVisitor:
         methods.
     """
 
-    _method_cache = None
+    # Node class -> visitor function of this visitor class. Filled for
+    # every subclass when it is defined (see __init_subclass__); node
+    # classes created later are resolved on their first visit.
+    _dispatch = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._dispatch = {}
+        pending = list(Node.__subclasses__())
+        while pending:
+            node_class = pending.pop()
+            cls._dispatch[node_class] = cls._resolve(node_class)
+            pending.extend(node_class.__subclasses__())
+
+    @classmethod
+    def _resolve(cls, node_class):
+        return getattr(cls, 'visit_' + node_class.__name__, cls.generic_visit)
 
     def visit(self, node):
         """ Visit a node.
         """
-
-        if self._method_cache is None:
-            self._method_cache = {}
-
-        visitor = self._method_cache.get(node.__class__.__name__, None)
-        if visitor is None:
-            method = 'visit_' + node.__class__.__name__
-            visitor = getattr(self, method, self.generic_visit)
-            self._method_cache[node.__class__.__name__] = visitor
-
-        return visitor(node)
+        try:
+            visitor = self._dispatch[node.__class__]
+        except KeyError:
+            visitor = self._dispatch[node.__class__] = self._resolve(node.__class__)
+        return visitor(self, node)
 
     def generic_visit(self, node):
         """ Called if no explicit visitor function exists for a
             node. Implements preorder visiting of the node.
+            Descendants that have no visitor function of their own
+            are expanded here, with an explicit stack, instead of
+            recursing through visit(). A subclass that overrides
+            visit() gets every child through it, recursively.
         """
-        for _, child in node.children():
-            self.visit(child)
+        if self.__class__.visit is not NodeVisitor.visit:
+            for child in node:
+                self.visit(child)
+            return
+        dispatch = self._dispatch
+        stack = [iter(node)]
+        while stack:
+            for node in stack[-1]:
+                try:
+                    visitor = dispatch[node.__class__]
+                except KeyError:
+                    visitor = dispatch[node.__class__] = self._resolve(node.__class__)
+                if visitor is NodeVisitor.generic_visit:
+                    stack.append(iter(node))
+                    break
+                visitor(self, node)
+            else:
+                stack.pop()
+
+    def traverse(self, node):
+        """ Visit the whole tree rooted at node without recursion.
+            Calls enter_XXX(node) before the children of each node and
+            leave_XXX(node) after them, for the XXX classes that define
+            them. An enter_XXX returning False skips the node's children.
+        """
+        hooks = {}
+
+        def hook(prefix, node):
+            key = (prefix, node.__class__)
+            method = hooks.get(key, hooks)
+            if method is hooks:
+                method = hooks[key] = getattr(self, prefix + node.__class__.__name__, None)
+            return method
+
+        def enter(node, name, depth):
+            method = hook("enter_", node)
+            if method is not None:
+                return method(node)
+
+        def leave(node, name, depth):
+            method = hook("leave_", node)
+            if method is not None:
+                method(node)
+
+        walk(node, enter, leave)
 
 
 
@@ -165,6 +329,12 @@ class AssignmentStatement(Node):
       nodelist.append(('expression', self.expression))
     return tuple(nodelist)
 
+  def __iter__(self):
+    if self.location is not None:
+      yield self.location
+    if self.expression is not None:
+      yield self.expression
+
 
 
 
@@ -186,6 +356,12 @@ class BinaryOp(Node):
             nodelist.append(('right', self.right))
         return tuple(nodelist)
 
+    def __iter__(self):
+        if self.left is not None:
+            yield self.left
+        if self.right is not None:
+            yield self.right
+
     attr_names = ("op",)
 
 
@@ -193,6 +369,8 @@ class BinaryOp(Node):
 
 class BreakStatement(Node):
 
+    __slots__ = ()
+
     def __init__(self, coord=None):
         super().__init__(coord)
 
@@ -200,18 +378,23 @@ class BreakStatement(Node):
         nodelist = []
         return tuple(nodelist)
 
+    def __iter__(self):
+        return
+        yield
+
 
 
 
 
 class ConstDefinition(Node):
-    __slots__ = ("name", "dtype", "expression",)
+    __slots__ = ("name", "dtype", "expression", "bind",)
 
     def __init__(self, name, dtype, expression, coord=None):
         super().__init__(coord)
         self.name = name
         self.dtype = dtype
         self.expression = expression
+        self.bind = None
 
     def children(self):
         nodelist = []
@@ -221,13 +404,21 @@ class ConstDefinition(Node):
             nodelist.append(('expression', self.expression))
         return tuple(nodelist)
 
+    def __iter__(self):
+        if self.dtype is not None:
+            yield self.dtype
+        if self.expression is not None:
+            yield self.expression
+
     attr_names = ("name",)
 
 
 
 
 class ContinueStatement(Node):
-  
+
+    __slots__ = ()
+
     def __init__(self, coord=None):
         super().__init__(coord)
 
@@ -235,6 +426,10 @@ class ContinueStatement(Node):
         nodelist = []
         return tuple(nodelist)
 
+    def __iter__(self):
+        return
+        yield
+
 
 
 
@@ -251,6 +446,10 @@ class ExpressionAsStatement(Node):
       nodelist.append(('expression', self.expression))
     return tuple(nodelist)
 
+  def __iter__(self):
+    if self.expression is not None:
+      yield self.expression
+
   attr_names = ()
 
 
@@ -281,6 +480,14 @@ class IfStatement(Node):
 
       return tuple(nodelist)
 
+    def __iter__(self):
+      if self.test is not None:
+        yield self.test
+      if self.consequence is not None:
+        yield from self.consequence
+      if self.alternative is not None:
+        yield from self.alternative
+
 
 
 class Literal(Node):
@@ -295,6 +502,10 @@ class Literal(Node):
     def children(self):
         return tuple()
 
+    def __iter__(self):
+        return
+        yield
+
     attr_names = ("type", "value",)
 
 
@@ -302,16 +513,21 @@ class Literal(Node):
 
 class Location(Node):
 
-    __slots__ = ("name",)
+    __slots__ = ("name", "bind",)
 
     def __init__(self, name, coord=None):
       super().__init__(coord)
       self.name = name
+      self.bind = None
 
     def children(self):
       nodelist = []
       return tuple(nodelist)
 
+    def __iter__(self):
+      return
+      yield
+
     attr_names = ("name",)
 
 
@@ -331,6 +547,10 @@ class PrintStatement(Node):
         nodelist.append(('expression', self.expression))
     return tuple(nodelist)
 
+  def __iter__(self):
+    if self.expression is not None:
+      yield self.expression
+
 
 
 
@@ -348,6 +568,9 @@ class Program(Node):
             nodelist.append(('statements[%d]' % i, child))
         return tuple(nodelist)
 
+    def __iter__(self):
+        yield from self.statements or []
+
     attr_names = ()
 
 
@@ -365,6 +588,10 @@ class Type(Node):
     nodelist = []
     return tuple(nodelist)
 
+  def __iter__(self):
+    return
+    yield
+
   attr_names = ("name",)
 
 
@@ -385,6 +612,10 @@ class UnaryOp(Node):
             nodelist.append(('operand', self.operand))
         return tuple(nodelist)
 
+    def __iter__(self):
+        if self.operand is not None:
+            yield self.operand
+
     attr_names = ("op",)
 
 
@@ -392,13 +623,14 @@ class UnaryOp(Node):
 
 class VarDefinition(Node):
 
-  __slots__ = ("name", "dtype", "expression",)
+  __slots__ = ("name", "dtype", "expression", "bind",)
 
   def __init__(self, name, dtype, expression, coord=None):
     super().__init__(coord)
     self.name = name
     self.dtype = dtype
     self.expression = expression
+    self.bind = None
 
   def children(self):
     nodelist = []
@@ -408,6 +640,12 @@ class VarDefinition(Node):
       nodelist.append(('expression', self.expression))
     return tuple(nodelist)
 
+  def __iter__(self):
+    if self.dtype is not None:
+      yield self.dtype
+    if self.expression is not None:
+      yield self.expression
+
   attr_names = ("name",)
 
 
@@ -429,3 +667,36 @@ class WhileStatement(Node):
       for i, child in enumerate(self.body or []):
         nodelist.append(('body[%d]' % i, child))
     return tuple(nodelist)
+
+  def __iter__(self):
+    if self.test is not None:
+      yield self.test
+    if self.body is not None:
+      yield from self.body
+
+
+
+
+class NodeBuilder:
+    """Node constructors used by UCyanParser. Each attribute builds one kind
+    of node; FlatBuilder (ucyan_flat_ast) offers the same interface for the
+    flat representation of the tree."""
+
+    AssignmentStatement = AssignmentStatement
+    BinaryOp = BinaryOp
+    BreakStatement = BreakStatement
+    ConstDefinition = ConstDefinition
+    ContinueStatement = ContinueStatement
+    ExpressionAsStatement = ExpressionAsStatement
+    IfStatement = IfStatement
+    Literal = Literal
+    Location = Location
+    PrintStatement = PrintStatement
+    Program = Program
+    Type = Type
+    UnaryOp = UnaryOp
+    VarDefinition = VarDefinition
+    WhileStatement = WhileStatement
+
+    def start(self):
+        """Called by the parser before each parse."""
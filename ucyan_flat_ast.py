@@ -0,0 +1,330 @@
+from array import array
+
+# Node classes of ucyan_ast, indexed by kind id
+NODE_CLASSES = (
+    AssignmentStatement,
+    BinaryOp,
+    BreakStatement,
+    ConstDefinition,
+    ContinueStatement,
+    ExpressionAsStatement,
+    IfStatement,
+    Literal,
+    Location,
+    PrintStatement,
+    Program,
+    Type,
+    UnaryOp,
+    VarDefinition,
+    WhileStatement,
+)
+
+KIND_IDS = {cls: kind for kind, cls in enumerate(NODE_CLASSES)}
+
+# Fields holding lists of statements
+LIST_FIELDS = ("statements", "consequence", "alternative", "body")
+
+# Roles of a constructor argument
+ATTR, NODE, LIST = range(3)
+
+
+def _layout(cls):
+    """(name, role) of the constructor arguments of cls, in order."""
+    layout = []
+    for name in cls.__slots__:
+        if name == "bind":
+            continue
+        if name in cls.attr_names:
+            layout.append((name, ATTR))
+        elif name in LIST_FIELDS:
+            layout.append((name, LIST))
+        else:
+            layout.append((name, NODE))
+    return tuple(layout)
+
+
+LAYOUTS = tuple(_layout(cls) for cls in NODE_CLASSES)
+
+
+def _value_key(value):
+    """Dict key of an attribute value that tells apart the values
+    comparing equal (1, 1.0 and True; 0.0 and -0.0)."""
+    if value.__class__ is float:
+        return float, value.hex()
+    return value.__class__, value
+
+
+class FlatAST:
+    """A uCyan AST stored in flat arrays instead of one object per node.
+
+    Node i has a kind (index into NODE_CLASSES), a packed Coord
+    (coords[i]; line 0 means no coord), up to two attributes (ids into
+    the strings table, which also holds the int, float and bool values
+    of literals; -1 for None) and its child fields in refs, starting
+    at first[i]: one slot per node field (child index or -1), and for a
+    list field its length (-1 for None) followed by the child indices.
+    Children always have smaller indices than their parent.
+    """
+
+    def __init__(self):
+        self.kinds = array("B")
+        self.coords = array("q")
+        self.attr0 = array("l")
+        self.attr1 = array("l")
+        self.first = array("q")
+        self.refs = array("q")
+        self.strings = []
+        self._string_ids = {}
+        self.root = -1
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def intern(self, value):
+        """Id of value in the strings table (-1 for None)."""
+        if value is None:
+            return -1
+        key = value if value.__class__ is str else _value_key(value)
+        sid = self._string_ids.get(key)
+        if sid is None:
+            sid = self._string_ids[key] = len(self.strings)
+            self.strings.append(value)
+        return sid
+
+    def add(self, kind, values, coord=None):
+        """Append a node of the given kind. values are the constructor
+        arguments, with child nodes given by index. Returns the new index."""
+        index = len(self.kinds)
+        self.kinds.append(kind)
+        self.coords.append(0 if coord is None else coord)
+        refs = self.refs
+        self.first.append(len(refs))
+        attrs = [-1, -1]
+        k = 0
+        for (name, role), value in zip(LAYOUTS[kind], values):
+            if role == ATTR:
+                attrs[k] = self.intern(value)
+                k += 1
+            elif role == NODE:
+                refs.append(-1 if value is None else value)
+            elif value is None:
+                refs.append(-1)
+            else:
+                refs.append(len(value))
+                refs.extend(value)
+        self.attr0.append(attrs[0])
+        self.attr1.append(attrs[1])
+        return index
+
+    def kind(self, i):
+        """The ucyan_ast class of node i."""
+        return NODE_CLASSES[self.kinds[i]]
+
+    def coord(self, i):
+        packed = self.coords[i]
+        if packed >> 32 == 0:
+            return None
+        return Coord.unpack(packed)
+
+    def fields(self, i):
+        """Constructor arguments of node i, with child nodes as indices."""
+        strings, refs = self.strings, self.refs
+        attrs = (self.attr0[i], self.attr1[i])
+        pos = self.first[i]
+        values = []
+        k = 0
+        for name, role in LAYOUTS[self.kinds[i]]:
+            if role == ATTR:
+                sid = attrs[k]
+                values.append(None if sid < 0 else strings[sid])
+                k += 1
+            elif role == NODE:
+                child = refs[pos]
+                values.append(None if child < 0 else child)
+                pos += 1
+            else:
+                count = refs[pos]
+                pos += 1
+                if count < 0:
+                    values.append(None)
+                else:
+                    values.append(list(refs[pos:pos + count]))
+                    pos += count
+        return values
+
+    def children(self, i):
+        """Indices of the children of node i, in order."""
+        refs = self.refs
+        pos = self.first[i]
+        for name, role in LAYOUTS[self.kinds[i]]:
+            if role == NODE:
+                if refs[pos] >= 0:
+                    yield refs[pos]
+                pos += 1
+            elif role == LIST:
+                count = refs[pos]
+                pos += 1
+                if count > 0:
+                    yield from refs[pos:pos + count]
+                    pos += count
+
+    def node(self, i=None):
+        """A view of node i (the root by default) that behaves like the
+        ucyan_ast node, so NodeVisitor subclasses and show() work on it."""
+        if i is None:
+            i = self.root
+        return VIEW_CLASSES[self.kinds[i]](self, i)
+
+    @classmethod
+    def from_node(cls, node):
+        """Flatten the object AST rooted at node."""
+        flat = cls()
+        index = {}
+        stack = [(node, iter(node))]
+        while stack:
+            current, children = stack[-1]
+            for child in children:
+                stack.append((child, iter(child)))
+                break
+            else:
+                stack.pop()
+                flat._add_node(current, index)
+        flat.root = index[id(node)]
+        return flat
+
+    def _add_node(self, current, index):
+        kind = KIND_IDS[type(current)]
+        values = []
+        for name, role in LAYOUTS[kind]:
+            value = getattr(current, name)
+            if value is None or role == ATTR:
+                values.append(value)
+            elif role == NODE:
+                values.append(index.pop(id(value)))
+            else:
+                values.append([index.pop(id(child)) for child in value])
+        index[id(current)] = self.add(kind, values, current._coord)
+
+    def to_node(self, i=None):
+        """Rebuild the object AST of node i (the root by default)."""
+        if i is None:
+            i = self.root
+        built = {}
+        stack = [i]
+        while stack:
+            j = stack[-1]
+            pending = [c for c in self.children(j) if c not in built]
+            if pending:
+                stack.extend(reversed(pending))
+                continue
+            stack.pop()
+            values = []
+            for (name, role), value in zip(LAYOUTS[self.kinds[j]], self.fields(j)):
+                if value is None or role == ATTR:
+                    values.append(value)
+                elif role == NODE:
+                    values.append(built.pop(value))
+                else:
+                    values.append([built.pop(c) for c in value])
+            built[j] = self.kind(j)(*values, coord=self.coord(j))
+        return built[i]
+
+
+class FlatBuilder:
+    """Builds a FlatAST straight from UCyanParser's productions:
+
+        parser = UCyanParser(builder=FlatBuilder())
+        flat = parser.parse(text)
+
+    Each node constructor appends to the FlatAST and returns the new index;
+    Program (always the root) returns the FlatAST itself, and the next
+    parse builds a new one.
+    """
+
+    def __init__(self, ast=None):
+        self.ast = ast if ast is not None else FlatAST()
+
+    def start(self):
+        """Called by the parser before each parse: drops the nodes left
+        by a parse that gave up before its Program."""
+        if len(self.ast):
+            self.ast = FlatAST()
+
+
+def _constructor(kind, cls):
+    names = tuple(name for name, role in LAYOUTS[kind])
+
+    def build(self, *args, coord=None, **kwargs):
+        if kwargs:
+            args += tuple(kwargs[name] for name in names[len(args):])
+        index = self.ast.add(kind, args, coord)
+        if cls is Program:
+            ast = self.ast
+            ast.root = index
+            self.ast = FlatAST()
+            return ast
+        return index
+
+    build.__name__ = cls.__name__
+    return build
+
+
+for _kind, _cls in enumerate(NODE_CLASSES):
+    setattr(FlatBuilder, _cls.__name__, _constructor(_kind, _cls))
+
+
+class FlatNode(Node):
+    """Base class of the views returned by FlatAST.node()."""
+
+    __slots__ = ("ast", "index")
+
+    def __init__(self, ast, index):
+        self.ast = ast
+        self.index = index
+
+    @property
+    def coord(self):
+        return self.ast.coord(self.index)
+
+    def children(self):
+        ast = self.ast
+        nodelist = []
+        for (name, role), value in zip(LAYOUTS[self.kind], ast.fields(self.index)):
+            if role == ATTR or value is None:
+                continue
+            if role == NODE:
+                nodelist.append((name, ast.node(value)))
+            else:
+                for i, child in enumerate(value):
+                    nodelist.append(('%s[%d]' % (name, i), ast.node(child)))
+        return tuple(nodelist)
+
+    def __iter__(self):
+        ast = self.ast
+        for child in ast.children(self.index):
+            yield ast.node(child)
+
+    def __repr__(self):
+        return repr(self.ast.to_node(self.index))
+
+
+def _field(position, role):
+    def get(self):
+        value = self.ast.fields(self.index)[position]
+        if value is None or role == ATTR:
+            return value
+        if role == NODE:
+            return self.ast.node(value)
+        return [self.ast.node(child) for child in value]
+    return property(get)
+
+
+def _view_class(kind, cls):
+    namespace = {"__slots__": (), "kind": kind, "attr_names": cls.attr_names}
+    for position, (name, role) in enumerate(LAYOUTS[kind]):
+        namespace[name] = _field(position, role)
+    return type(cls.__name__, (FlatNode,), namespace)
+
+
+# View class of each kind, named after the matching ucyan_ast class
+VIEW_CLASSES = tuple(_view_class(kind, cls) for kind, cls in enumerate(NODE_CLASSES))